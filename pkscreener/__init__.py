@@ -31,5 +31,6 @@ Imports = {
     "pandas_ta": find_spec("pandas_ta") is not None,
     "tensorflow": find_spec("tensorflow") is not None,
     "keras": find_spec("keras") is not None,
+    "h5py": find_spec("h5py") is not None,
     "yfinance": find_spec("yfinance") is not None,
 }
@@ -26,6 +26,7 @@ import warnings
 
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
+import numpy as np
 import pandas as pd
 from PKDevTools.classes.ColorText import colorText
 
@@ -36,221 +37,301 @@ configManager = tools()
 configManager.getConfig(parser)
 
 
-def backtest(
-    stock,
-    data,
-    saveDict=None,
-    screenedDict=None,
-    periods=30,
-    sampleDays=configManager.backtestPeriod,
-    backTestedData=None,
-    sellSignal=False,
-):
-    if stock == "" or data is None:
-        print(f"No data/stock{(stock)} received for backtesting!")
-        return
-    if screenedDict is None or len(screenedDict) == 0:
-        print(f"{(stock)}No backtesting strategy or screened dictionary received!")
-        return
+# Collects the results of a backtest run as they arrive. The closing prices
+# that follow each recommendation are kept as raw numbers in preallocated
+# arrays, so that the forward returns of all periods for all the results are
+# computed in one go. Colors are only applied when rendering with toDataFrame.
+class BacktestAccumulator:
     calcPeriods = [1, 2, 3, 4, 5, 10, 15, 22, 30]
-    allStockBacktestData = []
-    # Take the data based on which the result set for a strategy may have been arrived at
-    # The results must have been arrived at with data based on configManager.backtestPeriod -sampleDays
-    # but we also need the periods days to be able to calculate the next few days' returns
-    # s1    d0
-    # s1    d1
-    # s1    d2  <----------------On this day the recommendation was made
-    # s1    d3  ^
-    #   ....    |
-    # s1    dn  |----------------We need to make calculations upto 30 day period from d2
-    previous_recent = data.head(
-        1
-    )  # This is the row which has the date for which the recommendation is valid
-    previous_recent.reset_index(inplace=True)
-    if len(previous_recent) <= 0:
-        return backTestedData
-    data = data.head(periods + 1)
-    # Let's check the returns for the given strategy over a period ranging from 1 period to 30 periods.
-    if backTestedData is None:
-        backTestedData = pd.DataFrame(
-            columns=[
-                "Stock",
-                "Date",
-                "Volume",
-                "Trend",
-                "MA-Signal",
-                "LTP",
-                "52Wk H",
-                "52Wk L",
-                "1-Pd",
-                "2-Pd",
-                "3-Pd",
-                "4-Pd",
-                "5-Pd",
-                "10-Pd",
-                "15-Pd",
-                "22-Pd",
-                "30-Pd",
-            ]
+    columns = [
+        "Stock",
+        "Date",
+        "Volume",
+        "Trend",
+        "MA-Signal",
+        "LTP",
+        "52Wk H",
+        "52Wk L",
+    ] + [f"{prd}-Pd" for prd in calcPeriods]
+    screenedColumns = ["Consol.", "Breakout", "RSI", "Pattern", "CCI"]
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.closes = np.full((capacity, max(self.calcPeriods) + 1), np.nan)
+        # Number of closes available and the longest period allowed per result
+        self.lengths = np.zeros(capacity, dtype=int)
+        self.maxPeriods = np.zeros(capacity, dtype=int)
+        self.sellSignals = np.zeros(capacity, dtype=bool)
+        self.rows = []
+        self.gaps = {}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = len(self.closes)
+        self.closes = np.vstack([self.closes, np.full(self.closes.shape, np.nan)])
+        self.lengths = np.concatenate([self.lengths, np.zeros(capacity, dtype=int)])
+        self.maxPeriods = np.concatenate(
+            [self.maxPeriods, np.zeros(capacity, dtype=int)]
         )
-    backTestedStock = {
-        "Stock": "",
-        "Date": "",
-        "Volume": "",
-        "Trend": "",
-        "MA-Signal": "",
-        "LTP": "",
-        "52Wk H": "",
-        "52Wk L": "",
-        "1-Pd": "",
-        "2-Pd": "",
-        "3-Pd": "",
-        "4-Pd": "",
-        "5-Pd": "",
-        "10-Pd": "",
-        "15-Pd": "",
-        "22-Pd": "",
-        "30-Pd": "",
-    }
-    backTestedStock["Stock"] = stock
-    targetDate = (
-        previous_recent["Date"].iloc[0]
-        if "Date" in previous_recent.columns
-        else str(previous_recent.iloc[:, 0][0])
-    )
-    targetDate = targetDate.split(" ")[0]  # Date or index column
-    backTestedStock["Date"] = targetDate
-    backTestedStock["Consol."] = screenedDict["Consol."]
-    backTestedStock["Breakout"] = screenedDict["Breakout"]
-    backTestedStock["MA-Signal"] = screenedDict["MA-Signal"]
-    backTestedStock["Volume"] = screenedDict["Volume"]
-    backTestedStock["LTP"] = screenedDict["LTP"]
-    backTestedStock["52Wk H"] = screenedDict["52Wk H"]
-    backTestedStock["52Wk L"] = screenedDict["52Wk L"]
-    backTestedStock["RSI"] = screenedDict["RSI"]
-    backTestedStock["Trend"] = screenedDict["Trend"]
-    backTestedStock["Pattern"] = screenedDict["Pattern"]
-    backTestedStock["CCI"] = screenedDict["CCI"]
-    today = Utility.tools.currentDateTime()
-    gap = Utility.tools.trading_days_between(
-        Utility.tools.dateFromYmdString(targetDate).replace(tzinfo=today.tzinfo).date(),
-        today.date(),
-    )
-    periods = gap if gap > periods else periods
-    for prd in calcPeriods:
-        if prd <= periods:
-            try:
-                rolling_pct = data["Close"].pct_change(periods=prd) * 100
-                pct_change = rolling_pct.iloc[prd]
+        self.sellSignals = np.concatenate(
+            [self.sellSignals, np.zeros(capacity, dtype=bool)]
+        )
+
+    def _gap(self, targetDate):
+        if targetDate not in self.gaps:
+            today = Utility.tools.currentDateTime()
+            self.gaps[targetDate] = Utility.tools.trading_days_between(
+                Utility.tools.dateFromYmdString(targetDate)
+                .replace(tzinfo=today.tzinfo)
+                .date(),
+                today.date(),
+            )
+        return self.gaps[targetDate]
+
+    # Adds the result screened for stock from data, the prices starting from the
+    # day of the recommendation. Returns True if the result was added.
+    def add(
+        self,
+        stock,
+        data,
+        saveDict=None,
+        screenedDict=None,
+        periods=30,
+        sampleDays=configManager.backtestPeriod,
+        sellSignal=False,
+    ):
+        if stock == "" or data is None:
+            print(f"No data/stock{(stock)} received for backtesting!")
+            return False
+        if screenedDict is None or len(screenedDict) == 0:
+            print(f"{(stock)}No backtesting strategy or screened dictionary received!")
+            return False
+        previous_recent = data.head(1)
+        previous_recent.reset_index(inplace=True)
+        if len(previous_recent) <= 0:
+            return False
+        targetDate = (
+            previous_recent["Date"].iloc[0]
+            if "Date" in previous_recent.columns
+            else str(previous_recent.iloc[:, 0][0])
+        )
+        targetDate = targetDate.split(" ")[0]
+        row = {column: "" for column in self.columns}
+        row["Stock"] = stock
+        row["Date"] = targetDate
+        for column in ["Volume", "Trend", "MA-Signal", "LTP", "52Wk H", "52Wk L"]:
+            row[column] = screenedDict[column]
+        for column in self.screenedColumns:
+            row[column] = screenedDict[column]
+        # Let's capture the portfolio data, if available
+        for prd in self.calcPeriods:
+            if saveDict is not None and f"LTP{prd}" in saveDict:
+                row[f"LTP{prd}"] = saveDict[f"LTP{prd}"]
+                if f"Growth{prd}" in saveDict:
+                    row[f"Growth{prd}"] = saveDict[f"Growth{prd}"]
+        if self.size == len(self.closes):
+            self._grow()
+        # pct_change pads missing prices with the previous ones
+        closes = (
+            data["Close"]
+            .head(min(periods + 1, self.closes.shape[1]))
+            .ffill()
+            .to_numpy(dtype=np.float64)
+        )
+        self.closes[self.size, : len(closes)] = closes
+        self.lengths[self.size] = len(closes)
+        gap = self._gap(targetDate)
+        self.maxPeriods[self.size] = gap if gap > periods else periods
+        self.sellSignals[self.size] = sellSignal
+        self.rows.append(row)
+        self.size += 1
+        return True
+
+    # Forward returns (%) for each of the calcPeriods, as a (results x periods)
+    # array with NaN where a period isn't available for a result.
+    def returns(self):
+        closes = self.closes[: self.size]
+        periods = np.array(self.calcPeriods)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = (closes[:, periods] / closes[:, [0]] - 1) * 100
+        available = (periods[None, :] < self.lengths[: self.size, None]) & (
+            periods[None, :] <= self.maxPeriods[: self.size, None]
+        )
+        return np.where(available, returns, np.nan), available
+
+    def forwardReturns(self):
+        returns, _ = self.returns()
+        df = pd.DataFrame(
+            returns, columns=[f"{prd}-Pd" for prd in self.calcPeriods]
+        )
+        df.insert(0, "Stock", [row["Stock"] for row in self.rows])
+        df.insert(1, "Date", [row["Date"] for row in self.rows])
+        df.insert(2, "SellSignal", self.sellSignals[: self.size])
+        # The longest period available for each result, since a NaN return
+        # within it still counts (as red, just like when it's rendered).
+        df.insert(
+            3,
+            "Periods",
+            np.minimum(self.lengths[: self.size] - 1, self.maxPeriods[: self.size]),
+        )
+        return df
+
+    def toDataFrame(self):
+        backTestedData = pd.DataFrame(columns=self.columns)
+        if self.size == 0:
+            return backTestedData
+        returns, available = self.returns()
+        df = pd.DataFrame(self.rows)
+        for col, prd in enumerate(self.calcPeriods):
+            styled = []
+            for pct_change, isAvailable, sellSignal in zip(
+                returns[:, col], available[:, col], self.sellSignals[: self.size]
+            ):
+                if not isAvailable:
+                    styled.append("")
+                    continue
                 if not sellSignal:
                     colored_pct = colorText.GREEN if pct_change >= 0 else colorText.FAIL
                 else:
                     colored_pct = colorText.FAIL if pct_change >= 0 else colorText.GREEN
-                backTestedStock[f"{abs(prd)}-Pd"] = (
-                    colored_pct + "%.2f%%" % pct_change + colorText.END
-                )
-            except Exception:
-                pass
-        # Let's capture the portfolio data, if available
-        try:
-            backTestedStock[f"LTP{prd}"] = saveDict[f"LTP{prd}"]
-            backTestedStock[f"Growth{prd}"] = saveDict[f"Growth{prd}"]
-        except Exception:
-            pass
-        # else:
-        #     del backTestedStock[f"{abs(prd)}-Pd"]
-        #     try:
-        #         backTestedData = backTestedData.drop(f"{abs(prd)}-Pd", axis=1)
-        #     except Exception:
-        #         continue
-    allStockBacktestData.append(backTestedStock)
-    df = pd.DataFrame(allStockBacktestData)  # , columns=backTestedData.columns)
-    try:
-        backTestedData = pd.concat([backTestedData, df])
-    except Exception:
-        pass
-    return backTestedData
+                styled.append(colored_pct + "%.2f%%" % pct_change + colorText.END)
+            df[f"{prd}-Pd"] = styled
+        return pd.concat([backTestedData, df])
+
+
+# Wins and forward returns (%) of the "-Pd" columns. df is either the numeric
+# frame from BacktestAccumulator.forwardReturns() or a rendered backtest frame,
+# whose cells are colored green for a win and red for a loss. A return that
+# is NaN is red: a loss for a buy signal and a win for a sell signal.
+def backtestOutcomes(df, periodColumns):
+    if "SellSignal" in df.columns:
+        returns = df[periodColumns].apply(pd.to_numeric, errors="coerce")
+        sellSignals = df["SellSignal"].astype(bool).to_numpy()[:, None]
+        wins = (returns >= 0).to_numpy() != sellSignals
+        if "Periods" in df.columns:
+            periods = np.array([int(str(col).split("-")[0]) for col in periodColumns])
+            counted = periods[None, :] <= df["Periods"].to_numpy()[:, None]
+        else:
+            counted = returns.notna().to_numpy()
+        wins = pd.DataFrame(
+            np.where(counted, wins, np.nan),
+            columns=periodColumns,
+            index=df.index,
+        )
+        return returns, wins
+    returns = {}
+    wins = {}
+    for col in periodColumns:
+        cells = df[col].astype(str)
+        wins[col] = np.where(
+            cells.str.startswith(colorText.GREEN),
+            1.0,
+            np.where(cells.str.startswith(colorText.FAIL), 0.0, np.nan),
+        )
+        returns[col] = pd.to_numeric(
+            cells.str.replace(colorText.GREEN, "", regex=False)
+            .str.replace(colorText.FAIL, "", regex=False)
+            .str.replace(colorText.END, "", regex=False)
+            .str.rstrip("%"),
+            errors="coerce",
+        )
+    return (
+        pd.DataFrame(returns, index=df.index),
+        pd.DataFrame(wins, index=df.index),
+    )
+
+
+# Hit-rate (%), count and mean/median forward return for each stock and each
+# period, plus "Overall" across the periods and a "SUMMARY" row across stocks.
+def backtestStatistics(df):
+    periodColumns = [col for col in df.columns if str(col).endswith("-Pd")]
+    returns, wins = backtestOutcomes(df, periodColumns)
+    counted = wins.notna().to_numpy()
+    wins = wins.fillna(0).to_numpy(dtype=np.float64)
+    returns = returns.where(counted).to_numpy(dtype=np.float64)
+    # NaN returns count for the hit rate, but not for the mean/median
+    valued = ~np.isnan(returns)
+    codes, stocks = pd.factorize(df["Stock"], sort=True)
+    # Everything per stock comes out of a single groupby over the stock codes
+    # of the results. "Overall" needs the returns of all periods stacked up.
+    periods = len(periodColumns)
+    grouped = pd.DataFrame(
+        np.hstack([wins, counted, valued, returns]), index=codes
+    ).groupby(level=0)
+    sums = grouped.sum().to_numpy()
+    winCounts, counts = sums[:, :periods], sums[:, periods : 2 * periods]
+    valueCounts = sums[:, 2 * periods : 3 * periods]
+    returnSums = sums[:, 3 * periods :]
+    returnMedians = (
+        grouped[list(range(3 * periods, 4 * periods))].median().to_numpy()
+    )
+    overallMedians = (
+        pd.Series(returns.ravel(), index=np.repeat(codes, periods))
+        .groupby(level=0)
+        .median()
+        .reindex(range(len(stocks)))
+        .to_numpy()
+    )
+    rows = {
+        "HitRate": [winCounts, winCounts.sum(axis=1)],
+        "Count": [counts, counts.sum(axis=1)],
+        "Mean": [returnSums, returnSums.sum(axis=1)],
+        "Median": [returnMedians, overallMedians],
+        "Valued": [valueCounts, valueCounts.sum(axis=1)],
+    }
+    summary = {
+        "HitRate": [winCounts.sum(axis=0), winCounts.sum()],
+        "Count": [counts.sum(axis=0), counts.sum()],
+        "Mean": [returnSums.sum(axis=0), returnSums.sum()],
+        "Median": [np.nanmedian(returns, axis=0), np.nanmedian(returns)]
+        if valued.any()
+        else [np.full(periods, np.nan), np.nan],
+        "Valued": [valueCounts.sum(axis=0), valueCounts.sum()],
+    }
+    statistics = {}
+    for stat in ["HitRate", "Count", "Mean", "Median", "Valued"]:
+        values = np.vstack(
+            [
+                np.column_stack(rows[stat]),
+                np.append(*summary[stat])[None, :],
+            ]
+        )
+        statistics[stat] = values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        statistics["HitRate"] = statistics["HitRate"] * 100 / statistics["Count"]
+        statistics["Mean"] = statistics["Mean"] / statistics["Valued"]
+    columns = pd.MultiIndex.from_product(
+        [periodColumns + ["Overall"], ["HitRate", "Count", "Mean", "Median"]]
+    )
+    result = pd.DataFrame(
+        np.stack(
+            [statistics[stat] for stat in ["HitRate", "Count", "Mean", "Median"]],
+            axis=2,
+        ).reshape(len(stocks) + 1, -1),
+        index=pd.Index(list(stocks) + ["SUMMARY"], name="Stock"),
+        columns=columns,
+    )
+    for col in periodColumns + ["Overall"]:
+        result[(col, "Count")] = result[(col, "Count")].astype(int)
+    return result
 
 
 def backtestSummary(df):
-    summary = {}
-    overall = {}
-    summaryList = []
-    net_positives = 0
-    net_negatives = 0
     if df is None:
         return
-    df.drop_duplicates()
-    df_grouped = df.groupby("Stock")
-    for col in df.keys():
-        if str(col).endswith("-Pd"):
-            overall[col] = [0, 0]
-    # iterate over each group of stock rows
-    for stock_name, df_group in df_grouped:
-        # for row_index, row in df_group.iterrows():
-        group_positives = 0
-        group_negatives = 0
-        summary["Stock"] = stock_name
-        for col in df_group.keys():
-            if str(col).endswith("-Pd"):
-                col_positives = (
-                    df_group[col]
-                    .astype(str)
-                    .str.count(colorText.GREEN.replace("[", "\["))
-                    .sum()
-                )
-                col_negatives = (
-                    df_group[col]
-                    .astype(str)
-                    .str.count(colorText.FAIL.replace("[", "\["))
-                    .sum()
-                )
-                group_positives += col_positives
-                group_negatives += col_negatives
-                overall[col] = [
-                    overall[col][0] + col_positives,
-                    overall[col][1] + col_negatives,
-                ]
-                overAllPeriodPrediction = (
-                    col_positives * 100 / (col_positives + col_negatives)
-                )
-                if col_positives + col_negatives == 0:
-                    summary[col] = "-"
-                else:
-                    summary[
-                        col
-                    ] = f"{Utility.tools.formattedBacktestOutput(overAllPeriodPrediction)} of ({col_positives+col_negatives})"
-        overAllRowPrediction = (
-            group_positives * 100 / (group_positives + group_negatives)
-        )
-        if group_positives + group_negatives == 0:
-            summary["Overall"] = "-"
-        else:
-            summary[
-                "Overall"
-            ] = f"{Utility.tools.formattedBacktestOutput(overAllRowPrediction)} of ({group_positives+group_negatives})"
-        summaryList.append(summary)
-        summary = {}
-        net_positives += group_positives
-        net_negatives += group_negatives
-
-    # Now prepare overall summary
-    summary["Stock"] = "SUMMARY"
-    for col in overall.keys():
-        col_positives = overall[col][0]
-        col_negatives = overall[col][1]
-        if col_positives + col_negatives == 0:
-            summary[col] = "-"
-        else:
-            summary[
-                col
-            ] = f"{Utility.tools.formattedBacktestOutput((col_positives*100/(col_positives+col_negatives)))} of ({col_positives+col_negatives})"
-    if net_positives + net_negatives == 0:
-        summary["Overall"] = "-"
-    else:
-        summary[
-            "Overall"
-        ] = f"{Utility.tools.formattedBacktestOutput(net_positives*100/(net_positives+net_negatives))} of ({net_positives+net_negatives})"
-    summaryList.append(summary)
-    summary_df = pd.DataFrame(summaryList, columns=summary.keys())
+    statistics = backtestStatistics(df)
+    periods = list(statistics.columns.get_level_values(0).unique())
+    summary_df = pd.DataFrame({"Stock": statistics.index})
+    for col in periods:
+        summary_df[col] = [
+            "-"
+            if count == 0
+            else f"{Utility.tools.formattedBacktestOutput(hitRate)} of ({count})"
+            for hitRate, count in zip(
+                statistics[(col, "HitRate")].to_numpy(),
+                statistics[(col, "Count")].to_numpy(),
+            )
+        ]
     return summary_df
@@ -23,11 +23,52 @@
 
 """
 
+import numpy as np
+import pandas as pd
 from PKDevTools.classes.ColorText import colorText
 
+from pkscreener import Imports
 from pkscreener.classes.Pktalib import pktalib
 
 
+# TA-Lib's candle colour: 1 for a white candle, -1 for a black one
+def _candleColor(open, close):
+    return np.where(close >= open, 1, -1)
+
+
+# TA-Lib's CDLENGULFING on the last candle of each row
+def _engulfing(open, high, low, close):
+    o1, c1 = open[:, -2], close[:, -2]
+    o, c = open[:, -1], close[:, -1]
+    color = _candleColor(o, c)
+    prior = _candleColor(o1, c1)
+    bullish = (
+        (color == 1)
+        & (prior == -1)
+        & (((c >= o1) & (o < c1)) | ((c > o1) & (o <= c1)))
+    )
+    bearish = (
+        (color == -1)
+        & (prior == 1)
+        & (((o >= c1) & (c < o1)) | ((o > c1) & (c <= o1)))
+    )
+    # Engulfing with an equal open or close is reported as 80 instead of 100
+    strength = np.where((o != c1) & (c != o1), 100, 80)
+    return np.where(bullish | bearish, color * strength, 0)
+
+
+# TA-Lib's CDL3OUTSIDE on the last candle of each row
+def _threeOutside(open, high, low, close):
+    o2, c2 = open[:, -3], close[:, -3]
+    o1, c1 = open[:, -2], close[:, -2]
+    c = close[:, -1]
+    first = _candleColor(o2, c2)
+    second = _candleColor(o1, c1)
+    up = (second == 1) & (first == -1) & (c1 > o2) & (o1 < c2) & (c > c1)
+    down = (second == -1) & (first == 1) & (o1 > c2) & (c1 < o2) & (c < c1)
+    return np.where(up | down, second * 100, 0)
+
+
 class CandlePatterns:
     reversalPatternsBullish = [
         "Morning Star",
@@ -51,286 +92,186 @@ class CandlePatterns:
         "Shooting Star",
         "Gravestone Doji",
     ]
+    # (pktalib function, TA-Lib lookback, (pattern, colour, saved pattern) for a
+    # positive value, the same for a negative value or None if the sign does not
+    # matter), from the highest priority to the lowest.
+    patterns = [
+        ("CDLDOJI", 10, ("Doji", "", "Doji"), None),
+        ("CDLMORNINGSTAR", 12, ("Morning Star", colorText.GREEN, "Morning Star"), None),
+        (
+            "CDLMORNINGDOJISTAR",
+            12,
+            ("Morning Doji Star", colorText.GREEN, "Morning Doji Star"),
+            None,
+        ),
+        ("CDLEVENINGSTAR", 12, ("Evening Star", colorText.FAIL, "Evening Star"), None),
+        (
+            "CDLEVENINGDOJISTAR",
+            12,
+            ("Evening Doji Star", colorText.FAIL, "Evening Doji Star"),
+            None,
+        ),
+        (
+            "CDLLADDERBOTTOM",
+            14,
+            ("Ladder Bottom", colorText.GREEN, "Bullish Ladder Bottom"),
+            ("Ladder Bottom", colorText.FAIL, "Bearish Ladder Bottom"),
+        ),
+        (
+            "CDL3LINESTRIKE",
+            8,
+            ("3 Line Strike", colorText.GREEN, "3 Line Strike"),
+            ("3 Line Strike", colorText.FAIL, "3 Line Strike"),
+        ),
+        (
+            "CDL3BLACKCROWS",
+            13,
+            ("3 Black Crows", colorText.FAIL, "3 Black Crows"),
+            None,
+        ),
+        (
+            "CDL3INSIDE",
+            12,
+            ("3 Outside Up", colorText.GREEN, "3 Inside Up"),
+            ("3 Outside Down", colorText.FAIL, "3 Inside Down"),
+        ),
+        (
+            "CDL3OUTSIDE",
+            3,
+            ("3 Outside Up", colorText.GREEN, "3 Outside Up"),
+            ("3 Outside Down", colorText.FAIL, "3 Outside Down"),
+        ),
+        (
+            "CDL3WHITESOLDIERS",
+            12,
+            ("3 White Soldiers", colorText.GREEN, "3 White Soldiers"),
+            None,
+        ),
+        (
+            "CDLHARAMI",
+            11,
+            ("Bullish Harami", colorText.GREEN, "Bullish Harami"),
+            ("Bearish Harami", colorText.FAIL, "Bearish Harami"),
+        ),
+        (
+            "CDLHARAMICROSS",
+            11,
+            ("Bullish Harami Cross", colorText.GREEN, "Bullish Harami Cross"),
+            ("Bearish Harami Cross", colorText.FAIL, "Bearish Harami Cross"),
+        ),
+        (
+            "CDLMARUBOZU",
+            10,
+            ("Bullish Marubozu", colorText.GREEN, "Bullish Marubozu"),
+            ("Bearish Marubozu", colorText.FAIL, "Bearish Marubozu"),
+        ),
+        ("CDLHANGINGMAN", 11, ("Hanging Man", colorText.FAIL, "Hanging Man"), None),
+        ("CDLHAMMER", 11, ("Hammer", colorText.GREEN, "Hammer"), None),
+        (
+            "CDLINVERTEDHAMMER",
+            11,
+            ("Inverted Hammer", colorText.GREEN, "Inverted Hammer"),
+            None,
+        ),
+        (
+            "CDLSHOOTINGSTAR",
+            11,
+            ("Shooting Star", colorText.FAIL, "Shooting Star"),
+            None,
+        ),
+        (
+            "CDLDRAGONFLYDOJI",
+            10,
+            ("Dragonfly Doji", colorText.GREEN, "Dragonfly Doji"),
+            None,
+        ),
+        (
+            "CDLGRAVESTONEDOJI",
+            10,
+            ("Gravestone Doji", colorText.FAIL, "Gravestone Doji"),
+            None,
+        ),
+        (
+            "CDLENGULFING",
+            2,
+            ("Bullish Engulfing", colorText.GREEN, "Bullish Engulfing"),
+            ("Bearish Engulfing", colorText.FAIL, "Bearish Engulfing"),
+        ),
+    ]
+    # Patterns evaluated straight on the arrays instead of through pktalib.
+    # With TA-Lib, these are the only ones that can fire on the 4 candles
+    # findPattern looks at: every other pattern needs a longer lookback.
+    kernels = {"CDL3OUTSIDE": _threeOutside, "CDLENGULFING": _engulfing}
 
     def __init__(self):
         pass
 
     # Find candle-stick patterns
-    # Arrange if statements with max priority from top to bottom
+    # The first of the patterns found on the latest candle wins
     def findPattern(self, data, dict, saveDict):
         data = data.head(4)
         data = data[::-1]
-        # Only 'doji' and 'inside' is internally implemented by pandas_ta.
-        # Otherwise, for the rest of the candle patterns, they also need
-        # TA-Lib.
-        check = pktalib.CDLDOJI(data["Open"], data["High"], data["Low"], data["Close"])
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = colorText.BOLD + "Doji" + colorText.END
-            saveDict["Pattern"] = "Doji"
-            return True
-
-        check = pktalib.CDLMORNINGSTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.GREEN + "Morning Star" + colorText.END
-            )
-            saveDict["Pattern"] = "Morning Star"
-            return True
-
-        check = pktalib.CDLMORNINGDOJISTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.GREEN + "Morning Doji Star" + colorText.END
-            )
-            saveDict["Pattern"] = "Morning Doji Star"
-            return True
-
-        check = pktalib.CDLEVENINGSTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.FAIL + "Evening Star" + colorText.END
-            )
-            saveDict["Pattern"] = "Evening Star"
-            return True
-
-        check = pktalib.CDLEVENINGDOJISTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.FAIL + "Evening Doji Star" + colorText.END
-            )
-            saveDict["Pattern"] = "Evening Doji Star"
-            return True
-
-        check = pktalib.CDLLADDERBOTTOM(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.GREEN + "Ladder Bottom" + colorText.END
-                )
-                saveDict["Pattern"] = "Bullish Ladder Bottom"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + "Ladder Bottom" + colorText.END
-                )
-                saveDict["Pattern"] = "Bearish Ladder Bottom"
-            return True
-
-        check = pktalib.CDL3LINESTRIKE(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.GREEN + "3 Line Strike" + colorText.END
-                )
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + "3 Line Strike" + colorText.END
-                )
-            saveDict["Pattern"] = "3 Line Strike"
-            return True
-
-        check = pktalib.CDL3BLACKCROWS(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.FAIL + "3 Black Crows" + colorText.END
-            )
-            saveDict["Pattern"] = "3 Black Crows"
-            return True
-
-        check = pktalib.CDL3INSIDE(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.GREEN + "3 Outside Up" + colorText.END
-                )
-                saveDict["Pattern"] = "3 Inside Up"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + "3 Outside Down" + colorText.END
-                )
-                saveDict["Pattern"] = "3 Inside Down"
-            return True
-
-        check = pktalib.CDL3OUTSIDE(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.GREEN + "3 Outside Up" + colorText.END
-                )
-                saveDict["Pattern"] = "3 Outside Up"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + "3 Outside Down" + colorText.END
-                )
-                saveDict["Pattern"] = "3 Outside Down"
-            return True
-
-        check = pktalib.CDL3WHITESOLDIERS(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.GREEN + "3 White Soldiers" + colorText.END
-            )
-            saveDict["Pattern"] = "3 White Soldiers"
-            return True
-
-        check = pktalib.CDLHARAMI(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.GREEN + "Bullish Harami" + colorText.END
-                )
-                saveDict["Pattern"] = "Bullish Harami"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + "Bearish Harami" + colorText.END
-                )
-                saveDict["Pattern"] = "Bearish Harami"
-            return True
-
-        check = pktalib.CDLHARAMICROSS(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD
-                    + colorText.GREEN
-                    + "Bullish Harami Cross"
-                    + colorText.END
-                )
-                saveDict["Pattern"] = "Bullish Harami Cross"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD
-                    + colorText.FAIL
-                    + "Bearish Harami Cross"
-                    + colorText.END
-                )
-                saveDict["Pattern"] = "Bearish Harami Cross"
-            return True
-
-        check = pktalib.CDLMARUBOZU(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD
-                    + colorText.GREEN
-                    + "Bullish Marubozu"
-                    + colorText.END
-                )
-                saveDict["Pattern"] = "Bullish Marubozu"
+        values = self.patternMatrix(
+            *[
+                data[column].to_numpy(dtype=np.float64)[None, :]
+                for column in ["Open", "High", "Low", "Close"]
+            ]
+        )[0]
+        found = CandlePatterns.labelFor(values)
+        if found is None:
+            dict["Pattern"] = ""
+            saveDict["Pattern"] = ""
+            return False
+        pattern, color, saved = found
+        dict["Pattern"] = colorText.BOLD + color + pattern + colorText.END
+        saveDict["Pattern"] = saved
+        return True
+
+    # (pattern, colour, saved pattern) of the highest priority pattern in a
+    # row of patternMatrix, or None if there is none.
+    @staticmethod
+    def labelFor(values):
+        for (_, _, bullish, bearish), value in zip(CandlePatterns.patterns, values):
+            if value != 0:
+                return bullish if (value > 0 or bearish is None) else bearish
+        return None
+
+    # Value of every pattern (columns, in the order of patterns) on the last
+    # candle of every stock (rows). The arrays are stocks x candles, oldest
+    # candle first, with NaN wherever a stock has no data.
+    # This is a table-driven lookup: patterns with a kernel are computed for
+    # all rows at once, any other pattern is still computed through pktalib
+    # row by row (always so with pandas_ta).
+    @staticmethod
+    def patternMatrix(open, high, low, close):
+        arrays = [
+            np.atleast_2d(np.asarray(a, dtype=np.float64))
+            for a in [open, high, low, close]
+        ]
+        rows, window = arrays[0].shape
+        matrix = np.zeros((rows, len(CandlePatterns.patterns)), dtype=np.int32)
+        # TA-Lib starts at the first candle where all prices are known and
+        # reports a pattern only if it has seen more candles than its lookback.
+        known = np.logical_and.reduce([np.isfinite(a) for a in arrays])
+        candles = np.where(known.any(axis=1), window - known.argmax(axis=1), 0)
+        for column, (function, lookback, _, _) in enumerate(CandlePatterns.patterns):
+            if Imports["talib"]:
+                fits = candles > lookback
+                if not fits.any():
+                    continue
+                kernel = CandlePatterns.kernels.get(function)
+                if kernel is not None:
+                    matrix[:, column] = np.where(fits, kernel(*arrays), 0)
+                    continue
+                stocks = np.flatnonzero(fits)
             else:
-                dict["Pattern"] = (
-                    colorText.BOLD + colorText.FAIL + "Bearish Marubozu" + colorText.END
+                # pandas_ta has its own rules, so leave it all to pktalib
+                stocks = range(rows)
+            for row in stocks:
+                check = getattr(pktalib, function)(
+                    *[pd.Series(a[row]) for a in arrays]
                 )
-                saveDict["Pattern"] = "Bearish Marubozu"
-            return True
-
-        check = pktalib.CDLHANGINGMAN(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.FAIL + "Hanging Man" + colorText.END
-            )
-            saveDict["Pattern"] = "Hanging Man"
-            return True
-
-        check = pktalib.CDLHAMMER(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.GREEN + "Hammer" + colorText.END
-            )
-            saveDict["Pattern"] = "Hammer"
-            return True
-
-        check = pktalib.CDLINVERTEDHAMMER(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.GREEN + "Inverted Hammer" + colorText.END
-            )
-            saveDict["Pattern"] = "Inverted Hammer"
-            return True
-
-        check = pktalib.CDLSHOOTINGSTAR(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.FAIL + "Shooting Star" + colorText.END
-            )
-            saveDict["Pattern"] = "Shooting Star"
-            return True
-
-        check = pktalib.CDLDRAGONFLYDOJI(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.GREEN + "Dragonfly Doji" + colorText.END
-            )
-            saveDict["Pattern"] = "Dragonfly Doji"
-            return True
-
-        check = pktalib.CDLGRAVESTONEDOJI(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            dict["Pattern"] = (
-                colorText.BOLD + colorText.FAIL + "Gravestone Doji" + colorText.END
-            )
-            saveDict["Pattern"] = "Gravestone Doji"
-            return True
-
-        check = pktalib.CDLENGULFING(
-            data["Open"], data["High"], data["Low"], data["Close"]
-        )
-        if check is not None and check.tail(1).item() != 0:
-            if check.tail(1).item() > 0:
-                dict["Pattern"] = (
-                    colorText.BOLD
-                    + colorText.GREEN
-                    + "Bullish Engulfing"
-                    + colorText.END
-                )
-                saveDict["Pattern"] = "Bullish Engulfing"
-            else:
-                dict["Pattern"] = (
-                    colorText.BOLD
-                    + colorText.FAIL
-                    + "Bearish Engulfing"
-                    + colorText.END
-                )
-                saveDict["Pattern"] = "Bearish Engulfing"
-            return True
-
-        dict["Pattern"] = ""
-        saveDict["Pattern"] = ""
-        return False
+                if check is not None:
+                    value = check.tail(1).item()
+                    matrix[row, column] = 0 if pd.isna(value) else value
+        return matrix
@@ -62,6 +62,7 @@ class tools:
         self.maxNetworkRetryCount = 10
         self.backtestPeriod = 30
         self.minVolume = 10000
+        self.downloadBatchSize = 50
         self.logger = None
 
     @property
@@ -123,6 +124,7 @@ class tools:
             parser.set("config", "maxNetworkRetryCount", str(self.maxNetworkRetryCount))
             parser.set("config", "backtestPeriod", str(self.backtestPeriod))
             parser.set("config", "minimumVolume", str(self.minVolume))
+            parser.set("config", "downloadBatchSize", str(self.downloadBatchSize))
             try:
                 fp = open("pkscreener.ini", "w")
                 parser.write(fp)
@@ -242,6 +244,7 @@ class tools:
             parser.set("config", "maxNetworkRetryCount", self.maxNetworkRetryCount)
             parser.set("config", "backtestPeriod", self.backtestPeriod)
             parser.set("config", "minimumVolume", self.minVolume)
+            parser.set("config", "downloadBatchSize", str(self.downloadBatchSize))
             # delete stock data due to config change
             self.deleteFileWithPattern()
             print(
@@ -325,6 +328,14 @@ class tools:
                 )
                 self.backtestPeriod = int(parser.get("config", "backtestPeriod"))
                 self.minVolume = int(parser.get("config", "minimumVolume"))
+                # Not asked for by setConfig, so older configs may not have it
+                self.downloadBatchSize = int(
+                    parser.get(
+                        "config",
+                        "downloadBatchSize",
+                        fallback=str(self.downloadBatchSize),
+                    )
+                )
             except configparser.NoOptionError as e:
                 self.default_logger.debug(e, exc_info=True)
                 # input(colorText.BOLD + colorText.FAIL +
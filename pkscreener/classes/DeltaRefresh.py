@@ -0,0 +1,154 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import datetime
+import re
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.StockDataStore import StockDataStore
+
+
+# Brings a cached snapshot of daily stock data up to date by downloading only
+# the candles after the last one each stock already has, instead of the whole
+# configManager.period again. The last stored candle is downloaded again along
+# with the new ones. If it comes back different (e.g. after a split or after a
+# bad candle got corrected), or if the new candles are broken, that stock is
+# re-synced, i.e. downloaded again in full.
+class DeltaRefresh:
+    # Relative change of the overlapping close that means the history got
+    # adjusted since it was stored
+    tolerance = 0.005
+    priceColumns = ["Open", "High", "Low", "Close"]
+
+    def __init__(self, fetcher, configManager, proxyServer=None):
+        self.fetcher = fetcher
+        self.configManager = configManager
+        self.proxyServer = proxyServer
+
+    # Number of days in a period like "280d", None for anything else
+    @staticmethod
+    def periodDays(period):
+        match = re.fullmatch(r"(\d+)d", str(period))
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def upTo(frame, lastDate):
+        if frame is None or len(frame) == 0:
+            return frame
+        return frame[np.asarray(frame.index.date) <= lastDate]
+
+    # Appends the fresh candles to the stored ones. Returns None when the stock
+    # needs to be re-synced instead.
+    @staticmethod
+    def merge(stored, fresh, tolerance=tolerance):
+        if fresh is None or len(fresh) == 0:
+            return None
+        if any(column not in fresh.columns for column in stored.columns):
+            return None
+        if stored.index.tz is not None and fresh.index.tz is None:
+            fresh = fresh.tz_localize(stored.index.tz)
+        lastCandle = stored.index[-1]
+        if lastCandle not in fresh.index:
+            return None
+        storedClose = float(stored["Close"].iloc[-1])
+        freshClose = float(fresh.loc[lastCandle, "Close"])
+        if not np.isfinite(freshClose) or abs(freshClose - storedClose) > (
+            tolerance * abs(storedClose)
+        ):
+            return None
+        newer = fresh.loc[fresh.index > lastCandle, stored.columns]
+        prices = newer[[c for c in DeltaRefresh.priceColumns if c in newer.columns]]
+        if newer.isna().any().any() or (prices <= 0).any().any():
+            return None
+        return pd.concat([stored, newer.astype(stored.dtypes)])
+
+    # Drops the candles that a full download of the period wouldn't have
+    def trim(self, frame, today):
+        days = DeltaRefresh.periodDays(self.configManager.period)
+        if days is None:
+            return frame
+        return frame[
+            np.asarray(frame.index.date) >= today - datetime.timedelta(days=days)
+        ]
+
+    # Returns the up to date frames of the stocks in stockData (split dicts or
+    # DataFrames) with candles up to lastDate, and the stocks that had to be
+    # re-synced. Stocks that couldn't be downloaded are left out.
+    def refresh(self, stockData, lastDate, today=None):
+        today = lastDate if today is None else today
+        refreshed = {}
+        stored = {}
+        resync = []
+        # Stocks that miss the same number of days are downloaded together
+        missingDays = {}
+        for stock in list(stockData.keys()):
+            try:
+                frame = StockDataStore._frameFor(stockData.get(stock))
+                if not isinstance(frame.index, pd.DatetimeIndex):
+                    # Don't touch the index of the caller's frame
+                    frame = frame.copy(deep=False)
+                    frame.index = pd.DatetimeIndex(frame.index)
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+                resync.append(stock)
+                continue
+            if len(frame) == 0:
+                resync.append(stock)
+                continue
+            lastStored = frame.index[-1].date()
+            if lastStored >= lastDate:
+                refreshed[stock] = frame
+                continue
+            stored[stock] = frame
+            days = (today - lastStored).days + 1
+            missingDays.setdefault(days, []).append(stock)
+        for days, stocks in missingDays.items():
+            fresh = self.fetcher.fetchStockDataInBatches(
+                stocks, f"{days}d", self.configManager.duration, self.proxyServer
+            )
+            for stock in stocks:
+                merged = DeltaRefresh.merge(
+                    stored[stock],
+                    DeltaRefresh.upTo(fresh.get(stock), lastDate),
+                    self.tolerance,
+                )
+                if merged is None:
+                    resync.append(stock)
+                else:
+                    refreshed[stock] = self.trim(merged, today)
+        if len(resync) > 0:
+            full = self.fetcher.fetchStockDataInBatches(
+                resync,
+                self.configManager.period,
+                self.configManager.duration,
+                self.proxyServer,
+            )
+            for stock, frame in full.items():
+                frame = DeltaRefresh.upTo(frame, lastDate)
+                if len(frame) > 0:
+                    refreshed[stock] = frame
+        return refreshed, resync
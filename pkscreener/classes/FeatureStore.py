@@ -0,0 +1,74 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+
+from pkscreener.classes.Pktalib import pktalib
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+# Indicators of one stock's data (latest candle first, as the validators of
+# Screener.tools get it), computed the first time a validator asks for them
+# and kept by name, input columns and parameters, so the validators of a scan
+# share them instead of computing them again.
+# Indicators are computed on the data reversed (oldest candle first) once.
+# Like the validators did, they're computed on the data with NaN and inf
+# replaced by 0 unless clean=False asks for the data as it is. The two are
+# the same when the prices have no such values, and share their indicators.
+class FeatureStore:
+    def __init__(self, data):
+        self.data = data
+        self.features = {}
+        self.frames = {}
+        self.finite = None
+
+    def isFinite(self):
+        if self.finite is None:
+            columns = [column for column in PRICE_COLUMNS if column in self.data]
+            prices = self.data[columns].to_numpy(dtype=np.float64)
+            self.finite = bool(np.isfinite(prices).all())
+        return self.finite
+
+    # The data with the oldest candle first
+    def frame(self, clean=True):
+        clean = clean or self.isFinite()
+        if clean not in self.frames:
+            data = self.data
+            if clean:
+                data = data.fillna(0)
+                data = data.replace([np.inf, -np.inf], 0)
+            self.frames[clean] = data[::-1]
+        return self.frames[clean]
+
+    # pktalib.<name>(*columns, *params) on frame(clean), or on the whole
+    # frame when columns is None. Results are oldest candle first.
+    def get(self, name, *params, columns=("Close",), clean=True):
+        clean = clean or self.isFinite()
+        key = (name, columns, params, clean)
+        if key not in self.features:
+            frame = self.frame(clean)
+            inputs = [frame] if columns is None else [frame[c] for c in columns]
+            self.features[key] = getattr(pktalib, name)(*inputs, *params)
+        return self.features[key]
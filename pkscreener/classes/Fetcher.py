@@ -37,10 +37,16 @@ from PKDevTools.classes.log import default_logger
 from PKDevTools.classes.SuppressOutput import SuppressOutput
 from PKNSETools.PKNSEStockDataFetcher import nseStockDataFetcher
 
+from pkscreener.classes.StockBlocks import StockBlocks
+from pkscreener.classes.StockDownloader import AsyncStockDownloader
+
 # This Class Handles Fetching of Stock Data over the internet
 
 
 class screenerStockDataFetcher(nseStockDataFetcher):
+    # The AsyncStockDownloader of the running startStockDataStream, if any
+    stockDataStream = None
+
     # Fetch stock price data from Yahoo finance
     def fetchStockData(
         self,
@@ -104,6 +110,101 @@ class screenerStockDataFetcher(nseStockDataFetcher):
             )
         return data
 
+    # Fetch stock price data of many stocks from Yahoo finance, with one
+    # download per batch of stocks instead of one per stock. Stocks for
+    # which nothing came back are left out.
+    def fetchStockDataInBatches(
+        self, stockCodes, period, duration, proxyServer=None, batchSize=None
+    ):
+        if batchSize is None:
+            batchSize = self.configManager.downloadBatchSize
+        batchSize = max(1, int(batchSize))
+        stockData = {}
+        for start in range(0, len(stockCodes), batchSize):
+            batch = stockCodes[start : start + batchSize]
+            try:
+                with SuppressOutput(suppress_stdout=True, suppress_stderr=True):
+                    data = yf.download(
+                        tickers=[stockCode + ".NS" for stockCode in batch],
+                        period=period,
+                        interval=duration,
+                        proxy=proxyServer,
+                        progress=False,
+                        timeout=self.configManager.longTimeout,
+                        group_by="ticker",
+                    )
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+                continue
+            stockData.update(screenerStockDataFetcher.splitBatch(data, batch))
+        return stockData
+
+    # Splits what yf.download returns for a batch of stocks into one frame per
+    # stock, looking the same as if that stock had been downloaded alone.
+    @staticmethod
+    def splitBatch(data, stockCodes):
+        stockData = {}
+        if data is None or len(data) == 0:
+            return stockData
+        if not isinstance(data.index, pd.DatetimeIndex):
+            # Concatenating unaligned stocks can leave the dates as objects
+            data.index = pd.DatetimeIndex(data.index, name=data.index.name)
+        multiIndexed = isinstance(data.columns, pd.MultiIndex)
+        tickers = data.columns.get_level_values(0) if multiIndexed else []
+        for stockCode in stockCodes:
+            ticker = (stockCode + ".NS").upper()
+            if multiIndexed:
+                if ticker not in tickers:
+                    continue
+                frame = data[ticker]
+            elif len(stockCodes) == 1:
+                frame = data
+            else:
+                continue
+            # Stocks in a batch are aligned on the dates of all of them
+            frame = frame.dropna(how="all")
+            if len(frame) == 0:
+                continue
+            frame.columns.name = None
+            if "Volume" in frame.columns and not frame["Volume"].isna().any():
+                frame = frame.astype({"Volume": "int64"})
+            stockData[stockCode] = frame
+        return stockData
+
+    # Downloads the stocks that are not in stockDict yet in batches and saves
+    # them there the way the workers would, so that the workers find them
+    # when the screening starts. Returns the stocks that were downloaded.
+    def prefetchStockData(self, stockCodes, stockDict, proxyServer=None):
+        missing = [stockCode for stockCode in stockCodes if stockCode not in stockDict]
+        if len(missing) == 0:
+            return []
+        stockData = self.fetchStockDataInBatches(
+            missing, self.configManager.period, self.configManager.duration, proxyServer
+        )
+        stockDict.update(
+            {
+                stockCode: StockBlocks.fromFrame(data)
+                for stockCode, data in stockData.items()
+            }
+        )
+        return list(stockData.keys())
+
+    # Downloads the stocks in the background and hands each of them to
+    # callback(stockCode, data) as soon as its download completes. Returns the
+    # thread that does the downloads.
+    def startStockDataStream(self, stockCodes, callback, proxyServer=None):
+        self.stopStockDataStream()
+        self.stockDataStream = AsyncStockDownloader(self.configManager, proxyServer)
+        return self.stockDataStream.start(
+            stockCodes, self.configManager.period, self.configManager.duration, callback
+        )
+
+    # Gives up on the downloads of the stream that haven't started yet
+    def stopStockDataStream(self):
+        if self.stockDataStream is not None:
+            self.stockDataStream.stop()
+            self.stockDataStream = None
+
     # Get Daily Nifty 50 Index:
     def fetchLatestNiftyDaily(self, proxyServer=None):
         data = yf.download(
@@ -152,6 +253,17 @@ class screenerStockDataFetcher(nseStockDataFetcher):
         )
         return nifty_buy, banknifty_buy, nifty_sell, banknifty_sell
 
+    # Intraday candles of a ticker, used by the live 5-EMA scanner
+    def fetchIntradayBars(self, ticker, period="5d", interval="5m", proxyServer=None):
+        return yf.download(
+            tickers=ticker,
+            period=period,
+            interval=interval,
+            proxy=proxyServer,
+            progress=False,
+            timeout=self.configManager.longTimeout,
+        )
+
     # Load stockCodes from the watchlist.xlsx
     def fetchWatchlist(self):
         createTemplate = False
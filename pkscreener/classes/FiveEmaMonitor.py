@@ -0,0 +1,216 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import math
+from collections import deque
+
+import pandas as pd
+from PKDevTools.classes.ColorText import colorText
+
+# The 5-EMA intraday strategy. A candle that stays clear of the 5-EMA by more
+# than 0.5 is an alert candle, and the candle after it triggers a trade if it
+# closes back across the 5-EMA, with the alert candle's extreme as stop loss:
+#   sell on 5 minute candles: alert candle's low above the 5-EMA, SL its high
+#   buy on 15 minute candles: alert candle's high below the 5-EMA, SL its low
+
+
+# The 5-EMA and the trades of one series of candles, updated candle by
+# candle. Like IndicatorState, it is committed up to the second most recent
+# candle: the most recent one may still be forming, so it's replaced by every
+# update with the same time and only folded in once a later candle comes.
+class FiveEmaStream:
+    PERIOD = 5
+    GAP = 0.5
+
+    def __init__(self, action, riskReward=3, maxBars=400):
+        self.action = action
+        self.riskReward = riskReward
+        self.k = 2.0 / (FiveEmaStream.PERIOD + 1)
+        self.count = 0
+        self.total = 0.0
+        self.ema = math.nan
+        self.forming = None
+        self.alert = None
+        # (time, high, low, close, 5-EMA) of the committed candles
+        self.bars = deque(maxlen=maxBars)
+        # (time, SL, target) of the trades, oldest first
+        self.signals = []
+
+    def update(self, time, high, low, close):
+        if not all(math.isfinite(value) for value in (high, low, close)):
+            return
+        if self.forming is not None:
+            if time < self.forming[0]:
+                return
+            if time > self.forming[0]:
+                self.commit(*self.forming)
+        self.forming = (time, high, low, close)
+
+    def commit(self, time, high, low, close):
+        # The EMA follows TA-Lib: seeded with the average of the first closes
+        self.count += 1
+        if self.count <= FiveEmaStream.PERIOD:
+            self.total += close
+            if self.count < FiveEmaStream.PERIOD:
+                return
+            self.ema = self.total / FiveEmaStream.PERIOD
+        else:
+            self.ema = (close - self.ema) * self.k + self.ema
+        high, low, close, ema = [round(v, 2) for v in (high, low, close, self.ema)]
+        self.bars.append((time, high, low, close, ema))
+        if self.alert is not None:
+            stopLoss = self.alert
+            if (close < ema) if self.action == "sell" else (close > ema):
+                target = round(close - (stopLoss - close) * self.riskReward, 2)
+                self.signals.append((time, stopLoss, target))
+        if self.action == "sell":
+            self.alert = high if low - ema > FiveEmaStream.GAP else None
+        else:
+            self.alert = low if ema - high > FiveEmaStream.GAP else None
+
+
+# 5 minute candles of the instruments from Yahoo Finance. The first poll gets
+# 5 days of them to warm up with, later ones only the current day.
+class YahooBars:
+    def __init__(self, fetcher, proxyServer=None):
+        self.fetcher = fetcher
+        self.proxyServer = proxyServer
+        self.period = "5d"
+
+    def poll(self):
+        frames = {}
+        for name, ticker in FiveEmaMonitor.instruments.items():
+            frames[name] = self.fetcher.fetchIntradayBars(
+                ticker, period=self.period, proxyServer=self.proxyServer
+            )
+        self.period = "1d"
+        return frames
+
+
+# 5 minute candles replayed from a CSV file with Datetime, Instrument, High,
+# Low and Close columns. The first poll hands out historyBars candles of each
+# instrument, every later one the next barsPerPoll rows. A Datetime may repeat
+# to replay a candle that was still forming.
+class ReplayBars:
+    def __init__(self, path, barsPerPoll=1, historyBars=0):
+        data = pd.read_csv(path, parse_dates=["Datetime"], index_col="Datetime")
+        self.frames = {name: frame for name, frame in data.groupby("Instrument")}
+        self.barsPerPoll = barsPerPoll
+        self.position = 0
+        self.nextPosition = historyBars
+
+    def poll(self):
+        start, end = self.position, max(self.nextPosition, self.position + 1)
+        self.position = end
+        self.nextPosition = end + self.barsPerPoll
+        return {name: frame.iloc[start:end] for name, frame in self.frames.items()}
+
+    def exhausted(self):
+        return all(self.position >= len(frame) for frame in self.frames.values())
+
+
+# Live 5-EMA scanner of Nifty and Bank Nifty. It keeps a FiveEmaStream per
+# instrument for sells on the 5 minute candles from the source, and one for
+# buys on 15 minute candles put together from those same 5 minute candles.
+class FiveEmaMonitor:
+    instruments = {"nifty": "^NSEI", "banknifty": "^NSEBANK"}
+    columns = ["Time", "Stock/Index", "Action", "SL", "Target", "R:R"]
+
+    def __init__(self, source, riskReward=3):
+        self.source = source
+        self.riskReward = riskReward
+        self.streams = {}
+        for name in FiveEmaMonitor.instruments.keys():
+            self.streams[(name, "buy")] = FiveEmaStream("buy", riskReward)
+            self.streams[(name, "sell")] = FiveEmaStream("sell", riskReward)
+        # The 5 minute candles of the 15 minute candle each instrument is in
+        self.buckets = {name: (None, {}) for name in FiveEmaMonitor.instruments}
+        self.reported = {key: 0 for key in self.streams.keys()}
+        self.primed = False
+
+    # Folds the 5 minute candles (oldest first) of an instrument into its
+    # streams. Candles older than the ones seen already are left out.
+    def feed(self, name, bars):
+        if bars is None or len(bars) == 0:
+            return
+        if isinstance(bars.columns, pd.MultiIndex):
+            bars = bars.droplevel(1, axis=1)
+        sell = self.streams[(name, "sell")]
+        buy = self.streams[(name, "buy")]
+        for time, high, low, close in zip(
+            bars.index, bars["High"], bars["Low"], bars["Close"]
+        ):
+            if not all(math.isfinite(value) for value in (high, low, close)):
+                continue
+            if sell.forming is not None and time < sell.forming[0]:
+                continue
+            sell.update(time, high, low, close)
+            start, candles = self.buckets[name]
+            if start != time.floor("15min"):
+                start, candles = time.floor("15min"), {}
+                self.buckets[name] = (start, candles)
+            candles[time] = (high, low, close)
+            buy.update(
+                start,
+                max(candle[0] for candle in candles.values()),
+                min(candle[1] for candle in candles.values()),
+                candles[max(candles)][2],
+            )
+
+    # Polls the source and adds the trades that came up since the previous
+    # scan to result_df (with the latest on top). The trades in the history
+    # that the first scan warms up with aren't reported.
+    def scan(self, result_df=None):
+        for name, bars in self.source.poll().items():
+            self.feed(name, bars)
+        if result_df is None:
+            result_df = pd.DataFrame(columns=FiveEmaMonitor.columns)
+        rows = []
+        for (name, action), stream in self.streams.items():
+            if self.primed:
+                for signal in stream.signals[self.reported[(name, action)] :]:
+                    rows.append(self.row(name, action, *signal))
+            self.reported[(name, action)] = len(stream.signals)
+        self.primed = True
+        if len(rows) > 0:
+            result_df = pd.concat(
+                [result_df, pd.DataFrame(rows, columns=result_df.columns)], axis=0
+            )
+            result_df.reset_index(drop=True, inplace=True)
+        result_df.drop_duplicates(keep="last", inplace=True)
+        result_df.sort_values(by="Time", inplace=True)
+        return result_df[::-1]
+
+    def row(self, name, action, time, stopLoss, target):
+        return [
+            colorText.BLUE + str(time) + colorText.END,
+            colorText.BOLD + colorText.WARN + name.upper() + colorText.END,
+            colorText.BOLD
+            + (colorText.FAIL if action == "sell" else colorText.GREEN)
+            + action.upper()
+            + colorText.END,
+            colorText.FAIL + str(stopLoss) + colorText.END,
+            colorText.GREEN + str(target) + colorText.END,
+            f"1:{self.riskReward}",
+        ]
@@ -0,0 +1,287 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import copy
+import os
+import pickle
+from collections import deque
+
+import numpy as np
+from PKDevTools.classes import Archiver
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.PreprocessCache import INDICATOR_COLUMNS
+
+# Running state of the indicators that Screener.tools.preprocessData adds to
+# the stock data. It is built from a full computation once and then carries
+# the EMA values, Wilder RSI averages and rolling sums forward, so a re-scan
+# only has to process the candles that arrived since the previous run.
+#
+# The EMA and RSI recurrences depend on every candle since the first one of
+# the data, so the state belongs to data that starts at the very same candle.
+# Once the fetch window slides forward, the state is rebuilt from a full
+# computation, which keeps the indicators the same as preprocessing the data
+# afresh.
+#
+# The state is always committed up to the second most recent candle. The most
+# recent candle may still be forming (intraday), so it is recomputed from the
+# committed state on every run instead of being folded into it.
+class IndicatorState:
+    VERSION = 2
+    COLUMNS = INDICATOR_COLUMNS
+    # (column, timeperiod) of the moving averages preprocessData computes
+    MOVING_AVERAGES = [("SMA", 50), ("LMA", 200), ("SSMA", 9)]
+    VOLUME_PERIOD = 20
+    RSI_PERIOD = 14
+    CCI_PERIOD = 14
+    FASTK_PERIOD = 5
+    FASTD_PERIOD = 3
+    # Minimum number of candles before a state is built, so that every
+    # indicator is past its warm-up period.
+    MIN_ROWS = 200 + 2
+
+    def __init__(self, useEMA=False):
+        self.version = IndicatorState.VERSION
+        self.useEMA = useEMA
+        self.index = None
+        self.columns = {}
+        # The first closes of the data, which seed the averages
+        self.seedCloses = None
+        self.closes = deque(maxlen=200)
+        self.volumes = deque(maxlen=IndicatorState.VOLUME_PERIOD)
+        self.typicalPrices = deque(maxlen=IndicatorState.CCI_PERIOD)
+        self.rsis = deque(maxlen=IndicatorState.FASTK_PERIOD)
+        self.fastks = deque(maxlen=IndicatorState.FASTD_PERIOD)
+        self.closeSums = {}
+        self.volumeSum = 0.0
+        self.emas = {}
+        self.avgGain = 0.0
+        self.avgLoss = 0.0
+        self.prevClose = np.nan
+
+    # Builds the state from a frame (oldest candle first) whose indicator
+    # columns were just computed in full. Returns None if the frame is too
+    # short or has gaps for the state to be reliable.
+    @staticmethod
+    def fromFrame(data, useEMA=False):
+        if len(data) < IndicatorState.MIN_ROWS:
+            return None
+        prices = data[["Open", "High", "Low", "Close", "Volume"]].to_numpy(
+            dtype=np.float64
+        )
+        if not np.isfinite(prices).all():
+            return None
+        committed = len(data) - 1
+        state = IndicatorState(useEMA=useEMA)
+        state.index = data.index[:committed]
+        state.columns = {
+            column: data[column].to_numpy(dtype=np.float64)[:committed].copy()
+            for column in IndicatorState.COLUMNS
+        }
+        high, low, close, volume = (
+            prices[:committed, 1],
+            prices[:committed, 2],
+            prices[:committed, 3],
+            prices[:committed, 4],
+        )
+        state.seedCloses = close[:200].copy()
+        state.closes.extend(close[-200:])
+        state.volumes.extend(volume[-IndicatorState.VOLUME_PERIOD :])
+        state.typicalPrices.extend(
+            ((high + low + close) / 3)[-IndicatorState.CCI_PERIOD :]
+        )
+        state.rsis.extend(state.columns["RSI"][-IndicatorState.FASTK_PERIOD :])
+        state.fastks.extend(state.columns["FASTK"][-IndicatorState.FASTD_PERIOD :])
+        for column, timeperiod in IndicatorState.MOVING_AVERAGES:
+            state.closeSums[timeperiod] = float(np.sum(close[-timeperiod:]))
+            state.emas[timeperiod] = state.columns[column][-1]
+        state.volumeSum = float(np.sum(volume[-IndicatorState.VOLUME_PERIOD :]))
+        # Wilder's averages aren't part of the output, so replay them once
+        period = IndicatorState.RSI_PERIOD
+        diff = np.diff(close)
+        gain = np.where(diff < 0, 0.0, diff)
+        loss = np.where(diff < 0, -diff, 0.0)
+        avgGain = np.sum(gain[:period]) / period
+        avgLoss = np.sum(loss[:period]) / period
+        for up, down in zip(gain[period:], loss[period:]):
+            avgGain = (avgGain * (period - 1) + up) / period
+            avgLoss = (avgLoss * (period - 1) + down) / period
+        state.avgGain = avgGain
+        state.avgLoss = avgLoss
+        state.prevClose = close[-1]
+        if not all(np.isfinite(state.columns[c][-1]) for c in IndicatorState.COLUMNS):
+            return None
+        return state
+
+    # A copy that can step independently, without duplicating the columns
+    def copyRunningState(self):
+        other = copy.copy(self)
+        for name in ["closes", "volumes", "typicalPrices", "rsis", "fastks"]:
+            window = getattr(self, name)
+            setattr(other, name, deque(window, maxlen=window.maxlen))
+        other.closeSums = dict(self.closeSums)
+        other.emas = dict(self.emas)
+        return other
+
+    # Folds one candle into the state and returns the indicator values for it
+    def step(self, high, low, close, volume):
+        values = {}
+        for column, timeperiod in IndicatorState.MOVING_AVERAGES:
+            if self.useEMA:
+                k = 2.0 / (timeperiod + 1)
+                self.emas[timeperiod] = (close - self.emas[timeperiod]) * k + self.emas[
+                    timeperiod
+                ]
+                values[column] = self.emas[timeperiod]
+            else:
+                self.closeSums[timeperiod] += close - self.closes[-timeperiod]
+                values[column] = self.closeSums[timeperiod] / timeperiod
+        self.closes.append(close)
+        self.volumeSum += volume - self.volumes[0]
+        self.volumes.append(volume)
+        values["VolMA"] = self.volumeSum / IndicatorState.VOLUME_PERIOD
+
+        period = IndicatorState.RSI_PERIOD
+        diff = close - self.prevClose
+        up, down = (0.0, -diff) if diff < 0 else (diff, 0.0)
+        self.avgGain = (self.avgGain * (period - 1) + up) / period
+        self.avgLoss = (self.avgLoss * (period - 1) + down) / period
+        self.prevClose = close
+        total = self.avgGain + self.avgLoss
+        rsi = 100.0 * (self.avgGain / total) if abs(total) >= 0.00000001 else 0.0
+        values["RSI"] = rsi
+
+        typicalPrice = (high + low + close) / 3
+        self.typicalPrices.append(typicalPrice)
+        prices = np.array(self.typicalPrices)
+        average = prices.sum() / len(prices)
+        meanDeviation = np.abs(prices - average).sum() / len(prices)
+        delta = typicalPrice - average
+        values["CCI"] = (
+            delta / (0.015 * meanDeviation)
+            if delta != 0 and meanDeviation != 0
+            else 0.0
+        )
+
+        self.rsis.append(rsi)
+        highest, lowest = max(self.rsis), min(self.rsis)
+        diff = (highest - lowest) / 100.0
+        fastk = (rsi - lowest) / diff if diff != 0 else 0.0
+        self.fastks.append(fastk)
+        values["FASTK"] = fastk
+        values["FASTD"] = sum(self.fastks) / len(self.fastks)
+        return values
+
+    # Returns the indicator columns for data (oldest candle first) as a dict
+    # of arrays, computing only the candles after the committed one. Returns
+    # None if data doesn't start with the candles this state was built from,
+    # in which case the caller has to compute everything afresh.
+    def extend(self, data):
+        if self.index is None or len(data) <= len(self.index):
+            return None
+        position = len(self.index) - 1
+        # Same first candle, and no candle inserted or dropped since
+        if not data.index[: position + 1].equals(self.index):
+            return None
+        prices = data[["High", "Low", "Close", "Volume"]].to_numpy(dtype=np.float64)
+        high, low, close, volume = prices.T
+        # Older candles must be the very same ones (no splits/corrections since)
+        if not (
+            np.array_equal(close[: len(self.seedCloses)], self.seedCloses)
+            and np.array_equal(
+                close[position - 199 : position + 1], np.array(self.closes)
+            )
+            and np.array_equal(
+                volume[position - IndicatorState.VOLUME_PERIOD + 1 : position + 1],
+                np.array(self.volumes),
+            )
+            and np.isfinite(prices[position + 1 :]).all()
+        ):
+            return None
+        newRows = [[] for _ in IndicatorState.COLUMNS]
+        for row in range(position + 1, len(data)):
+            # The most recent candle is computed on a copy and not committed
+            target = self if row < len(data) - 1 else self.copyRunningState()
+            values = target.step(high[row], low[row], close[row], volume[row])
+            for column, rows in zip(IndicatorState.COLUMNS, newRows):
+                rows.append(values[column])
+        result = {
+            column: np.concatenate([self.columns[column], np.array(rows)])
+            for column, rows in zip(IndicatorState.COLUMNS, newRows)
+        }
+        committed = len(data) - 1
+        self.index = data.index[:committed]
+        self.columns = {
+            column: values[:committed] for column, values in result.items()
+        }
+        return result
+
+
+# Keeps one IndicatorState per stock on disk, next to the stock data cache.
+# Each stock is screened by a single worker at a time, so every state lives in
+# its own file and is replaced atomically.
+class IndicatorStateStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def forConfig(configManager):
+        return IndicatorStateStore(
+            os.path.join(
+                Archiver.get_user_outputs_dir(),
+                f"indicator_state_{configManager.duration}",
+            )
+        )
+
+    def pathFor(self, stock):
+        return os.path.join(self.directory, f"{stock}.pkl")
+
+    def get(self, stock, useEMA=False):
+        try:
+            with open(self.pathFor(stock), "rb") as f:
+                state = pickle.load(f)
+            if state.version != IndicatorState.VERSION or state.useEMA != useEMA:
+                return None
+            return state
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            return None
+
+    def put(self, stock, state):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.pathFor(stock)
+            with open(f"{path}.tmp", "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+
+    def delete(self, stock):
+        try:
+            os.remove(self.pathFor(stock))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,93 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import time
+from collections import OrderedDict
+
+from PKDevTools.classes.log import default_logger
+
+
+# Lorentzian classification of stocks. The classifier fits its features over
+# the whole of the stock data, so its outcome is kept per stock, keyed by the
+# number of candles and the latest candle, and the stock is only classified
+# again when its data changes. Every call logs how long it took.
+class LorentzianEngine:
+    maxEntries = 4096
+
+    def __init__(self):
+        self.signals = OrderedDict()
+        self.calls = 0
+        self.cachedCalls = 0
+        self.elapsed = 0.0
+
+    # Identifies the data (latest candle first) of a stock
+    @staticmethod
+    def keyFor(data, stockName):
+        if stockName is None or len(data) == 0:
+            return None
+        return (stockName, len(data), data.index[0], float(data["Close"].iloc[0]))
+
+    # (isNewBuySignal, isNewSellSignal) as of the latest candle of data, which
+    # has the latest candle first.
+    def signal(self, data, stockName=None):
+        started = time.perf_counter()
+        key = LorentzianEngine.keyFor(data, stockName)
+        cached = key is not None and key in self.signals
+        if cached:
+            self.signals.move_to_end(key)
+            signal = self.signals[key]
+        else:
+            signal = self.classify(data)
+            if key is not None:
+                self.signals[key] = signal
+                if len(self.signals) > LorentzianEngine.maxEntries:
+                    self.signals.popitem(last=False)
+        elapsed = time.perf_counter() - started
+        self.calls += 1
+        self.cachedCalls += cached
+        self.elapsed += elapsed
+        default_logger().debug(
+            f"Lorentzian classification of {stockName}: {elapsed:.4f}s"
+            f"{' (cached)' if cached else ''}, {self.elapsed:.2f}s over"
+            f" {self.calls} calls ({self.cachedCalls} cached)"
+        )
+        return signal
+
+    @staticmethod
+    def classify(data):
+        # advanced_ta pulls in sklearn and scipy, so it is only imported
+        # when a stock actually needs classifying.
+        from advanced_ta import LorentzianClassification
+
+        data = data[::-1].rename(
+            columns={
+                "Open": "open",
+                "Close": "close",
+                "High": "high",
+                "Low": "low",
+                "Volume": "volume",
+            }
+        )
+        latest = LorentzianClassification(data=data).df.iloc[-1]
+        return bool(latest["isNewBuySignal"]), bool(latest["isNewSellSignal"])
@@ -0,0 +1,129 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import json
+import time
+
+import numpy as np
+
+import pkscreener.classes.Utility as Utility
+
+
+# Forward pass in NumPy of a Keras Sequential model made of Dense layers, like
+# the Nifty prediction model, read straight from its HDF5 file. It gives the
+# model's predictions without importing TensorFlow.
+class DenseNetwork:
+    activations = {
+        "linear": lambda x: x,
+        "relu": lambda x: np.maximum(x, 0),
+        "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+        "tanh": np.tanh,
+    }
+
+    # layers are (kernel, bias, activation name), from the input onwards
+    def __init__(self, layers):
+        self.layers = layers
+
+    @staticmethod
+    def fromH5(path):
+        import h5py
+
+        with h5py.File(path, "r") as file:
+            config = json.loads(file.attrs["model_config"])
+            weights = file["model_weights"]
+            layers = []
+            for layer in config["config"]["layers"]:
+                if layer["class_name"] == "InputLayer":
+                    continue
+                if layer["class_name"] != "Dense":
+                    raise ValueError(f"Unsupported layer: {layer['class_name']}")
+                name = layer["config"]["name"]
+                group = weights[name][name]
+                kernel = np.array(group["kernel:0"])
+                if layer["config"].get("use_bias", True):
+                    bias = np.array(group["bias:0"])
+                else:
+                    bias = np.zeros(kernel.shape[1], dtype=kernel.dtype)
+                layers.append((kernel, bias, layer["config"]["activation"]))
+        return DenseNetwork(layers)
+
+    # Outputs (rows x units of the last layer) for the rows of inputs
+    def predict(self, inputs, **kwargs):
+        values = np.atleast_2d(np.asarray(inputs, dtype=np.float32))
+        for kernel, bias, activation in self.layers:
+            values = DenseNetwork.activations[activation](values @ kernel + bias)
+        return values
+
+
+# The Nifty prediction model and its scaler, loaded once per process instead
+# of on every prediction. It's loaded again once the downloaded model is old
+# enough for Utility.tools.getNiftyModel to fetch a newer one.
+class NiftyModelService:
+    maxAge = 604800
+    shared = None
+
+    def __init__(self):
+        self.model = None
+        self.pkl = None
+        self.loadedAt = 0
+
+    @staticmethod
+    def instance():
+        if NiftyModelService.shared is None:
+            NiftyModelService.shared = NiftyModelService()
+        return NiftyModelService.shared
+
+    def get(self):
+        if (
+            self.model is None
+            or self.pkl is None
+            or time.time() - self.loadedAt > NiftyModelService.maxAge
+        ):
+            self.model, self.pkl = Utility.tools.getNiftyModel()
+            self.loadedAt = time.time()
+        return self.model, self.pkl
+
+    # Scaled model inputs for every day of data (oldest first) but the first,
+    # whose price changes aren't known.
+    def inputs(self, data):
+        _, pkl = self.get()
+        data = data[pkl["columns"]].copy()
+        for column in ["High", "Low", "Open", "Close"]:
+            data[column] = data[column].pct_change() * 100
+        return pkl["scaler"].transform(data.iloc[1:].to_numpy())
+
+    # Probabilities of a bearish next day for every day of data but the
+    # first, in one call of the model.
+    def predict(self, data):
+        model, _ = self.get()
+        return np.asarray(model.predict(self.inputs(data))).reshape(-1)
+
+    # Probabilities for the latest day of each frame in frames (a dict of
+    # name -> data), in one call of the model.
+    def predictLatest(self, frames):
+        model, _ = self.get()
+        names = list(frames.keys())
+        inputs = np.vstack([self.inputs(frames[name].tail(2)) for name in names])
+        predictions = np.asarray(model.predict(inputs)).reshape(-1)
+        return dict(zip(names, predictions))
@@ -0,0 +1,217 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Pure NumPy versions of the indicators used while screening.
+# Every function takes arrays with time along axis 0, either a 1-D series
+# (oldest first) or a 2-D (time x stocks) panel, and returns an array of the
+# same shape. They follow TA-Lib's conventions: computation for each column
+# begins at its first non-NaN value, the first `lookback` outputs are NaN
+# and a NaN inside the series propagates the same way it does in TA-Lib.
+
+
+def _as2d(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return values[:, None], True
+    return values, False
+
+
+def _restore(values, wasVector):
+    return values[:, 0] if wasVector else values
+
+
+def firstValidIndex(values):
+    valid = ~np.isnan(values)
+    begin = valid.argmax(axis=0)
+    begin[~valid.any(axis=0)] = values.shape[0]
+    return begin
+
+
+def SMA(close, timeperiod=30):
+    values, wasVector = _as2d(close)
+    rows = values.shape[0]
+    out = np.full(values.shape, np.nan)
+    begin = firstValidIndex(values)
+    # Like TA-Lib's running total, a NaN after the start poisons the rest
+    leading = np.arange(rows)[:, None] < begin[None, :]
+    total = np.cumsum(np.where(leading, 0.0, values), axis=0)
+    total = np.vstack([np.zeros((1, values.shape[1])), total])
+    if rows >= timeperiod:
+        out[timeperiod - 1 :] = (total[timeperiod:] - total[:-timeperiod]) / timeperiod
+    out[np.arange(rows)[:, None] < (begin + timeperiod - 1)[None, :]] = np.nan
+    return _restore(out, wasVector)
+
+
+def EMA(close, timeperiod=30):
+    values, wasVector = _as2d(close)
+    rows, cols = values.shape
+    out = np.full(values.shape, np.nan)
+    begin = firstValidIndex(values)
+    k = 2.0 / (timeperiod + 1)
+    total = np.zeros(cols)
+    prev = np.full(cols, np.nan)
+    for t in range(begin.min(initial=rows), rows):
+        steps = t - begin
+        x = values[t]
+        seeding = (steps >= 0) & (steps < timeperiod)
+        total[seeding] += x[seeding]
+        seeded = steps == timeperiod - 1
+        prev[seeded] = total[seeded] / timeperiod
+        running = steps >= timeperiod
+        prev[running] = (x[running] - prev[running]) * k + prev[running]
+        ready = steps >= timeperiod - 1
+        out[t, ready] = prev[ready]
+    return _restore(out, wasVector)
+
+
+def _isZero(values):
+    return ~(np.abs(values) >= 0.00000001)
+
+
+def RSI(close, timeperiod=14):
+    values, wasVector = _as2d(close)
+    rows, cols = values.shape
+    out = np.full(values.shape, np.nan)
+    begin = firstValidIndex(values)
+    gain = np.zeros(cols)
+    loss = np.zeros(cols)
+    prevValue = np.full(cols, np.nan)
+    for t in range(begin.min(initial=rows), rows):
+        steps = t - begin
+        x = values[t]
+        diff = x - prevValue
+        up = np.where(diff < 0, 0.0, diff)
+        down = np.where(diff < 0, -diff, 0.0)
+        seeding = (steps >= 1) & (steps <= timeperiod)
+        gain[seeding] += up[seeding]
+        loss[seeding] += down[seeding]
+        seeded = steps == timeperiod
+        gain[seeded] /= timeperiod
+        loss[seeded] /= timeperiod
+        running = steps > timeperiod
+        gain[running] = (gain[running] * (timeperiod - 1) + up[running]) / timeperiod
+        loss[running] = (loss[running] * (timeperiod - 1) + down[running]) / timeperiod
+        prevValue = np.where(steps >= 0, x, prevValue)
+        ready = steps >= timeperiod
+        total = gain + loss
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(_isZero(total), 0.0, 100.0 * (gain / total))
+        out[t, ready] = rsi[ready]
+    return _restore(out, wasVector)
+
+
+def CCI(high, low, close, timeperiod=14):
+    high, wasVector = _as2d(high)
+    low, _ = _as2d(low)
+    close, _ = _as2d(close)
+    typicalPrice = (high + low + close) / 3
+    out = np.full(typicalPrice.shape, np.nan)
+    if typicalPrice.shape[0] >= timeperiod:
+        windows = sliding_window_view(typicalPrice, timeperiod, axis=0)
+        average = windows.mean(axis=-1)
+        meanDeviation = np.abs(windows - average[..., None]).mean(axis=-1)
+        delta = typicalPrice[timeperiod - 1 :] - average
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[timeperiod - 1 :] = np.where(
+                (delta != 0) & (meanDeviation != 0),
+                delta / (0.015 * meanDeviation),
+                0.0,
+            )
+    return _restore(out, wasVector)
+
+
+def rollingMax(values, window):
+    values, wasVector = _as2d(values)
+    out = np.full(values.shape, np.nan)
+    if values.shape[0] >= window:
+        out[window - 1 :] = sliding_window_view(values, window, axis=0).max(axis=-1)
+    return _restore(out, wasVector)
+
+
+def rollingMin(values, window):
+    values, wasVector = _as2d(values)
+    out = np.full(values.shape, np.nan)
+    if values.shape[0] >= window:
+        out[window - 1 :] = sliding_window_view(values, window, axis=0).min(axis=-1)
+    return _restore(out, wasVector)
+
+
+def STOCHRSI(close, timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0):
+    values, wasVector = _as2d(close)
+    rsi = RSI(values, timeperiod)
+    highest = rollingMax(rsi, fastk_period)
+    lowest = rollingMin(rsi, fastk_period)
+    diff = (highest - lowest) / 100.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fastk = np.where(diff != 0, (rsi - lowest) / diff, 0.0)
+    fastk[np.isnan(highest)] = np.nan
+    fastd = SMA(fastk, fastd_period)
+    # TA-Lib aligns both outputs on the slowest one
+    lookback = timeperiod + fastk_period - 1 + fastd_period - 1
+    begin = firstValidIndex(values)
+    rows = np.arange(values.shape[0])[:, None]
+    unstable = rows < (begin + lookback)[None, :]
+    fastk[unstable] = np.nan
+    fastd[unstable] = np.nan
+    return _restore(fastk, wasVector), _restore(fastd, wasVector)
+
+
+def MACD(close, fastperiod=12, slowperiod=26, signalperiod=9):
+    values, wasVector = _as2d(close)
+    if slowperiod < fastperiod:
+        fastperiod, slowperiod = slowperiod, fastperiod
+    begin = firstValidIndex(values)
+    rows = np.arange(values.shape[0])[:, None]
+    # TA-Lib seeds the fast average so that it lines up with the slow one
+    lagging = rows < (begin + slowperiod - fastperiod)[None, :]
+    fast = EMA(np.where(lagging, np.nan, values), fastperiod)
+    macd = fast - EMA(values, slowperiod)
+    signal = EMA(macd, signalperiod)
+    unstable = rows < (begin + slowperiod - 1 + signalperiod - 1)[None, :]
+    macd[unstable] = np.nan
+    signal[unstable] = np.nan
+    hist = macd - signal
+    return (
+        _restore(macd, wasVector),
+        _restore(signal, wasVector),
+        _restore(hist, wasVector),
+    )
+
+
+def AROON(high, low, timeperiod=14):
+    high, wasVector = _as2d(high)
+    low, _ = _as2d(low)
+    down = np.full(high.shape, np.nan)
+    up = np.full(high.shape, np.nan)
+    window = timeperiod + 1
+    if high.shape[0] >= window:
+        # Reversed windows make argmax/argmin pick the latest of equal extremes
+        highs = sliding_window_view(high, window, axis=0)[..., ::-1]
+        lows = sliding_window_view(low, window, axis=0)[..., ::-1]
+        up[timeperiod:] = 100.0 * (timeperiod - highs.argmax(axis=-1)) / timeperiod
+        down[timeperiod:] = 100.0 * (timeperiod - lows.argmin(axis=-1)) / timeperiod
+    return _restore(down, wasVector), _restore(up, wasVector)
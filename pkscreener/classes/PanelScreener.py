@@ -0,0 +1,345 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+
+import pkscreener.classes.NumpyIndicators as NumpyIndicators
+from pkscreener.classes.StockBlocks import StockBlocks
+
+# Relative slack used when an indicator from the panel is compared with a
+# threshold. The panel only narrows the universe down to candidates which
+# then go through the regular per-stock screening, so it must never drop a
+# stock that the per-stock path would have picked.
+TOLERANCE = 1e-6
+
+
+# OHLCV of many stocks as (time x stocks) arrays. Rows are aligned on each
+# stock's most recent candle (last row), so that every column holds exactly
+# what the per-stock path would see for that stock. Stocks with a shorter
+# history are padded with NaN at the top.
+class StockPanel:
+    def __init__(self, symbols, open, high, low, close, volume, lengths):
+        self.symbols = symbols
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.lengths = lengths
+
+    @property
+    def rows(self):
+        return self.close.shape[0]
+
+    # True where a stock actually has data (i.e. not the padding)
+    @property
+    def present(self):
+        return np.arange(self.rows)[:, None] >= (self.rows - self.lengths)[None, :]
+
+    @staticmethod
+    def _ohlcv(value):
+        if isinstance(value, StockBlocks):
+            value = value.toFrame()
+        if isinstance(value, pd.DataFrame):
+            return [
+                value[column].to_numpy(dtype=np.float64)
+                for column in ["Open", "High", "Low", "Close", "Volume"]
+            ]
+        columns = list(value["columns"])
+        data = np.asarray(value["data"], dtype=np.float64)
+        if data.ndim != 2:
+            data = data.reshape(-1, len(columns))
+        return [
+            data[:, columns.index(column)]
+            for column in ["Open", "High", "Low", "Close", "Volume"]
+        ]
+
+    # backtestDuration drops that many of the most recent candles, the same way
+    # StockConsumer.screenStocks does for backtests.
+    @staticmethod
+    def fromStockData(stockData, symbols=None, backtestDuration=0):
+        symbols = list(stockData.keys()) if symbols is None else symbols
+        loaded = []
+        for symbol in symbols:
+            try:
+                value = stockData.get(symbol)
+                if value is None:
+                    continue
+                arrays = StockPanel._ohlcv(value)
+            except Exception:
+                continue
+            length = len(arrays[0]) - backtestDuration
+            if length < 2:
+                continue
+            loaded.append((symbol, [a[:length] for a in arrays]))
+        return StockPanel._stack(loaded)
+
+    # A panel of a single stock as it looked on each of the backtested days.
+    # Its columns are named after the backtestDurations.
+    @staticmethod
+    def fromHistory(value, backtestDurations):
+        arrays = StockPanel._ohlcv(value)
+        loaded = []
+        for backtestDuration in backtestDurations:
+            length = len(arrays[0]) - backtestDuration
+            if length < 2:
+                continue
+            loaded.append((backtestDuration, [a[:length] for a in arrays]))
+        return StockPanel._stack(loaded)
+
+    @staticmethod
+    def _stack(loaded):
+        if len(loaded) == 0:
+            return None
+        lengths = np.array([len(arrays[0]) for _, arrays in loaded])
+        rows = lengths.max()
+        blocks = [np.full((rows, len(loaded)), np.nan) for _ in range(5)]
+        for col, (_, arrays) in enumerate(loaded):
+            for block, values in zip(blocks, arrays):
+                block[rows - len(values) :, col] = values
+        return StockPanel([s for s, _ in loaded], *blocks, lengths)
+
+
+# Screens all stocks of a StockPanel at once. It mirrors preprocessData and
+# the simple Screener.tools validators as array operations.
+class PanelScreener:
+    # executeOptions for which candidates() can narrow down the universe
+    supportedOptions = list(range(1, 21)) + [23, 24, 25]
+
+    def __init__(self, configManager):
+        self.configManager = configManager
+
+    def computeIndicators(self, panel):
+        close = panel.close
+        if self.configManager.useEMA:
+            sma = NumpyIndicators.EMA(close, 50)
+            lma = NumpyIndicators.EMA(close, 200)
+            ssma = NumpyIndicators.EMA(close, 9)
+        else:
+            # Same rolling means as preprocessData, column by column
+            frame = pd.DataFrame(close)
+            sma = frame.rolling(window=50).mean().to_numpy()
+            lma = frame.rolling(window=200).mean().to_numpy()
+            ssma = frame.rolling(window=9).mean().to_numpy()
+        fastk, fastd = NumpyIndicators.STOCHRSI(close, 14, 5, 3, 0)
+        return {
+            "SMA": sma,
+            "LMA": lma,
+            "SSMA": ssma,
+            "VolMA": pd.DataFrame(panel.volume).rolling(window=20).mean().to_numpy(),
+            "RSI": NumpyIndicators.RSI(close, 14),
+            "CCI": NumpyIndicators.CCI(panel.high, panel.low, close, 14),
+            "FASTK": fastk,
+            "FASTD": fastd,
+        }
+
+    # data.fillna(0).replace([np.inf, -np.inf], 0) for the rows that exist
+    def _filled(self, panel, values):
+        filled = np.where(np.isfinite(values), values, 0.0)
+        return np.where(panel.present, filled, np.nan)
+
+    def _windowMax(self, values, start, end=None):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.nanmax(values[start:end], axis=0)
+
+    def _windowMin(self, values, start, end=None):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.nanmin(values[start:end], axis=0)
+
+    # Evaluates validateLTP, validateVolume, validateConsolidation,
+    # find52WeekHighLow, findBreakoutValue, validateRSI and validateCCI for
+    # the most recent candle of every stock.
+    def evaluate(self, panel, volumeRatio=None, minRSI=0, maxRSI=100, indicators=None):
+        cm = self.configManager
+        if indicators is None:
+            indicators = self.computeIndicators(panel)
+        if volumeRatio is None or volumeRatio <= 0:
+            volumeRatio = cm.volumeRatio
+        rows = panel.rows
+        lookback = min(cm.daysToLookback, rows)
+        close = self._filled(panel, panel.close)
+        high = self._filled(panel, panel.high)
+        low = self._filled(panel, panel.low)
+        openPrice = self._filled(panel, panel.open)
+        volume = self._filled(panel, panel.volume)
+        volMA = self._filled(panel, indicators["VolMA"])
+        results = {}
+
+        # validateLTP
+        ltp = np.round(close[-1], 2)
+        results["LTP"] = ltp
+        results["ltpValid"] = (ltp >= cm.minLTP) & (ltp <= cm.maxLTP)
+        stageTwo = np.ones(len(panel.symbols), dtype=bool)
+        if cm.stageTwo:
+            yearlyLow = self._windowMin(close, -250)
+            yearlyHigh = self._windowMax(close, -250)
+            failed = (ltp < 2 * yearlyLow) | (ltp < 0.75 * yearlyHigh)
+            stageTwo = ~(failed & (panel.lengths > 250))
+        results["stageTwo"] = stageTwo
+
+        # validateVolume
+        minVolume = cm.minVolume / (100 if cm.isIntradayConfig() else 1)
+        recentVolume = volume[-1]
+        recentVolMA = volMA[-1]
+        results["hasMinVolQty"] = (recentVolMA * (1 + TOLERANCE) >= minVolume) | (
+            recentVolume >= minVolume
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.round(recentVolume / recentVolMA, 2)
+            maxRatio = np.round(recentVolume / (recentVolMA * (1 - TOLERANCE)), 2)
+        results["Volume"] = np.where(recentVolMA == 0, 0, ratio)
+        results["hasMinVolumeRatio"] = (recentVolMA == 0) | (
+            (maxRatio >= volumeRatio) & ~np.isinf(maxRatio)
+        )
+
+        # validateConsolidation
+        hc = self._windowMax(close, -lookback)
+        lc = self._windowMin(close, -lookback)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            consolidation = np.round(np.abs((hc - lc) / hc) * 100, 1)
+        results["Consol."] = consolidation
+        results["isConsolidating"] = (consolidation <= cm.consolidationPercentage) & (
+            consolidation != 0
+        )
+
+        # find52WeekHighLow
+        longHistory = panel.lengths >= 251
+        results["52Wk H"] = np.where(
+            longHistory,
+            self._windowMax(high, -251, -1),
+            self._windowMax(high, -250),
+        )
+        results["52Wk L"] = np.where(
+            longHistory,
+            self._windowMin(low, -251, -1),
+            self._windowMin(low, -250),
+        )
+
+        # findBreakoutValue(alreadyBrokenout=True)
+        results["isBreaking"] = self._alreadyBrokenOut(
+            close, high, openPrice, lookback, cm.daysToLookback
+        )
+
+        # validateRSI / validateCCI (int() truncates towards zero)
+        rsi = self._filled(panel, indicators["RSI"])[-1]
+        cci = self._filled(panel, indicators["CCI"])[-1]
+        results["RSI"] = rsi
+        results["CCI"] = cci
+        slack = TOLERANCE * np.maximum(np.abs(rsi), 1)
+        results["isValidRsi"] = (np.trunc(rsi + slack) >= minRSI) & (
+            np.trunc(rsi - slack) <= maxRSI
+        )
+        slack = TOLERANCE * np.maximum(np.abs(cci), 1)
+        results["isValidCci"] = (np.trunc(cci - slack) <= minRSI) | (
+            np.trunc(cci + slack) >= maxRSI
+        )
+        return results
+
+    def _alreadyBrokenOut(self, close, high, openPrice, lookback, daysToLookback):
+        recentClose = np.round(close[-1], 2)
+        maxHigh = np.round(self._windowMax(high, -lookback, -1), 2)
+        maxClose = np.round(self._windowMax(close, -lookback, -1), 2)
+        bullish = close[-1] >= openPrice[-1]
+        noOfHigherShadows = np.sum(high[-lookback:-1] > maxClose[None, :], axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fewShadows = daysToLookback / noOfHigherShadows <= 3
+        level = np.where(
+            (maxHigh > maxClose)
+            & ((maxHigh - maxClose) > (maxHigh * 2 / 100))
+            & fewShadows,
+            maxHigh,
+            maxClose,
+        )
+        isBreaking = (recentClose >= level) & bullish
+        # A zero count raises in the per-stock path. Let that path decide.
+        undecided = (maxHigh > maxClose) & (
+            (maxHigh - maxClose) > (maxHigh * 2 / 100)
+        ) & (noOfHigherShadows == 0)
+        return (isBreaking | undecided) & ~(np.isnan(maxHigh) | np.isnan(maxClose))
+
+    # Returns the stocks from the panel that may pass the given scan. Those
+    # still need to be confirmed by StockConsumer.screenStocks.
+    def candidates(self, panel, executeOption, volumeRatio=None, minRSI=0, maxRSI=100):
+        if executeOption not in self.supportedOptions:
+            return list(panel.symbols)
+        results = self.evaluate(
+            panel, volumeRatio=volumeRatio, minRSI=minRSI, maxRSI=maxRSI
+        )
+        mask = results["stageTwo"] & results["hasMinVolQty"]
+        if executeOption in [1, 2, 3, 4, 5, 6, 7, 8, 18]:
+            mask &= results["ltpValid"]
+        if executeOption in [1, 2, 9]:
+            mask &= results["hasMinVolumeRatio"]
+        if executeOption == 2:
+            mask &= results["isBreaking"]
+        if executeOption == 3:
+            mask &= results["isConsolidating"]
+        if executeOption == 5:
+            mask &= results["isValidRsi"]
+        if executeOption == 8:
+            mask &= results["isValidCci"]
+        return [symbol for symbol, keep in zip(panel.symbols, mask) if keep]
+
+    # Narrows listStockCodes down to the stocks that may pass the scan.
+    # Stocks that aren't in stockData are always kept.
+    def prefilter(
+        self,
+        listStockCodes,
+        stockData,
+        executeOption,
+        volumeRatio=None,
+        minRSI=0,
+        maxRSI=100,
+        backtestDuration=0,
+    ):
+        if executeOption not in self.supportedOptions:
+            return listStockCodes
+        panel = StockPanel.fromStockData(
+            stockData, symbols=listStockCodes, backtestDuration=backtestDuration
+        )
+        if panel is None:
+            return listStockCodes
+        screened = set(panel.symbols)
+        candidates = set(
+            self.candidates(
+                panel,
+                executeOption,
+                volumeRatio=volumeRatio,
+                minRSI=minRSI,
+                maxRSI=maxRSI,
+            )
+        )
+        return [
+            stock
+            for stock in listStockCodes
+            if stock not in screened or stock in candidates
+        ]
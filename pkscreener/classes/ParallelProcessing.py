@@ -37,13 +37,16 @@ from PKDevTools.classes.SuppressOutput import SuppressOutput
 
 import pkscreener.classes.Screener as Screener
 import pkscreener.classes.Utility as Utility
-from pkscreener import Imports
 from pkscreener.classes.CandlePatterns import CandlePatterns
+from pkscreener.classes.PanelScreener import PanelScreener, StockPanel
+from pkscreener.classes.ScanPlan import ScanPlan
+from pkscreener.classes.StockBlocks import StockBlocks
 
 
 class StockConsumer:
     def __init__(self):
         self.isTradingTime = Utility.tools.isTradingTime()
+        self.backtestCache = None
 
     # @tracelog
     def screenStocks(
@@ -121,7 +124,7 @@ class StockConsumer:
                 ) or (
                     shouldCache and hostData is None
                 ):  # and backtestDuration == 0 # save only if we're NOT backtesting
-                    hostRef.objectDictionary[stock] = data.to_dict("split")
+                    hostRef.objectDictionary[stock] = StockBlocks.fromFrame(data)
                     # hostRef.default_logger.info(
                     #     f"Stock data saved:\n{hostRef.objectDictionary[stock]}"
                     # )
@@ -164,25 +167,29 @@ class StockConsumer:
                         hostRef.default_logger.debug(e, exc_info=True)
                         pass
                     sys.stdout.write("\r\033[K")
-                data = hostData
-                data = pd.DataFrame(
-                    data["data"], columns=data["columns"], index=data["index"]
-                )
+                # Stocks from the SharedStockArena already come as DataFrames
+                data = StockBlocks.frameFor(hostData)
             if len(data) == 0 or len(data) < backtestDuration:
                 return None
             # hostRef.default_logger.info(f"Will pre-process data:\n{data.tail(10)}")
             if backtestDuration == 0:
                 fullData, processedData = screener.preprocessData(
-                    data, daysToLookback=configManager.daysToLookback
+                    data,
+                    daysToLookback=configManager.daysToLookback,
+                    stock=stock if shouldCache else None,
                 )
             else:
                 if data is None or fullData is None or processedData is None:
                     # data will have the oldest date at the top and the most recent
                     # date will be at the bottom
                     # We want to have the nth day treated as today when pre-processing where n = backtestDuration row from the bottom
-                    inputData = data.head(len(data) - backtestDuration)
-                    # imputData will have the last row as the date for which the entire calculation
-                    # and prediction is being done
+                    fullData, processedData = self.preprocessBacktestData(
+                        screener,
+                        stock,
+                        data,
+                        backtestDuration,
+                        configManager.daysToLookback,
+                    )
                     data = data.tail(
                         backtestDuration + 1
                     )  # .head(backtestPeriodToLookback+1)
@@ -191,10 +198,6 @@ class StockConsumer:
                         screener.validateLTPForPortfolioCalc(
                             data, screeningDictionary, saveDictionary
                         )
-                    # data has the last row from inputData at the top.
-                    fullData, processedData = screener.preprocessData(
-                        inputData, daysToLookback=configManager.daysToLookback
-                    )
             # hostRef.default_logger.info(
             #     f"Finished pre-processing. processedData:\n{data}\nfullData:{fullData}\n"
             # )
@@ -216,9 +219,6 @@ class StockConsumer:
                     + colorText.END
                 )
                 saveDictionary["Stock"] = stock
-                screener.find52WeekHighLow(
-                    fullData, saveDictionary, screeningDictionary
-                )
                 isLtpValid, verifyStageTwo = screener.validateLTP(
                     fullData,
                     screeningDictionary,
@@ -241,88 +241,225 @@ class StockConsumer:
                 if not hasMinVolQty and executeOption > 0:
                     raise Screener.NotEnoughVolumeAsPerConfig
 
-                consolidationValue = screener.validateConsolidation(
-                    processedData,
+                def findTrend(screenDict, saveDict):
+                    try:
+                        with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
+                            return screener.findTrend(
+                                processedData,
+                                screenDict,
+                                saveDict,
+                                daysToLookback=configManager.daysToLookback,
+                                stockName=stock,
+                            )
+                    except np.RankWarning as e:
+                        hostRef.default_logger.debug(e, exc_info=True)
+                        screenDict["Trend"] = "Unknown"
+                        saveDict["Trend"] = "Unknown"
+
+                def validateNarrowRange(screenDict, saveDict):
+                    with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
+                        if (
+                            maLength is not None
+                            and executeOption == 6
+                            and reversalOption == 6
+                        ):
+                            return screener.validateNarrowRange(
+                                processedData, screenDict, saveDict, nr=maLength
+                            )
+                        return screener.validateNarrowRange(
+                            processedData, screenDict, saveDict
+                        )
+
+                def validateLorentzian(screenDict, saveDict):
+                    if sys.version_info < (3, 11):
+                        return False
+                    with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
+                        return screener.validateLorentzian(
+                            fullData,
+                            screenDict,
+                            saveDict,
+                            lookFor=maLength,
+                            stockName=stock,
+                        )
+
+                # What each of the checks named in ScanPlan means
+                checks = {
+                    "ltp": lambda s, v: isLtpValid,
+                    "volumeRatio": lambda s, v: hasMinVolumeRatio,
+                    "consolidation": lambda s, v: screener.validateConsolidation(
+                        processedData,
+                        s,
+                        v,
+                        percentage=configManager.consolidationPercentage,
+                    ),
+                    "breakout": lambda s, v: screener.findBreakoutValue(
+                        processedData,
+                        s,
+                        v,
+                        daysToLookback=configManager.daysToLookback,
+                        alreadyBrokenout=(executeOption == 2),
+                    ),
+                    "potentialBreakout": lambda s, v: screener.findPotentialBreakout(
+                        fullData,
+                        s,
+                        v,
+                        daysToLookback=configManager.daysToLookback,
+                    ),
+                    "lowestVolume": lambda s, v: screener.validateLowestVolume(
+                        processedData, daysForLowestVolume
+                    ),
+                    "rsi": lambda s, v: screener.validateRSI(
+                        processedData, s, v, minRSI, maxRSI
+                    ),
+                    "trend": findTrend,
+                    "cci": lambda s, v: screener.validateCCI(
+                        processedData, s, v, minRSI, maxRSI
+                    ),
+                    "narrowRange": validateNarrowRange,
+                    "momentum": lambda s, v: screener.validateMomentum(
+                        processedData, s, v
+                    ),
+                    "priceRising": lambda s, v: (
+                        screener.validatePriceRisingByAtLeast2Percent(
+                            processedData, s, v
+                        )
+                    ),
+                    "vsa": lambda s, v: screener.validateVolumeSpreadAnalysis(
+                        processedData, s, v
+                    ),
+                    "maSupport": lambda s, v: screener.findReversalMA(
+                        fullData, s, v, maLength
+                    ),
+                    "lorentzian": validateLorentzian,
+                    "shortTermBullish": lambda s, v: screener.validateShortTermBullish(
+                        fullData, s, v
+                    ),
+                    "priceVolumeBreakout": lambda s, v: (
+                        screener.validate15MinutePriceVolumeBreakout(fullData)
+                    ),
+                    "intradayRSIMACD": lambda s, v: (
+                        screener.findBullishIntradayRSIMACD(fullData)
+                    ),
+                    "nr4Day": lambda s, v: screener.findNR4Day(fullData),
+                    "52WeekLowBreakout": lambda s, v: (
+                        screener.find52WeekLowBreakout(fullData)
+                    ),
+                    "10DaysLowBreakout": lambda s, v: (
+                        screener.find10DaysLowBreakout(fullData)
+                    ),
+                    "52WeekHighBreakout": lambda s, v: (
+                        screener.find52WeekHighBreakout(fullData)
+                    ),
+                    "aroonCrossover": lambda s, v: (
+                        screener.findAroonBullishCrossover(fullData)
+                    ),
+                    "macdHistBelow0": lambda s, v: (
+                        screener.validateMACDHistogramBelow0(fullData)
+                    ),
+                    "bullishForTomorrow": lambda s, v: (
+                        screener.validateBullishForTomorrow(fullData)
+                    ),
+                    "breakingOutNow": lambda s, v: screener.findBreakingoutNow(
+                        processedData
+                    ),
+                    "higherHighsLowsClose": lambda s, v: (
+                        screener.validateHigherHighsHigherLowsHigherClose(fullData)
+                    ),
+                    "lowerLows": lambda s, v: screener.validateLowerHighsLowerLows(
+                        processedData
+                    ),
+                }
+                plan = ScanPlan(executeOption, reversalOption)
+                if not plan.prefilter(
+                    checks,
                     screeningDictionary,
                     saveDictionary,
-                    percentage=configManager.consolidationPercentage,
+                    accepts={
+                        "consolidation": lambda value: (
+                            value <= configManager.consolidationPercentage
+                            and value != 0
+                        )
+                    },
+                ):
+                    return None
+
+                # Whatever follows fills the remaining columns of the stocks
+                # which may be picked by the scan.
+                screener.find52WeekHighLow(
+                    fullData, saveDictionary, screeningDictionary
+                )
+                consolidationValue = plan.value(
+                    "consolidation", screeningDictionary, saveDictionary
                 )
                 isMaReversal = screener.validateMovingAverages(
                     processedData, screeningDictionary, saveDictionary, maRange=1.25
                 )
                 if executeOption == 11:
-                    isShortTermBullish = screener.validateShortTermBullish(
-                        fullData, screeningDictionary, saveDictionary
+                    isShortTermBullish = plan.value(
+                        "shortTermBullish", screeningDictionary, saveDictionary
                     )
                 if executeOption == 12:
-                    is15MinutePriceVolumeBreakout = (
-                        screener.validate15MinutePriceVolumeBreakout(fullData)
+                    is15MinutePriceVolumeBreakout = plan.value(
+                        "priceVolumeBreakout", screeningDictionary, saveDictionary
                     )
                 if executeOption == 13:
-                    isBullishIntradayRSIMACD = screener.findBullishIntradayRSIMACD(
-                        fullData
+                    isBullishIntradayRSIMACD = plan.value(
+                        "intradayRSIMACD", screeningDictionary, saveDictionary
                     )
                 if executeOption == 14:
-                    isNR4Day = screener.findNR4Day(fullData)
+                    isNR4Day = plan.value(
+                        "nr4Day", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 15:
-                    is52WeekLowBreakout = screener.find52WeekLowBreakout(fullData)
+                    is52WeekLowBreakout = plan.value(
+                        "52WeekLowBreakout", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 16:
-                    is10DaysLowBreakout = screener.find10DaysLowBreakout(fullData)
+                    is10DaysLowBreakout = plan.value(
+                        "10DaysLowBreakout", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 17:
-                    is52WeekHighBreakout = screener.find52WeekHighBreakout(fullData)
+                    is52WeekHighBreakout = plan.value(
+                        "52WeekHighBreakout", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 18:
-                    isAroonCrossover = screener.findAroonBullishCrossover(fullData)
+                    isAroonCrossover = plan.value(
+                        "aroonCrossover", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 19:
-                    macdHistBelow0 = screener.validateMACDHistogramBelow0(fullData)
+                    macdHistBelow0 = plan.value(
+                        "macdHistBelow0", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 20:
-                    bullishForTomorrow = screener.validateBullishForTomorrow(fullData)
-                isBreaking = screener.findBreakoutValue(
-                    processedData,
-                    screeningDictionary,
-                    saveDictionary,
-                    daysToLookback=configManager.daysToLookback,
-                    alreadyBrokenout=(executeOption == 2),
-                )
+                    bullishForTomorrow = plan.value(
+                        "bullishForTomorrow", screeningDictionary, saveDictionary
+                    )
+                isBreaking = plan.value("breakout", screeningDictionary, saveDictionary)
                 if executeOption == 1:
-                    isPotentialBreaking = screener.findPotentialBreakout(
-                        fullData,
-                        screeningDictionary,
-                        saveDictionary,
-                        daysToLookback=configManager.daysToLookback,
+                    isPotentialBreaking = plan.value(
+                        "potentialBreakout", screeningDictionary, saveDictionary
                     )
                 if executeOption == 23:
-                    isBreakingOutNow = screener.findBreakingoutNow(processedData)
+                    isBreakingOutNow = plan.value(
+                        "breakingOutNow", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 24:
-                    higherHighsLowsClose = (
-                        screener.validateHigherHighsHigherLowsHigherClose(fullData)
+                    higherHighsLowsClose = plan.value(
+                        "higherHighsLowsClose", screeningDictionary, saveDictionary
                     )
                 if executeOption == 25:
-                    hasLowerLows = screener.validateLowerHighsLowerLows(processedData)
+                    hasLowerLows = plan.value(
+                        "lowerLows", screeningDictionary, saveDictionary
+                    )
                 if executeOption == 4:
-                    isLowestVolume = screener.validateLowestVolume(
-                        processedData, daysForLowestVolume
+                    isLowestVolume = plan.value(
+                        "lowestVolume", screeningDictionary, saveDictionary
                     )
                 else:
                     isLowestVolume = False
-                isValidRsi = screener.validateRSI(
-                    processedData, screeningDictionary, saveDictionary, minRSI, maxRSI
-                )
-                try:
-                    with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                        currentTrend = screener.findTrend(
-                            processedData,
-                            screeningDictionary,
-                            saveDictionary,
-                            daysToLookback=configManager.daysToLookback,
-                            stockName=stock,
-                        )
-                except np.RankWarning as e:
-                    hostRef.default_logger.debug(e, exc_info=True)
-                    screeningDictionary["Trend"] = "Unknown"
-                    saveDictionary["Trend"] = "Unknown"
-                isValidCci = screener.validateCCI(
-                    processedData, screeningDictionary, saveDictionary, minRSI, maxRSI
-                )
+                isValidRsi = plan.value("rsi", screeningDictionary, saveDictionary)
+                plan.value("trend", screeningDictionary, saveDictionary)
+                isValidCci = plan.value("cci", screeningDictionary, saveDictionary)
                 isCandlePattern = False
                 try:
                     # Only 'doji' and 'inside' is internally implemented by pandas_ta.
@@ -361,67 +498,55 @@ class StockConsumer:
                         daysToLookback=insideBarToLookback,
                     )
 
-                with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                    if (
-                        maLength is not None
-                        and executeOption == 6
-                        and reversalOption == 6
-                    ):
-                        isNR = screener.validateNarrowRange(
-                            processedData,
-                            screeningDictionary,
-                            saveDictionary,
-                            nr=maLength,
-                        )
-                    else:
-                        isNR = screener.validateNarrowRange(
-                            processedData, screeningDictionary, saveDictionary
-                        )
-
-                isMomentum = screener.validateMomentum(
-                    processedData, screeningDictionary, saveDictionary
-                )
+                isNR = plan.value("narrowRange", screeningDictionary, saveDictionary)
+                isMomentum = plan.value("momentum", screeningDictionary, saveDictionary)
                 if executeOption == 10:
-                    isPriceRisingByAtLeast2Percent = (
-                        screener.validatePriceRisingByAtLeast2Percent(
-                            processedData, screeningDictionary, saveDictionary
-                        )
+                    isPriceRisingByAtLeast2Percent = plan.value(
+                        "priceRising", screeningDictionary, saveDictionary
                     )
 
                 isVSA = False
                 if not (executeOption == 7 and respChartPattern < 3):
-                    isVSA = screener.validateVolumeSpreadAnalysis(
-                        processedData, screeningDictionary, saveDictionary
-                    )
+                    isVSA = plan.value("vsa", screeningDictionary, saveDictionary)
                 if maLength is not None and executeOption == 6 and reversalOption == 4:
-                    isMaSupport = screener.findReversalMA(
-                        fullData, screeningDictionary, saveDictionary, maLength
+                    isMaSupport = plan.value(
+                        "maSupport", screeningDictionary, saveDictionary
                     )
 
                 isVCP = False
                 if respChartPattern == 4:
                     with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                        isVCP = screener.validateVCP(
-                            fullData, screeningDictionary, saveDictionary
-                        )
+                        if backtestDuration > 0 and self.backtestCache is not None:
+                            isVCP = self.validateBacktestVCP(
+                                screener,
+                                backtestDuration,
+                                screeningDictionary,
+                                saveDictionary,
+                            )
+                        else:
+                            isVCP = screener.validateVCP(
+                                fullData, screeningDictionary, saveDictionary
+                            )
 
                 isBuyingTrendline = False
                 if executeOption == 7 and respChartPattern == 5:
                     with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                        if Imports["scipy"]:
+                        if backtestDuration > 0 and self.backtestCache is not None:
+                            isBuyingTrendline = self.findBacktestTrendlines(
+                                screener,
+                                backtestDuration,
+                                screeningDictionary,
+                                saveDictionary,
+                            )
+                        else:
                             isBuyingTrendline = screener.findTrendlines(
                                 fullData, screeningDictionary, saveDictionary
                             )
-                if sys.version_info >= (3, 11):
-                    with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                        isLorentzian = screener.validateLorentzian(
-                            fullData,
-                            screeningDictionary,
-                            saveDictionary,
-                            lookFor=maLength,
-                        )
-                else:
-                    isLorentzian = False
+                isLorentzian = False
+                if executeOption == 6 and reversalOption == 7:
+                    isLorentzian = plan.value(
+                        "lorentzian", screeningDictionary, saveDictionary
+                    )
                 with hostRef.processingResultsCounter.get_lock():
                     # hostRef.default_logger.info(
                     #     f"Processing results for {stock} in {hostRef.processingResultsCounter.value}th results counter"
@@ -729,6 +854,150 @@ class StockConsumer:
                 )
         return None
 
+    # Backtests a stock for each of the backtestDurations (days ago) in one go.
+    # The simple scan conditions are evaluated for all those days at once first,
+    # so that only the days which may yield a result go through screenStocks.
+    # Returns the list of results (if any) in the order of backtestDurations.
+    def walkForwardBacktest(
+        self,
+        executeOption,
+        reversalOption,
+        maLength,
+        daysForLowestVolume,
+        minRSI,
+        maxRSI,
+        respChartPattern,
+        insideBarToLookback,
+        totalSymbols,
+        shouldCache,
+        stock,
+        newlyListedOnly,
+        downloadOnly,
+        volumeRatio,
+        testbuild=False,
+        printCounter=False,
+        backtestDurations=[],
+        backtestPeriodToLookback=30,
+        logLevel=logging.NOTSET,
+        portfolio=False,
+        hostRef=None,
+    ):
+        assert (
+            hostRef is not None
+        ), "hostRef argument must not be None. It should b an instance of PKMultiProcessorClient"
+        backtestDurations = list(backtestDurations)
+        hostData = hostRef.objectDictionary.get(stock)
+        if hostData is not None and not downloadOnly:
+            try:
+                panel = StockPanel.fromHistory(hostData, backtestDurations)
+                if panel is not None:
+                    candidates = PanelScreener(hostRef.configManager).candidates(
+                        panel,
+                        executeOption,
+                        volumeRatio=volumeRatio,
+                        minRSI=minRSI,
+                        maxRSI=maxRSI,
+                    )
+                    skipped = set(panel.symbols) - set(candidates)
+                    backtestDurations = [
+                        backtestDuration
+                        for backtestDuration in backtestDurations
+                        if backtestDuration not in skipped
+                    ]
+                    with hostRef.processingCounter.get_lock():
+                        hostRef.processingCounter.value += len(skipped)
+            except Exception as e:  # pragma: no cover
+                hostRef.default_logger.debug(e, exc_info=True)
+        results = []
+        for backtestDuration in backtestDurations:
+            result = self.screenStocks(
+                executeOption,
+                reversalOption,
+                maLength,
+                daysForLowestVolume,
+                minRSI,
+                maxRSI,
+                respChartPattern,
+                insideBarToLookback,
+                totalSymbols,
+                shouldCache,
+                stock,
+                newlyListedOnly,
+                downloadOnly,
+                volumeRatio,
+                testbuild,
+                printCounter,
+                backtestDuration,
+                backtestPeriodToLookback,
+                logLevel,
+                portfolio,
+                hostRef,
+            )
+            if result is not None:
+                results.append(result)
+        self.backtestCache = None
+        return results if len(results) > 0 else None
+
+    # Indicators only look back in time, so the stock data preprocessed once in
+    # full is, from backtestDuration rows onwards, the same as preprocessing the
+    # data up to that day afresh. The full result is kept for the next day.
+    def preprocessBacktestData(
+        self, screener, stock, data, backtestDuration, daysToLookback
+    ):
+        key = (stock, len(data), data.index[-1])
+        if self.backtestCache is None or self.backtestCache[0] != key:
+            fullData, _ = screener.preprocessData(
+                data.copy(), daysToLookback=daysToLookback
+            )
+            self.backtestCache = (key, fullData, {})
+        fullData = self.backtestCache[1].iloc[backtestDuration:].copy()
+        return fullData, fullData.head(daysToLookback)
+
+    # Results of a chart pattern as of every day of the preprocessed stock data,
+    # latest day first. They are found once, by finder(fullData), and kept with
+    # the data for the other backtested days.
+    def backtestPatternDays(self, pattern, finder):
+        found = self.backtestCache[2]
+        if pattern not in found:
+            found[pattern] = finder(self.backtestCache[1])[::-1]
+        return found[pattern]
+
+    # Same as Screener.tools.validateVCP on the backtested day
+    def validateBacktestVCP(self, screener, backtestDuration, screenDict, saveDict):
+        highestTop = self.backtestPatternDays(
+            "VCP",
+            lambda fullData: screener.vcpBreakouts(
+                *[
+                    fullData[column].to_numpy(dtype=np.float64)[::-1]
+                    for column in ["High", "Low", "Close"]
+                ]
+            ),
+        )[backtestDuration]
+        if np.isnan(highestTop):
+            return False
+        screenDict["Pattern"] = (
+            colorText.BOLD + colorText.GREEN + f"VCP (BO: {highestTop})" + colorText.END
+        )
+        saveDict["Pattern"] = f"VCP (BO: {highestTop})"
+        return True
+
+    # Same as Screener.tools.findTrendlines on the backtested day
+    def findBacktestTrendlines(self, screener, backtestDuration, screenDict, saveDict):
+        def supportDays(fullData):
+            low, close = [
+                fullData[column].to_numpy(dtype=np.float64)[::-1]
+                for column in ["Low", "Close"]
+            ]
+            return screener.trendlineSupportDays(low, close, np.arange(len(close)))
+
+        if not self.backtestPatternDays("Trendline", supportDays)[backtestDuration]:
+            return False
+        screenDict["Pattern"] = (
+            colorText.BOLD + colorText.GREEN + "Trendline-Support" + colorText.END
+        )
+        saveDict["Pattern"] = "Trendline-Support"
+        return True
+
     def setupLoggers(self, hostRef, screener, logLevel, stock):
         # Set the loglevels for both the caller and screener
         # Also add handlers that are specific to this sub-process which
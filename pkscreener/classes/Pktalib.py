@@ -22,8 +22,9 @@
     SOFTWARE.
 
 """
+import multiprocessing
+import os
 import warnings
-from time import sleep
 
 import numpy as np
 
@@ -32,6 +33,7 @@ warnings.simplefilter("ignore", FutureWarning)
 import pandas as pd
 from PKDevTools.classes.ColorText import colorText
 
+import pkscreener.classes.NumpyIndicators as NumpyIndicators
 from pkscreener import Imports
 
 if Imports["talib"]:
@@ -40,103 +42,240 @@ else:
     try:
         import pandas_ta as talib
 
-        print(
-            colorText.BOLD
-            + colorText.FAIL
-            + "[+] TA-Lib is not installed. Falling back on pandas_ta.\n[+] For full coverage(candle patterns), you may wish to follow instructions from\n[+] https://github.com/ta-lib/ta-lib-python"
-            + colorText.END
-        )
-        sleep(3)
+        if multiprocessing.current_process().name == "MainProcess":
+            print(
+                colorText.BOLD
+                + colorText.FAIL
+                + "[+] TA-Lib is not installed. Falling back on pandas_ta.\n[+] For full coverage(candle patterns), you may wish to follow instructions from\n[+] https://github.com/ta-lib/ta-lib-python"
+                + colorText.END
+            )
     except Exception:  # pragma: no cover
         # default_logger().debug(e, exc_info=True)
-        import talib
+        talib = None
+
+
+# Indicators computed by TA-Lib itself
+class TalibBackend:
+    @staticmethod
+    def EMA(close, timeperiod):
+        return talib.EMA(close, timeperiod)
+
+    @staticmethod
+    def SMA(close, timeperiod):
+        return talib.SMA(close, timeperiod)
+
+    @staticmethod
+    def MA(close, timeperiod):
+        return talib.MA(close, timeperiod)
+
+    @staticmethod
+    def MACD(close, fast, slow, signal):
+        return talib.MACD(close, fast, slow, signal)
+
+    @staticmethod
+    def RSI(close, timeperiod):
+        return talib.RSI(close, timeperiod)
+
+    @staticmethod
+    def CCI(high, low, close, timeperiod):
+        return talib.CCI(high, low, close, timeperiod)
+
+    @staticmethod
+    def Aroon(high, low, timeperiod):
+        aroon_down, aroon_up = talib.AROON(high, low, timeperiod)
+        aroon_up.name = f"AROONU_{timeperiod}"
+        aroon_down.name = f"AROOND_{timeperiod}"
+        data = {
+            aroon_down.name: aroon_down,
+            aroon_up.name: aroon_up,
+        }
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def STOCHRSI(close, timeperiod, fastk_period, fastd_period, fastd_matype):
+        return talib.STOCHRSI(
+            close.values, timeperiod, fastk_period, fastd_period, fastd_matype
+        )
+
+    @staticmethod
+    def pattern(open, high, low, close, name):
+        return getattr(talib, f"CDL{name.upper()}")(open, high, low, close)
+
+
+# Indicators computed by pandas_ta when TA-Lib is not installed
+class PandasTaBackend:
+    @staticmethod
+    def EMA(close, timeperiod):
+        return talib.ema(close, timeperiod)
+
+    @staticmethod
+    def SMA(close, timeperiod):
+        return talib.sma(close, timeperiod)
+
+    @staticmethod
+    def MA(close, timeperiod):
+        return talib.ma(close, timeperiod)
+
+    @staticmethod
+    def MACD(close, fast, slow, signal):
+        return talib.macd(close, fast, slow, signal, talib=Imports["talib"])
+
+    @staticmethod
+    def RSI(close, timeperiod):
+        return talib.rsi(close, timeperiod)
+
+    @staticmethod
+    def CCI(high, low, close, timeperiod):
+        return talib.cci(high, low, close, timeperiod)
+
+    @staticmethod
+    def Aroon(high, low, timeperiod):
+        return talib.aroon(high, low, timeperiod)
+
+    @staticmethod
+    def STOCHRSI(close, timeperiod, fastk_period, fastd_period, fastd_matype):
+        _name = "STOCHRSI"
+        _props = f"_{timeperiod}_{timeperiod}_{fastk_period}_{fastd_period}"
+        stochrsi_kname = f"{_name}k{_props}"
+        stochrsi_dname = f"{_name}d{_props}"
+        df = talib.stochrsi(
+            close,
+            length=timeperiod,
+            rsi_length=timeperiod,
+            k=fastk_period,
+            d=fastd_period,
+            mamode=fastd_matype,
+        )
+        return df[stochrsi_kname], df[stochrsi_dname]
+
+    @staticmethod
+    def pattern(open, high, low, close, name):
+        return talib.cdl_pattern(open, high, low, close, name)
+
+
+# Indicators computed by the NumPy kernels in NumpyIndicators. Outputs have
+# the same shapes and types as TA-Lib's, so a Series comes back for a Series.
+# Candle patterns are still left to TA-Lib or pandas_ta.
+class NumpyBackend:
+    @staticmethod
+    def _like(values, reference):
+        if isinstance(reference, pd.Series):
+            return pd.Series(values, index=reference.index)
+        return values
+
+    @staticmethod
+    def EMA(close, timeperiod):
+        return NumpyBackend._like(NumpyIndicators.EMA(close, timeperiod), close)
+
+    @staticmethod
+    def SMA(close, timeperiod):
+        return NumpyBackend._like(NumpyIndicators.SMA(close, timeperiod), close)
+
+    @staticmethod
+    def MA(close, timeperiod):
+        return NumpyBackend.SMA(close, timeperiod)
+
+    @staticmethod
+    def MACD(close, fast, slow, signal):
+        return tuple(
+            NumpyBackend._like(values, close)
+            for values in NumpyIndicators.MACD(close, fast, slow, signal)
+        )
+
+    @staticmethod
+    def RSI(close, timeperiod):
+        return NumpyBackend._like(NumpyIndicators.RSI(close, timeperiod), close)
+
+    @staticmethod
+    def CCI(high, low, close, timeperiod):
+        return NumpyBackend._like(
+            NumpyIndicators.CCI(high, low, close, timeperiod), close
+        )
+
+    @staticmethod
+    def Aroon(high, low, timeperiod):
+        aroon_down, aroon_up = NumpyIndicators.AROON(high, low, timeperiod)
+        return pd.DataFrame(
+            {
+                f"AROOND_{timeperiod}": aroon_down,
+                f"AROONU_{timeperiod}": aroon_up,
+            },
+            index=high.index if isinstance(high, pd.Series) else None,
+        )
+
+    @staticmethod
+    def STOCHRSI(close, timeperiod, fastk_period, fastd_period, fastd_matype):
+        return NumpyIndicators.STOCHRSI(
+            close, timeperiod, fastk_period, fastd_period, fastd_matype
+        )
+
+    @staticmethod
+    def pattern(open, high, low, close, name):
+        native = nativeBackend()
+        if native == "numpy":
+            raise ImportError(
+                f"Candle pattern {name} needs TA-Lib or pandas_ta to be installed."
+            )
+        return backends[native].pattern(open, high, low, close, name)
+
+
+backends = {
+    "talib": TalibBackend,
+    "pandas_ta": PandasTaBackend,
+    "numpy": NumpyBackend,
+}
+
+
+def nativeBackend():
+    if Imports["talib"]:
+        return "talib"
+    return "pandas_ta" if talib is not None else "numpy"
+
+
+# The backend is chosen once, when this module is imported. PKTALIB_BACKEND
+# may name any of the backends to use instead of the installed library.
+def resolveBackend():
+    requested = os.environ.get("PKTALIB_BACKEND", "").lower()
+    native = nativeBackend()
+    return requested if requested in (native, "numpy") else native
 
 
 class pktalib:
+    backend = backends[resolveBackend()]
+
     @classmethod
     def EMA(self, close, timeperiod):
-        try:
-            return talib.ema(close, timeperiod)
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.EMA(close, timeperiod)
+        return self.backend.EMA(close, timeperiod)
 
     @classmethod
     def SMA(self, close, timeperiod):
-        try:
-            return talib.sma(close, timeperiod)
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.SMA(close, timeperiod)
+        return self.backend.SMA(close, timeperiod)
 
     @classmethod
     def MA(self, close, timeperiod):
-        try:
-            return talib.ma(close, timeperiod)
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.MA(close, timeperiod)
+        return self.backend.MA(close, timeperiod)
 
     @classmethod
     def MACD(self, close, fast, slow, signal):
-        try:
-            return talib.macd(close, fast, slow, signal, talib=Imports["talib"])
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.MACD(close, fast, slow, signal)
+        return self.backend.MACD(close, fast, slow, signal)
 
     @classmethod
     def RSI(self, close, timeperiod):
-        try:
-            return talib.rsi(close, timeperiod)
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.RSI(close, timeperiod)
+        return self.backend.RSI(close, timeperiod)
 
     @classmethod
     def CCI(self, high, low, close, timeperiod):
-        try:
-            return talib.cci(high, low, close, timeperiod)
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CCI(high, low, close, timeperiod)
+        return self.backend.CCI(high, low, close, timeperiod)
 
     @classmethod
     def Aroon(self, high, low, timeperiod):
-        try:
-            return talib.aroon(high, low, timeperiod)
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            aroon_down, aroon_up = talib.AROON(high, low, timeperiod)
-            aroon_up.name = f"AROONU_{timeperiod}"
-            aroon_down.name = f"AROOND_{timeperiod}"
-            data = {
-                aroon_down.name: aroon_down,
-                aroon_up.name: aroon_up,
-            }
-            return pd.DataFrame(data)
+        return self.backend.Aroon(high, low, timeperiod)
 
     @classmethod
     def STOCHRSI(self, close, timeperiod, fastk_period, fastd_period, fastd_matype):
-        try:
-            _name = "STOCHRSI"
-            _props = f"_{timeperiod}_{timeperiod}_{fastk_period}_{fastd_period}"
-            stochrsi_kname = f"{_name}k{_props}"
-            stochrsi_dname = f"{_name}d{_props}"
-            df = talib.stochrsi(
-                close,
-                length=timeperiod,
-                rsi_length=timeperiod,
-                k=fastk_period,
-                d=fastd_period,
-                mamode=fastd_matype,
-            )
-            return df[stochrsi_kname], df[stochrsi_dname]
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.STOCHRSI(
-                close.values, timeperiod, fastk_period, fastd_period, fastd_matype
-            )
+        return self.backend.STOCHRSI(
+            close, timeperiod, fastk_period, fastd_period, fastd_matype
+        )
 
     @classmethod
     def ichimoku(
@@ -167,171 +306,87 @@ class pktalib:
 
     @classmethod
     def CDLMORNINGSTAR(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "morningstar")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLMORNINGSTAR(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "morningstar")
 
     @classmethod
     def CDLMORNINGDOJISTAR(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "morningdojistar")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLMORNINGDOJISTAR(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "morningdojistar")
 
     @classmethod
     def CDLEVENINGSTAR(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "eveningstar")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLEVENINGSTAR(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "eveningstar")
 
     @classmethod
     def CDLEVENINGDOJISTAR(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "eveningdojistar")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLEVENINGDOJISTAR(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "eveningdojistar")
 
     @classmethod
     def CDLLADDERBOTTOM(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "ladderbottom")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLLADDERBOTTOM(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "ladderbottom")
 
     @classmethod
     def CDL3LINESTRIKE(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "3linestrike")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDL3LINESTRIKE(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "3linestrike")
 
     @classmethod
     def CDL3BLACKCROWS(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "3blackcrows")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDL3BLACKCROWS(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "3blackcrows")
 
     @classmethod
     def CDL3INSIDE(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "3inside")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDL3INSIDE(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "3inside")
 
     @classmethod
     def CDL3OUTSIDE(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "3outside")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDL3OUTSIDE(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "3outside")
 
     @classmethod
     def CDL3WHITESOLDIERS(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "3whitesoldiers")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDL3WHITESOLDIERS(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "3whitesoldiers")
 
     @classmethod
     def CDLHARAMI(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "harami")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLHARAMI(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "harami")
 
     @classmethod
     def CDLHARAMICROSS(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "haramicross")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLHARAMICROSS(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "haramicross")
 
     @classmethod
     def CDLMARUBOZU(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "marubozu")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLMARUBOZU(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "marubozu")
 
     @classmethod
     def CDLHANGINGMAN(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "hangingman")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLHANGINGMAN(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "hangingman")
 
     @classmethod
     def CDLHAMMER(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "hammer")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLHAMMER(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "hammer")
 
     @classmethod
     def CDLINVERTEDHAMMER(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "invertedhammer")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLINVERTEDHAMMER(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "invertedhammer")
 
     @classmethod
     def CDLSHOOTINGSTAR(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "shootingstar")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLSHOOTINGSTAR(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "shootingstar")
 
     @classmethod
     def CDLDRAGONFLYDOJI(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "dragonflydoji")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLDRAGONFLYDOJI(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "dragonflydoji")
 
     @classmethod
     def CDLGRAVESTONEDOJI(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "gravestonedoji")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLGRAVESTONEDOJI(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "gravestonedoji")
 
     @classmethod
     def CDLDOJI(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "doji")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLDOJI(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "doji")
 
     @classmethod
     def CDLENGULFING(self, open, high, low, close):
-        try:
-            return talib.cdl_pattern(open, high, low, close, "engulfing")
-        except Exception:  # pragma: no cover
-            # default_logger().debug(e, exc_info=True)
-            return talib.CDLENGULFING(open, high, low, close)
+        return self.backend.pattern(open, high, low, close, "engulfing")
 
     @classmethod
     def argrelextrema(self, data, comparator, axis=0, order=1, mode="clip"):
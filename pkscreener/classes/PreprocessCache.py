@@ -0,0 +1,99 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+# Columns of the stock data that the indicators are computed from
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+# Columns that Screener.tools.preprocessData adds to the stock data
+INDICATOR_COLUMNS = ["SMA", "LMA", "SSMA", "VolMA", "RSI", "CCI", "FASTK", "FASTD"]
+
+
+# The indicator columns that Screener.tools.preprocessData computed for each
+# stock, so that scanning the same data again (the next option from the menu,
+# or another scan of the bot) doesn't compute them all over again.
+# Entries are keyed by a fingerprint of the stock data and the least recently
+# used ones are evicted once they take up more than maxBytes.
+class PreprocessCache:
+    maxBytes = 128 * 1024 * 1024
+
+    def __init__(self, maxBytes=None):
+        self.maxBytes = PreprocessCache.maxBytes if maxBytes is None else maxBytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Identifies the data (oldest candle first) of a stock. The prices are
+    # hashed as well because the latest candle keeps changing during the
+    # trading hours without a new row being added.
+    @staticmethod
+    def keyFor(data, stock, useEMA=False):
+        if stock is None or len(data) == 0:
+            return None
+        try:
+            prices = data[PRICE_COLUMNS].to_numpy(dtype=np.float64)
+        except KeyError:
+            return None
+        return (stock, len(data), data.index[-1], bool(useEMA), hash(prices.tobytes()))
+
+    # The indicator columns (dict of column -> array) cached for key, if any.
+    # They're copies, so that the frames they go into can't alter the cache.
+    def get(self, key):
+        if key is None:
+            return None
+        indicators = self.entries.get(key)
+        if indicators is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return {column: values.copy() for column, values in indicators.items()}
+
+    def put(self, key, indicators):
+        if key is None:
+            return
+        indicators = {
+            column: np.array(values, dtype=np.float64)
+            for column, values in indicators.items()
+        }
+        size = sum(values.nbytes for values in indicators.values())
+        if size > self.maxBytes:
+            return
+        self.remove(key)
+        self.entries[key] = indicators
+        self.bytes += size
+        while self.bytes > self.maxBytes:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        indicators = self.entries.pop(key, None)
+        if indicators is not None:
+            self.bytes -= sum(values.nbytes for values in indicators.values())
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
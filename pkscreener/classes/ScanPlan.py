@@ -0,0 +1,156 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+
+
+# Records what a validator writes into the result dictionaries, so that the
+# same writes can be replayed later on the real dictionaries.
+class _RecordingDict(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes = {}
+
+    def __setitem__(self, key, value):
+        self.writes[key] = value
+        super().__setitem__(key, value)
+
+
+# Declares, for each scan, the checks that a stock must pass to be picked.
+# These checks are run before anything else, cheapest first, and the stock is
+# rejected as soon as one of them fails. Everything else that screenStocks
+# computes only fills the display columns, so it's computed only for stocks
+# that got past these checks.
+# Checks are named; StockConsumer.screenStocks supplies what each name means.
+# A tuple of names is passed when any one of them passes.
+class ScanPlan:
+    filters = {
+        1: ("ltp", "volumeRatio", ("breakout", "potentialBreakout")),
+        2: ("ltp", "volumeRatio", "breakout"),
+        3: ("ltp", "consolidation"),
+        4: ("ltp", "lowestVolume"),
+        5: ("ltp", "rsi"),
+        6: ("ltp",),
+        7: ("ltp",),
+        8: ("ltp", "cci"),
+        9: ("volumeRatio",),
+        10: ("priceRising",),
+        11: ("shortTermBullish",),
+        12: ("priceVolumeBreakout",),
+        13: ("intradayRSIMACD",),
+        14: ("nr4Day",),
+        15: ("52WeekLowBreakout",),
+        16: ("10DaysLowBreakout",),
+        17: ("52WeekHighBreakout",),
+        18: ("ltp", "aroonCrossover"),
+        19: ("macdHistBelow0",),
+        20: ("bullishForTomorrow",),
+        23: ("breakingOutNow",),
+        24: ("higherHighsLowsClose",),
+        25: ("lowerLows",),
+    }
+    # Extra checks for executeOption 6, by reversalOption
+    reversalFilters = {
+        3: ("momentum",),
+        4: ("maSupport",),
+        5: ("vsa",),
+        6: ("narrowRange",),
+        7: ("lorentzian",),
+    }
+    # Checks which read what another check writes into the dictionaries
+    requires = {
+        "cci": ("trend",),
+        "potentialBreakout": ("breakout",),
+    }
+    # Rough relative cost of each check. The ones not listed are cheap.
+    costs = {
+        "ltp": 0,
+        "volumeRatio": 0,
+        "breakout": 2,
+        "potentialBreakout": 2,
+        "momentum": 2,
+        "maSupport": 3,
+        "narrowRange": 2,
+        "shortTermBullish": 3,
+        "intradayRSIMACD": 3,
+        "bullishForTomorrow": 3,
+        "trend": 3,
+        "cci": 3,
+        "lorentzian": 9,
+    }
+
+    def __init__(self, executeOption, reversalOption=None):
+        filters = ScanPlan.filters.get(executeOption, ())
+        if executeOption == 6:
+            filters = filters + ScanPlan.reversalFilters.get(reversalOption, ())
+        self.filters = sorted(filters, key=ScanPlan.costOf)
+        self.results = {}
+        self.checks = {}
+
+    @staticmethod
+    def costOf(group):
+        names = group if isinstance(group, tuple) else (group,)
+        return max(ScanPlan.costs.get(name, 1) for name in names)
+
+    # Runs the checks of this scan until one fails. checks maps each name to a
+    # callable(screenDict, saveDict) and accepts optionally maps a name to
+    # what makes its result pass (the result's truth value otherwise).
+    # Whatever the checks write into the dictionaries is only applied when
+    # their value is asked for (see value), so that the columns end up the
+    # same as if the checks were run in their usual order.
+    def prefilter(self, checks, screenDict, saveDict, accepts=None):
+        self.checks = checks
+        accepts = {} if accepts is None else accepts
+        screenScratch = _RecordingDict(screenDict)
+        saveScratch = _RecordingDict(saveDict)
+        for group in self.filters:
+            names = group if isinstance(group, tuple) else (group,)
+            passed = False
+            for name in names:
+                for dependency in ScanPlan.requires.get(name, ()) + (name,):
+                    self.evaluate(dependency, screenScratch, saveScratch)
+                result = self.results[name][0]
+                passed = accepts.get(name, bool)(result)
+                if passed:
+                    break
+            if not passed:
+                return False
+        return True
+
+    def evaluate(self, name, screenScratch, saveScratch):
+        if name in self.results:
+            return
+        screenScratch.writes = {}
+        saveScratch.writes = {}
+        result = self.checks[name](screenScratch, saveScratch)
+        self.results[name] = (result, screenScratch.writes, saveScratch.writes)
+
+    # Result of the named check. A check that already ran as a filter isn't
+    # run again: what it wrote is applied to the dictionaries instead.
+    def value(self, name, screenDict, saveDict):
+        if name not in self.results:
+            return self.checks[name](screenDict, saveDict)
+        result, screenWrites, saveWrites = self.results[name]
+        screenDict.update(screenWrites)
+        saveDict.update(saveWrites)
+        return result
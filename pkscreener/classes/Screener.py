@@ -24,7 +24,6 @@
 """
 
 import math
-import sys
 import warnings
 
 import numpy as np
@@ -34,16 +33,16 @@ warnings.simplefilter("ignore", FutureWarning)
 import pandas as pd
 
 import pkscreener.classes.Utility as Utility
-from pkscreener import Imports
-from pkscreener.classes.Pktalib import pktalib
-
-if sys.version_info >= (3, 11):
-    from advanced_ta import LorentzianClassification
+from pkscreener.classes.FeatureStore import FeatureStore
+from pkscreener.classes.FiveEmaMonitor import FiveEmaMonitor, YahooBars
+from pkscreener.classes.IndicatorState import IndicatorState, IndicatorStateStore
+from pkscreener.classes.LorentzianEngine import LorentzianEngine
+from pkscreener.classes.NiftyModel import NiftyModelService
+from pkscreener.classes.Pktalib import NumpyBackend, TalibBackend, pktalib
+from pkscreener.classes.PreprocessCache import INDICATOR_COLUMNS, PreprocessCache
 
 
 # from sklearn.preprocessing import StandardScaler
-if Imports["scipy"]:
-    from scipy.stats import linregress
 
 from PKDevTools.classes.ColorText import colorText
 from PKDevTools.classes.SuppressOutput import SuppressOutput
@@ -79,6 +78,19 @@ class tools:
     def __init__(self, configManager, default_logger) -> None:
         self.configManager = configManager
         self.default_logger = default_logger
+        self.indicatorStateStore = None
+        self.lorentzianEngine = LorentzianEngine()
+        self.preprocessCache = PreprocessCache()
+        self.featureStore = None
+        self.fiveEmaMonitor = None
+        self.niftyModel = NiftyModelService.instance()
+
+    # The FeatureStore of the stock data being screened. Validators get the
+    # same data frame for a stock, so its store is kept until another comes.
+    def features(self, data):
+        if self.featureStore is None or self.featureStore.data is not data:
+            self.featureStore = FeatureStore(data)
+        return self.featureStore
 
     # Find stocks that have broken through 52 week low.
     def find52WeekHighBreakout(self, data):
@@ -176,11 +188,8 @@ class tools:
         # Find stocks that have broken through 52 week low.
 
     def findAroonBullishCrossover(self, data):
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
         period = 14
-        data = data[::-1]  # Reverse the dataframe so that its the oldest date first
-        aroondf = pktalib.Aroon(data["High"], data["Low"], period)
+        aroondf = self.features(data).get("Aroon", period, columns=("High", "Low"))
         recent = aroondf.tail(1)
         up = recent[f"AROONU_{period}"].iloc[0]
         down = recent[f"AROOND_{period}"].iloc[0]
@@ -343,32 +352,24 @@ class tools:
 
     # Find stocks that are bullish intraday: RSI crosses 55, Macd Histogram positive, price above EMA 10
     def findBullishIntradayRSIMACD(self, data):
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
-        data = data[::-1]  # Reverse the dataframe so that its the oldest date first
-        data["RSI12"] = pktalib.RSI(data["Close"], 12)
-        data["EMA10"] = pktalib.EMA(data["Close"], 10)
-        data["EMA200"] = pktalib.EMA(data["Close"], 200)
-        macd = pktalib.MACD(data["Close"], 10, 18, 9)[2].tail(1)
-        recent = data.tail(1)
-        cond1 = recent["RSI12"].iloc[0] > 55
-        cond2 = cond1 and (macd.iloc[:1][0] > 0)
-        cond3 = cond2 and (recent["Close"].iloc[0] > recent["EMA10"].iloc[0])
-        cond4 = cond3 and (recent["Close"].iloc[0] > recent["EMA200"].iloc[0])
+        features = self.features(data)
+        close = features.frame()["Close"].iloc[-1]
+        macd = features.get("MACD", 10, 18, 9)[2].tail(1)
+        cond1 = features.get("RSI", 12).iloc[-1] > 55
+        cond2 = cond1 and (macd.iloc[:1].iloc[0] > 0)
+        cond3 = cond2 and (close > features.get("EMA", 10).iloc[-1])
+        cond4 = cond3 and (close > features.get("EMA", 200).iloc[-1])
         return cond4
 
     def findNR4Day(self, data):
         # https://chartink.com/screener/nr4-daily-today
         if data.tail(1)["Volume"].iloc[0] <= 50000:
             return False
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
-        data = data[::-1]  # Reverse the dataframe so that its the oldest date first
-        data["SMA10"] = pktalib.SMA(data["Close"], 10)
-        data["SMA50"] = pktalib.SMA(data["Close"], 50)
-        data["SMA200"] = pktalib.SMA(data["Close"], 200)
-        recent = data.tail(5)
-        recent = recent[::-1]
+        features = self.features(data)
+        recent = features.frame().tail(5)[::-1]
+        sma10, sma50, sma200 = [
+            features.get("SMA", period).iloc[-1] for period in [10, 50, 200]
+        ]
         cond1 = (recent["High"].iloc[0] - recent["Low"].iloc[0]) < (
             recent["High"].iloc[1] - recent["Low"].iloc[1]
         )
@@ -381,8 +382,8 @@ class tools:
         cond4 = cond3 and (recent["High"].iloc[0] - recent["Low"].iloc[0]) < (
             recent["High"].iloc[4] - recent["Low"].iloc[4]
         )
-        cond5 = cond4 and (recent["SMA10"].iloc[0] > recent["SMA50"].iloc[0])
-        cond6 = cond5 and (recent["SMA50"].iloc[0] > recent["SMA200"].iloc[0])
+        cond5 = cond4 and (sma10 > sma50)
+        cond6 = cond5 and (sma50 > sma200)
         return cond6
 
     # Find potential breakout stocks
@@ -433,35 +434,19 @@ class tools:
         maRange = [10, 20, 50, 200]
         results = []
         hasReversals = False
-        data = data[::-1]
+        features = self.features(data)
+        close = data["Close"].head(3).to_numpy()
         for maLength in maRange:
-            dataCopy = data
-            if self.configManager.useEMA:
-                maRev = pktalib.EMA(dataCopy["Close"], timeperiod=maLength)
-            else:
-                maRev = pktalib.MA(dataCopy["Close"], timeperiod=maLength)
-            try:
-                dataCopy.drop("maRev", axis=1, inplace=True, errors="ignore")
-            except Exception:
-                pass
-            dataCopy.insert(len(dataCopy.columns), "maRev", maRev)
-            dataCopy = dataCopy[::-1].head(3)
-            if (
-                dataCopy.equals(
-                    dataCopy[
-                        (
-                            dataCopy.Close
-                            >= (dataCopy.maRev - (dataCopy.maRev * percentage))
-                        )
-                        & (
-                            dataCopy.Close
-                            <= (dataCopy.maRev + (dataCopy.maRev * percentage))
-                        )
-                    ]
+            maRev = features.get(
+                "EMA" if self.configManager.useEMA else "MA", maLength, clean=False
+            )
+            maRev = maRev.to_numpy()[::-1][:3]
+            with np.errstate(invalid="ignore"):
+                nearMA = np.all(
+                    (close >= (maRev - (maRev * percentage)))
+                    & (close <= (maRev + (maRev * percentage)))
                 )
-                and dataCopy.head(1)["Close"].iloc[0]
-                >= dataCopy.head(1)["maRev"].iloc[0]
-            ):
+            if nearMA and close[0] >= maRev[0]:
                 hasReversals = True
                 results.append(str(maLength))
         if hasReversals:
@@ -478,149 +463,156 @@ class tools:
     def findTrend(self, data, screenDict, saveDict, daysToLookback=None, stockName=""):
         if daysToLookback is None:
             daysToLookback = self.configManager.daysToLookback
-        data = data.head(daysToLookback)
-        data = data[::-1]
-        data = data.set_index(np.arange(len(data)))
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
         try:
-            with SuppressOutput(suppress_stdout=True, suppress_stderr=True):
-                data["tops"] = data["Close"].iloc[
-                    list(
-                        pktalib.argrelextrema(
-                            np.array(data["Close"]), np.greater_equal, order=1
-                        )[0]
-                    )
-                ]
-            data = data.fillna(0)
-            data = data.replace([np.inf, -np.inf], 0)
-
-            try:
-                # if len(data) < daysToLookback:
-                #     self.default_logger.debug(data)
-                #     raise StockDataNotAdequate
-                data = data.replace(np.inf, np.nan).replace(-np.inf, np.nan).dropna()
-                if len(data["tops"][data.tops > 0]) > 1:
-                    slope = np.polyfit(
-                        data.index[data.tops > 0], data["tops"][data.tops > 0], 1
-                    )[0]
-                else:
-                    slope = 0
-            except np.linalg.LinAlgError as e:
-                self.default_logger.debug(e, exc_info=True)
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.WARN + "Unknown" + colorText.END
-                )
-                saveDict["Trend"] = "Unknown"
-                return saveDict["Trend"]
-            except Exception as e:  # pragma: no cover
-                self.default_logger.debug(e, exc_info=True)
-                slope, _ = 0, 0
-            angle = np.rad2deg(np.arctan(slope))
-            if angle == 0:
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.WARN + "Unknown" + colorText.END
-                )
-                saveDict["Trend"] = "Unknown"
-            elif angle <= 30 and angle >= -30:
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.WARN + "Sideways" + colorText.END
-                )
-                saveDict["Trend"] = "Sideways"
-            elif angle >= 30 and angle < 61:
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.GREEN + "Weak Up" + colorText.END
-                )
-                saveDict["Trend"] = "Weak Up"
-            elif angle >= 60:
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.GREEN + "Strong Up" + colorText.END
-                )
-                saveDict["Trend"] = "Strong Up"
-            elif angle <= -30 and angle > -61:
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.FAIL + "Weak Down" + colorText.END
-                )
-                saveDict["Trend"] = "Weak Down"
-            elif angle <= -60:
-                screenDict["Trend"] = (
-                    colorText.BOLD + colorText.FAIL + "Strong Down" + colorText.END
-                )
-                saveDict["Trend"] = "Strong Down"
-        except np.linalg.LinAlgError as e:
+            # Latest candle is the first row, so the window is read backwards
+            closes = data["Close"].to_numpy(dtype=np.float64)[:daysToLookback][::-1]
+            slope = self.trendSlopes(closes)[0]
+        except Exception as e:  # pragma: no cover
             self.default_logger.debug(e, exc_info=True)
-            screenDict["Trend"] = (
-                colorText.BOLD + colorText.WARN + "Unknown" + colorText.END
-            )
-            saveDict["Trend"] = "Unknown"
+            slope = np.nan
+        trend, color = self.trendLabels(slope)[0]
+        screenDict["Trend"] = colorText.BOLD + color + trend + colorText.END
+        saveDict["Trend"] = trend
         return saveDict["Trend"]
 
+    # Trends of many stocks, or of one stock as of many backtested days, at once.
+    # Each row of closes is one series, oldest first, of which the last
+    # daysToLookback candles are used.
+    def findTrends(self, closes, daysToLookback=None):
+        if daysToLookback is None:
+            daysToLookback = self.configManager.daysToLookback
+        closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+        slopes = self.trendSlopes(closes[:, -daysToLookback:])
+        return [trend for trend, _ in self.trendLabels(slopes)]
+
+    # Least-squares slope of the line through the local tops (closes not lower
+    # than either neighbour) of each row, or NaN where there are fewer than 2 tops.
+    # Missing closes count as 0 and are never tops themselves.
+    @staticmethod
+    def trendSlopes(closes):
+        closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+        closes = np.where(np.isfinite(closes), closes, 0)
+        tops = np.ones(closes.shape, dtype=bool)
+        tops[:, 1:] &= closes[:, 1:] >= closes[:, :-1]
+        tops[:, :-1] &= closes[:, :-1] >= closes[:, 1:]
+        tops &= closes > 0
+        counts = tops.sum(axis=1)
+        x = np.arange(closes.shape[1], dtype=np.float64)
+        meanX = (tops * x).sum(axis=1) / np.maximum(counts, 1)
+        dx = np.where(tops, x - meanX[:, None], 0)
+        # Measured from the first top, equal tops give a slope of exactly 0
+        dy = closes - closes[np.arange(len(closes)), tops.argmax(axis=1)][:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        return np.where(counts > 1, slopes, np.nan)
+
+    # (trend, colour) of each slope
+    @staticmethod
+    def trendLabels(slopes):
+        angles = np.rad2deg(np.arctan(np.atleast_1d(slopes)))
+        labels = []
+        for angle in angles:
+            if np.isnan(angle):
+                labels.append(("Unknown", colorText.WARN))
+            elif angle <= 30 and angle >= -30:
+                labels.append(("Sideways", colorText.WARN))
+            elif angle > 30 and angle < 61:
+                labels.append(("Weak Up", colorText.GREEN))
+            elif angle >= 61:
+                labels.append(("Strong Up", colorText.GREEN))
+            elif angle < -30 and angle > -61:
+                labels.append(("Weak Down", colorText.FAIL))
+            else:
+                labels.append(("Strong Down", colorText.FAIL))
+        return labels
+
     # Find stocks approching to long term trendlines
     def findTrendlines(self, data, screenDict, saveDict, percentage=0.05):
         # period = int("".join(c for c in self.configManager.period if c.isdigit()))
         # if len(data) < period:
         #     return False
-
-        data = data[::-1]
-        data["Number"] = np.arange(len(data)) + 1
-        data_low = data.copy()
-        points = 30
-
-        """ Ignoring the Resitance for long-term purpose
-        while len(data_high) > points:
-            slope, intercept, r_value, p_value, std_err = linregress(x=data_high['Number'], y=data_high['High'])
-            data_high = data_high.loc[data_high['High'] > slope * data_high['Number'] + intercept]
-        slope, intercept, r_value, p_value, std_err = linregress(x=data_high['Number'], y=data_high['Close'])
-        data['Resistance'] = slope * data['Number'] + intercept
-        """
-
-        while len(data_low) > points:
-            try:
-                slope, intercept, r_value, p_value, std_err = linregress(
-                    x=data_low["Number"], y=data_low["Low"]
-                )
-            except Exception as e:  # pragma: no cover
-                self.default_logger.debug(e, exc_info=True)
-                continue
-            data_low = data_low.loc[
-                data_low["Low"] < slope * data_low["Number"] + intercept
-            ]
-
-        slope, intercept, r_value, p_value, std_err = linregress(
-            x=data_low["Number"], y=data_low["Close"]
-        )
-        data["Support"] = slope * data["Number"] + intercept
-        now = data.tail(1)
-
-        limit_upper = now["Support"].iloc[0] + (now["Support"].iloc[0] * percentage)
-        limit_lower = now["Support"].iloc[0] - (now["Support"].iloc[0] * percentage)
-
-        if limit_lower < now["Close"].iloc[0] < limit_upper and slope > 0.15:
+        low, close = [
+            data[column].to_numpy(dtype=np.float64)[::-1] for column in ["Low", "Close"]
+        ]
+        if self.trendlineSupportDays(low, close, [len(close) - 1], percentage)[0]:
             screenDict["Pattern"] = (
                 colorText.BOLD + colorText.GREEN + "Trendline-Support" + colorText.END
             )
             saveDict["Pattern"] = "Trendline-Support"
             return True
-
-        """ Plots for debugging
-        import matplotlib.pyplot as plt
-        fig, ax1 = plt.subplots(figsize=(15,10))
-        color = 'tab:green'
-        xdate = [x.date() for x in data.index]
-        ax1.set_xlabel('Date', color=color)
-        ax1.plot(xdate, data.Close, label="close", color=color)
-        ax1.tick_params(axis='x', labelcolor=color)
-
-        ax2 = ax1.twiny() # ax2 and ax1 will have common y axis and different x axis, twiny
-        ax2.plot(data.Number, data.Resistance, label="Res")
-        ax2.plot(data.Number, data.Support, label="Sup")
-
-        plt.legend()
-        plt.grid()
-        plt.show()
-        """
         return False
 
+    # Whether the close is within percentage of a rising support trendline as of
+    # each of the asOf candles of a stock (oldest first). The days are solved
+    # together, a batch of them at a time.
+    @staticmethod
+    def trendlineSupportDays(low, close, asOf, percentage=0.05, points=30):
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        asOf = np.asarray(asOf, dtype=int)
+        isSupport = np.zeros(len(asOf), dtype=bool)
+        candles = np.arange(len(low))
+        for start in range(0, len(asOf), 256):
+            days = asOf[start : start + 256]
+            # Each row is the stock as it looked on one of the days
+            later = candles[None, :] > days[:, None]
+            slope, intercept = tools.trendlineSupports(
+                np.where(later, np.nan, low), np.where(later, np.nan, close), points
+            )
+            support = slope * days + intercept
+            with np.errstate(invalid="ignore"):
+                isSupport[start : start + 256] = (
+                    (support - (support * percentage) < close[days])
+                    & (close[days] < support + (support * percentage))
+                    & (slope > 0.15)
+                )
+        return isSupport
+
+    # Support trendline (slope, intercept) of each row of lows and closes (oldest
+    # first, NaN where there is no data), against the candle positions. The lows
+    # below the least-squares line through the lows are kept until there are
+    # no more than points of them, and the line is then fitted through the
+    # closes of those candles. NaN where fewer than 2 candles are left.
+    # Each round drops at least one low of every row still being refined (or
+    # stops refining it), so there are never more rounds than candles.
+    @staticmethod
+    def trendlineSupports(lows, closes, points=30):
+        lows = np.atleast_2d(np.asarray(lows, dtype=np.float64))
+        closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+        x = np.arange(lows.shape[1], dtype=np.float64)
+        kept = np.isfinite(lows)
+        refined = np.zeros(len(lows), dtype=bool)
+        for _ in range(lows.shape[1]):
+            counts = kept.sum(axis=1)
+            refining = np.flatnonzero((counts > points) & ~refined)
+            if len(refining) == 0:
+                break
+            slope, intercept = tools.leastSquares(
+                x, lows[refining], kept[refining]
+            )
+            with np.errstate(invalid="ignore"):
+                below = kept[refining] & (
+                    lows[refining] < slope[:, None] * x + intercept[:, None]
+                )
+            # Lows which are all on the line can not be refined any further
+            stuck = below.sum(axis=1) == counts[refining]
+            refined[refining[stuck]] = True
+            kept[refining[~stuck]] = below[~stuck]
+        return tools.leastSquares(x, closes, kept & np.isfinite(closes))
+
+    # Least-squares (slope, intercept) of the values of each row of y where
+    # kept, against x. NaN where fewer than 2 distinct x are kept.
+    @staticmethod
+    def leastSquares(x, y, kept):
+        counts = kept.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            meanX = (kept * x).sum(axis=1) / counts
+            meanY = np.where(kept, y, 0).sum(axis=1) / counts
+            dx = np.where(kept, x - meanX[:, None], 0)
+            dy = np.where(kept, y - meanY[:, None], 0)
+            slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        return slope, meanY - slope * meanX
+
     # Private method to find candle type
     # True = Bullish, False = Bearish
     def getCandleType(self, dailyData):
@@ -634,19 +626,12 @@ class tools:
         import warnings
 
         warnings.filterwarnings("ignore")
-        model, pkl = Utility.tools.getNiftyModel()
+        model, pkl = self.niftyModel.get()
         if model is None or pkl is None:
             return 0, "Unknown", "Unknown"
         with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-            data = data[pkl["columns"]]
-            ### v2 Preprocessing
-            data["High"] = data["High"].pct_change() * 100
-            data["Low"] = data["Low"].pct_change() * 100
-            data["Open"] = data["Open"].pct_change() * 100
-            data["Close"] = data["Close"].pct_change() * 100
-            data = data.iloc[-1]
-            ###
-            data = pkl["scaler"].transform([data])
+            ### v2 Preprocessing of the latest day
+            data = self.niftyModel.inputs(data.tail(2))
             pred = model.predict(data)[0]
         if pred > 0.5:
             outText = "BEARISH"
@@ -700,154 +685,75 @@ class tools:
 
         return pred, predictionText.replace(out, outText), strengthText
 
-    def monitorFiveEma(self, fetcher, result_df, last_signal, risk_reward=3):
-        col_names = ["High", "Low", "Close", "5EMA"]
-        data_list = ["nifty_buy", "banknifty_buy", "nifty_sell", "banknifty_sell"]
-
-        data_tuple = fetcher.fetchFiveEmaData()
-        for cnt in range(len(data_tuple)):
-            d = data_tuple[cnt]
-            d["5EMA"] = pktalib.EMA(d["Close"], timeperiod=5)
-            d = d[col_names]
-            d = d.dropna().round(2)
-
-            with SuppressOutput(suppress_stderr=True, suppress_stdout=True):
-                if "sell" in data_list[cnt]:
-                    streched = d[(d.Low > d["5EMA"]) & (d.Low - d["5EMA"] > 0.5)]
-                    streched["SL"] = streched.High
-                    validate = d[
-                        (d.Low.shift(1) > d["5EMA"].shift(1))
-                        & (d.Low.shift(1) - d["5EMA"].shift(1) > 0.5)
-                    ]
-                    old_index = validate.index
-                else:
-                    mask = (d.High < d["5EMA"]) & (d["5EMA"] - d.High > 0.5)  # Buy
-                    streched = d[mask]
-                    streched["SL"] = streched.Low
-                    validate = d.loc[mask.shift(1).fillna(False)]
-                    old_index = validate.index
-            tgt = pd.DataFrame(
-                (
-                    validate.Close.reset_index(drop=True)
-                    - (
-                        (
-                            streched.SL.reset_index(drop=True)
-                            - validate.Close.reset_index(drop=True)
-                        )
-                        * risk_reward
-                    )
-                ),
-                columns=["Target"],
+    # Live 5-EMA scan of Nifty and Bank Nifty. The monitor is kept between
+    # scans so that only the candles since the previous scan are processed.
+    def monitorFiveEma(self, fetcher, result_df, risk_reward=3):
+        if self.fiveEmaMonitor is None:
+            self.fiveEmaMonitor = FiveEmaMonitor(
+                YahooBars(fetcher), riskReward=risk_reward
             )
-            validate = pd.concat(
-                [
-                    validate.reset_index(drop=True),
-                    streched["SL"].reset_index(drop=True),
-                    tgt,
-                ],
-                axis=1,
-            )
-            validate = validate.tail(len(old_index))
-            validate = validate.set_index(old_index)
-            if "sell" in data_list[cnt]:
-                final = validate[validate.Close < validate["5EMA"]].tail(1)
-            else:
-                final = validate[validate.Close > validate["5EMA"]].tail(1)
-
-            if data_list[cnt] not in last_signal:
-                last_signal[data_list[cnt]] = final
-            elif data_list[cnt] in last_signal:
-                try:
-                    condition = last_signal[data_list[cnt]][0]["SL"][0]
-                except KeyError as e:
-                    self.default_logger.debug(e, exc_info=True)
-                    condition = last_signal[data_list[cnt]]["SL"][0]
-                # if last_signal[data_list[cnt]] is not final:          # Debug - Shows all conditions
-                if len(final["SL"]) > 0 and condition != final["SL"].iloc[0]:
-                    # Do something with results
-                    try:
-                        result_df = pd.concat(
-                            [
-                                result_df,
-                                pd.DataFrame(
-                                    [
-                                        [
-                                            colorText.BLUE
-                                            + str(final.index[0])
-                                            + colorText.END,
-                                            colorText.BOLD
-                                            + colorText.WARN
-                                            + data_list[cnt].split("_")[0].upper()
-                                            + colorText.END,
-                                            (
-                                                colorText.BOLD
-                                                + colorText.FAIL
-                                                + data_list[cnt].split("_")[1].upper()
-                                                + colorText.END
-                                            )
-                                            if "sell" in data_list[cnt]
-                                            else (
-                                                colorText.BOLD
-                                                + colorText.GREEN
-                                                + data_list[cnt].split("_")[1].upper()
-                                                + colorText.END
-                                            ),
-                                            colorText.FAIL
-                                            + str(final.SL[0])
-                                            + colorText.END,
-                                            colorText.GREEN
-                                            + str(final.Target[0])
-                                            + colorText.END,
-                                            f"1:{risk_reward}",
-                                        ]
-                                    ],
-                                    columns=result_df.columns,
-                                ),
-                            ],
-                            axis=0,
-                        )
-                        result_df.reset_index(drop=True, inplace=True)
-                    except Exception as e:  # pragma: no cover
-                        self.default_logger.debug(e, exc_info=True)
-                        pass
-                    # Then update
-                    last_signal[data_list[cnt]] = [final]
-        if result_df is not None:
-            result_df.drop_duplicates(keep="last", inplace=True)
-            result_df.sort_values(by="Time", inplace=True)
-        return result_df[::-1]
+        return self.fiveEmaMonitor.scan(result_df)
 
     # Preprocess the acquired data
-    def preprocessData(self, data, daysToLookback=None):
+    # When stock is given, the indicators are reused if the very same data was
+    # preprocessed before, or else carried forward from the state saved by the
+    # previous run for that stock, so only new candles are computed.
+    def preprocessData(self, data, daysToLookback=None, stock=None):
         self.default_logger.info(f"Preprocessing data:\n{data.head(1)}\n")
         if daysToLookback is None:
             daysToLookback = self.configManager.daysToLookback
-        if self.configManager.useEMA:
-            sma = pktalib.EMA(data["Close"], timeperiod=50)
-            lma = pktalib.EMA(data["Close"], timeperiod=200)
-            ssma = pktalib.EMA(data["Close"], timeperiod=9)
-            data.insert(6, "SMA", sma)
-            data.insert(7, "LMA", lma)
-            data.insert(8, "SSMA", ssma)
+        indicators = None
+        cacheKey = None
+        if stock is not None:
+            cacheKey = PreprocessCache.keyFor(
+                data, stock, useEMA=self.configManager.useEMA
+            )
+            indicators = self.preprocessCache.get(cacheKey)
+            if indicators is None:
+                indicators = self.incrementalIndicators(data, stock)
+            else:
+                cacheKey = None
+        if indicators is not None:
+            for position, column in enumerate(INDICATOR_COLUMNS, start=6):
+                data.insert(position, column, indicators[column])
         else:
-            sma = data.rolling(window=50).mean()
-            lma = data.rolling(window=200).mean()
-            ssma = data.rolling(window=9).mean()
-            data.insert(6, "SMA", sma["Close"])
-            data.insert(7, "LMA", lma["Close"])
-            data.insert(8, "SSMA", ssma["Close"])
-        vol = data.rolling(window=20).mean()
-        rsi = pktalib.RSI(data["Close"], timeperiod=14)
-        data.insert(9, "VolMA", vol["Volume"])
-        data.insert(10, "RSI", rsi)
-        cci = pktalib.CCI(data["High"], data["Low"], data["Close"], timeperiod=14)
-        data.insert(11, "CCI", cci)
-        # len(data["Close"])
-        fastk, fastd = pktalib.STOCHRSI(
-            data["Close"], timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0
-        )
-        data.insert(12, "FASTK", fastk)
-        data.insert(13, "FASTD", fastd)
+            if self.configManager.useEMA:
+                sma = pktalib.EMA(data["Close"], timeperiod=50)
+                lma = pktalib.EMA(data["Close"], timeperiod=200)
+                ssma = pktalib.EMA(data["Close"], timeperiod=9)
+                data.insert(6, "SMA", sma)
+                data.insert(7, "LMA", lma)
+                data.insert(8, "SSMA", ssma)
+            else:
+                sma = data.rolling(window=50).mean()
+                lma = data.rolling(window=200).mean()
+                ssma = data.rolling(window=9).mean()
+                data.insert(6, "SMA", sma["Close"])
+                data.insert(7, "LMA", lma["Close"])
+                data.insert(8, "SSMA", ssma["Close"])
+            vol = data.rolling(window=20).mean()
+            rsi = pktalib.RSI(data["Close"], timeperiod=14)
+            data.insert(9, "VolMA", vol["Volume"])
+            data.insert(10, "RSI", rsi)
+            cci = pktalib.CCI(data["High"], data["Low"], data["Close"], timeperiod=14)
+            data.insert(11, "CCI", cci)
+            # len(data["Close"])
+            fastk, fastd = pktalib.STOCHRSI(
+                data["Close"],
+                timeperiod=14,
+                fastk_period=5,
+                fastd_period=3,
+                fastd_matype=0,
+            )
+            data.insert(12, "FASTK", fastk)
+            data.insert(13, "FASTD", fastd)
+            if stock is not None:
+                self.saveIndicatorState(data, stock)
+        if cacheKey is not None:
+            # Not found in the cache
+            self.preprocessCache.put(
+                cacheKey, {column: data[column] for column in INDICATOR_COLUMNS}
+            )
         data = data[::-1]  # Reverse the dataframe
         # data = data.fillna(0)
         # data = data.replace([np.inf, -np.inf], 0)
@@ -855,33 +761,67 @@ class tools:
         trimmedData = data.head(daysToLookback)
         return (fullData, trimmedData)
 
+    def getIndicatorStateStore(self):
+        if self.indicatorStateStore is None:
+            self.indicatorStateStore = IndicatorStateStore.forConfig(self.configManager)
+        return self.indicatorStateStore
+
+    # The saved state follows TA-Lib's recurrences, so it's only used when
+    # pktalib computes with TA-Lib or the NumPy kernels that mirror it.
+    @staticmethod
+    def carriesIndicatorState():
+        return pktalib.backend in (TalibBackend, NumpyBackend)
+
+    def incrementalIndicators(self, data, stock):
+        if not tools.carriesIndicatorState() or len(data.columns) != 6:
+            return None
+        try:
+            store = self.getIndicatorStateStore()
+            state = store.get(stock, useEMA=self.configManager.useEMA)
+            if state is None:
+                return None
+            committed = len(state.index)
+            indicators = state.extend(data)
+            # A candle that's still forming doesn't change the saved state
+            if indicators is not None and len(state.index) != committed:
+                store.put(stock, state)
+            return indicators
+        except Exception as e:  # pragma: no cover
+            self.default_logger.debug(e, exc_info=True)
+            return None
+
+    def saveIndicatorState(self, data, stock):
+        if not tools.carriesIndicatorState():
+            return
+        try:
+            state = IndicatorState.fromFrame(data, useEMA=self.configManager.useEMA)
+            store = self.getIndicatorStateStore()
+            if state is None:
+                store.delete(stock)
+            else:
+                store.put(stock, state)
+        except Exception as e:  # pragma: no cover
+            self.default_logger.debug(e, exc_info=True)
+
     # Validate if the stock is bullish in the short term
     def validate15MinutePriceVolumeBreakout(self, data):
         # https://chartink.com/screener/15-min-price-volume-breakout
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
-        data = data[::-1]  # Reverse the dataframe so that its the oldest date first
-        data["SMA20"] = pktalib.SMA(data["Close"], 20)
-        data["SMA20V"] = pktalib.SMA(data["Volume"], 20)
-        data = data[
-            ::-1
-        ]  # Reverse the dataframe so that it's the most recent date first
-        recent = data.head(3)
+        features = self.features(data)
+        recent = features.frame().tail(3)[::-1]
+        sma20 = features.get("SMA", 20).iloc[-1]
+        sma20V = features.get("SMA", 20, columns=("Volume",)).iloc[-1]
         cond1 = recent["Close"].iloc[0] > recent["Close"].iloc[1]
-        cond2 = cond1 and (recent["Close"].iloc[0] > recent["SMA20"].iloc[0])
+        cond2 = cond1 and (recent["Close"].iloc[0] > sma20)
         cond3 = cond2 and (recent["Close"].iloc[1] > recent["High"].iloc[2])
-        cond4 = cond3 and (recent["Volume"].iloc[0] > recent["SMA20V"].iloc[0])
-        cond5 = cond4 and (recent["Volume"].iloc[1] > recent["SMA20V"].iloc[0])
+        cond4 = cond3 and (recent["Volume"].iloc[0] > sma20V)
+        cond5 = cond4 and (recent["Volume"].iloc[1] > sma20V)
         return cond5
 
     def validateBullishForTomorrow(self, data):
         # https://chartink.com/screener/bullish-for-tomorrow
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
-        data = data[::-1]  # Reverse the dataframe so that its the oldest date first
-        macdLine = pktalib.MACD(data["Close"], 12, 26, 9)[0].tail(3)
-        macdSignal = pktalib.MACD(data["Close"], 12, 26, 9)[1].tail(3)
-        macdHist = pktalib.MACD(data["Close"], 12, 26, 9)[2].tail(3)
+        macdLine, macdSignal, macdHist = [
+            values.tail(3) for values in self.features(data).get("MACD", 12, 26, 9)
+        ]
 
         return (
             (macdHist.iloc[:1].iloc[0] < macdHist.iloc[:2].iloc[1])
@@ -1007,13 +947,13 @@ class tools:
         #                 (day1["RSI"].iloc[0] > day2["RSI"].iloc[0]) and \
         #                 (day2["RSI"].iloc[0] > day3["RSI"].iloc[0]) and \
         #                 day3["RSI"].iloc[0] >= 50 and day0["RSI"].iloc[0] >= 65
-        reversedData = data[::-1].copy()
-        reversedData["SUPERT"] = pktalib.supertrend(reversedData, 7, 3)["SUPERT_7_3.0"]
-        reversedData["EMA8"] = pktalib.EMA(reversedData["Close"], timeperiod=9)
+        features = self.features(data)
+        supertrend = features.get("supertrend", 7, 3, columns=None, clean=False)
+        ema8 = features.get("EMA", 9, clean=False)
         higherClose = (
             higherClose
-            and day0["Close"].iloc[0] > reversedData.tail(1)["SUPERT"].iloc[0]
-            and day0["Close"].iloc[0] > reversedData.tail(1)["EMA8"].iloc[0]
+            and day0["Close"].iloc[0] > supertrend["SUPERT_7_3.0"].iloc[-1]
+            and day0["Close"].iloc[0] > ema8.iloc[-1]
         )
         return higherHighs and higherLows and higherClose
 
@@ -1106,28 +1046,22 @@ class tools:
         return False
 
     # Validate Lorentzian Classification signal
-    def validateLorentzian(self, data, screenDict, saveDict, lookFor=1):
+    def validateLorentzian(
+        self, data, screenDict, saveDict, lookFor=1, stockName=None
+    ):
         # lookFor: 1-Any, 2-Buy, 3-Sell
-        data = data[::-1]  # Reverse the dataframe
-        data = data.rename(
-            columns={
-                "Open": "open",
-                "Close": "close",
-                "High": "high",
-                "Low": "low",
-                "Volume": "volume",
-            }
-        )
         try:
-            lc = LorentzianClassification(data=data)
-            if lc.df.iloc[-1]["isNewBuySignal"]:
+            isNewBuySignal, isNewSellSignal = self.lorentzianEngine.signal(
+                data, stockName
+            )
+            if isNewBuySignal:
                 screenDict["Pattern"] = (
                     colorText.BOLD + colorText.GREEN + "Lorentzian-Buy" + colorText.END
                 )
                 saveDict["Pattern"] = "Lorentzian-Buy"
                 if lookFor != 3:
                     return True
-            elif lc.df.iloc[-1]["isNewSellSignal"]:
+            elif isNewSellSignal:
                 screenDict["Pattern"] = (
                     colorText.BOLD + colorText.FAIL + "Lorentzian-Sell" + colorText.END
                 )
@@ -1254,11 +1188,8 @@ class tools:
 
     # Find stocks that are bearish intraday: Macd Histogram negative
     def validateMACDHistogramBelow0(self, data):
-        data = data.fillna(0)
-        data = data.replace([np.inf, -np.inf], 0)
-        data = data[::-1]  # Reverse the dataframe so that its the oldest date first
-        macd = pktalib.MACD(data["Close"], 12, 26, 9)[2].tail(1)
-        return macd.iloc[:1][0] < 0
+        macd = self.features(data).get("MACD", 12, 26, 9)[2].tail(1)
+        return macd.iloc[:1].iloc[0] < 0
 
     # Find if stock gaining bullish momentum
     def validateMomentum(self, data, screenDict, saveDict):
@@ -1517,8 +1448,8 @@ class tools:
         data = data.replace([np.inf, -np.inf], 0)
         recent = data.head(1)
         fk = 0 if len(data) < 3 else np.round(data["FASTK"].iloc[2], 5)
-        # Reverse the dataframe for ichimoku calculations with date in ascending order
-        df_new = data[::-1]
+        # The data with date in ascending order for ichimoku calculations
+        df_new = self.features(data).frame()
         try:
             df_ichi = df_new.rename(
                 columns={
@@ -1581,75 +1512,115 @@ class tools:
         self, data, screenDict, saveDict, stockName=None, window=3, percentageFromTop=3
     ):
         try:
-            percentageFromTop /= 100
-            data.reset_index(inplace=True)
-            data.rename(columns={"index": "Date"}, inplace=True)
-            data["tops"] = (
-                data["High"]
-                .iloc[
-                    list(
-                        pktalib.argrelextrema(
-                            np.array(data["High"]), np.greater_equal, order=window
-                        )[0]
-                    )
-                ]
-                .head(4)
-            )
-            data["bots"] = (
-                data["Low"]
-                .iloc[
-                    list(
-                        pktalib.argrelextrema(
-                            np.array(data["Low"]), np.less_equal, order=window
-                        )[0]
-                    )
-                ]
-                .head(4)
-            )
-            data = data.fillna(0)
-            data = data.replace([np.inf, -np.inf], 0)
-            tops = data[data.tops > 0]
-            # bots = data[data.bots > 0]
-            highestTop = round(tops.describe()["High"]["max"], 1)
-            filteredTops = tops[
-                tops.tops > (highestTop - (highestTop * percentageFromTop))
+            # Latest candle is the first row, so the arrays are read backwards
+            high, low, close = [
+                data[column].to_numpy(dtype=np.float64)[::-1]
+                for column in ["High", "Low", "Close"]
             ]
-            # print(tops)
-            # print(filteredTops)
-            # print(tops.sort_values(by=['tops'], ascending=False))
-            # print(tops.describe())
-            # print(f"Till {highestTop-(highestTop*percentageFromTop)}")
-            if filteredTops.equals(tops):  # Tops are in the range
-                lowPoints = []
-                for i in range(len(tops) - 1):
-                    endDate = tops.iloc[i]["Date"]
-                    startDate = tops.iloc[i + 1]["Date"]
-                    lowPoints.append(
-                        data[
-                            (data.Date >= startDate) & (data.Date <= endDate)
-                        ].describe()["Low"]["min"]
-                    )
-                lowPointsOrg = lowPoints
-                lowPoints.sort(reverse=True)
-                lowPointsSorted = lowPoints
-                ltp = data.head(1)["Close"].iloc[0]
-                if (
-                    lowPointsOrg == lowPointsSorted
-                    and ltp < highestTop
-                    and ltp > lowPoints[0]
-                ):
-                    screenDict["Pattern"] = (
-                        colorText.BOLD
-                        + colorText.GREEN
-                        + f"VCP (BO: {highestTop})"
-                        + colorText.END
-                    )
-                    saveDict["Pattern"] = f"VCP (BO: {highestTop})"
-                    return True
+            highestTop = self.vcpBreakouts(
+                high, low, close, window, percentageFromTop, asOf=[len(high) - 1]
+            )[0]
+            if not np.isnan(highestTop):
+                screenDict["Pattern"] = (
+                    colorText.BOLD
+                    + colorText.GREEN
+                    + f"VCP (BO: {highestTop})"
+                    + colorText.END
+                )
+                saveDict["Pattern"] = f"VCP (BO: {highestTop})"
+                return True
         except Exception as e:  # pragma: no cover
             self.default_logger.debug(e, exc_info=True)
         return False
 
+    # Breakout level (the highest of the latest 4 tops) of a VCP as of each of the
+    # asOf candles (all by default), or NaN where there is none. The arrays are
+    # oldest first. A VCP has at least 2 tops within percentageFromTop % of the
+    # highest one and the close as of that day is below the highest top but above
+    # the lowest lows between all the adjacent tops.
+    @staticmethod
+    def vcpBreakouts(high, low, close, window=3, percentageFromTop=3, asOf=None):
+        percentageFromTop /= 100
+        high = np.asarray(high, dtype=np.float64)
+        low = np.where(np.isfinite(low), low, 0).astype(np.float64)
+        close = np.where(np.isfinite(close), close, 0).astype(np.float64)
+        candles = len(high)
+        asOf = np.arange(candles) if asOf is None else np.asarray(asOf, dtype=int)
+        # A top is not lower than any high within window candles on either side
+        # (as of that day), with missing highs never counting as lower.
+        comparable = np.where(np.isnan(high), np.inf, high)
+        padding = np.full(window, -np.inf)
+        padded = np.concatenate([padding, comparable, padding])
+        windows = np.lib.stride_tricks.sliding_window_view(padded, window + 1)
+        highestBefore = windows[:candles].max(axis=1)
+        highestAfter = [
+            windows[window : window + candles, : shift + 1].max(axis=1)
+            for shift in range(window + 1)
+        ]
+        isTop = (high >= highestBefore) & (high >= highestAfter[window])
+        confirmedTops = np.flatnonzero(isTop)
+        # The latest window candles of a day, latest first, may be tops
+        # only as of that day, followed by the latest 4 tops before them.
+        recent = asOf[:, None] - np.arange(window)[None, :]
+        recentIsTop = np.zeros(recent.shape, dtype=bool)
+        for shift in range(window):
+            days = recent[:, shift]
+            valid = days >= 0
+            days = days[valid]
+            recentIsTop[valid, shift] = (high[days] >= highestBefore[days]) & (
+                high[days] >= highestAfter[shift][days]
+            )
+        confirmed = np.searchsorted(confirmedTops, asOf - window, side="right")
+        earlier = confirmed[:, None] - 1 - np.arange(4)[None, :]
+        confirmedTops = np.append(confirmedTops, 0)
+        positions = np.concatenate(
+            [recent, confirmedTops[np.maximum(earlier, -1)]], axis=1
+        )
+        found = np.concatenate([recentIsTop, earlier >= 0], axis=1)
+        found &= np.cumsum(found, axis=1) <= 4
+        positions = np.where(found, positions, 0)
+        found &= high[positions] > 0
+        # Tops found, latest first
+        order = np.argsort(~found, axis=1, kind="stable")[:, :4]
+        positions = np.take_along_axis(positions, order, axis=1)
+        found = np.take_along_axis(found, order, axis=1)
+        tops = np.where(found, high[positions], np.nan)
+        with np.errstate(invalid="ignore"):
+            highestTop = np.round(np.fmax.reduce(tops, axis=1), 1)
+            threshold = highestTop - (highestTop * percentageFromTop)
+            inRange = np.all(~found | (tops > threshold[:, None]), axis=1)
+        lowest = np.full(len(asOf), -np.inf)
+        for pair in range(3):
+            lows = tools.rangeMinimum(
+                low, positions[:, pair + 1], positions[:, pair]
+            )
+            lowest = np.where(found[:, pair + 1], np.maximum(lowest, lows), lowest)
+        ltp = close[asOf]
+        isVCP = (
+            (found.sum(axis=1) > 1)
+            & inRange
+            & (ltp < highestTop)
+            & (ltp > lowest)
+        )
+        return np.where(isVCP, highestTop, np.nan)
+
+    # Minimum of values[start : end + 1] for each of the starts and ends, looked
+    # up in a table of the minima of every span of a power of 2 candles.
+    @staticmethod
+    def rangeMinimum(values, starts, ends):
+        values = np.asarray(values, dtype=np.float64)
+        table = [values]
+        span = 1
+        while span * 2 <= len(values):
+            minima = np.minimum(table[-1][:-span], table[-1][span:])
+            table.append(np.append(minima, np.full(span, np.inf)))
+            span *= 2
+        table = np.stack(table)
+        levels = np.log2(ends - starts + 1).astype(int)
+        return np.minimum(
+            table[levels, starts], table[levels, ends - (1 << levels) + 1]
+        )
+
     # Validate if volume of last day is higher than avg
     def validateVolume(
         self, data, screenDict, saveDict, volumeRatio=2.5, minVolume=100
@@ -0,0 +1,248 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.StockDataStore import StockDataStore, StockDataStoreDict
+
+
+# Holds OHLCV arrays of all stocks in one multiprocessing.shared_memory
+# segment laid out as:
+#   [index: int64 x N][float columns: nFloat x N][int columns: nInt x N]
+# where N is the total number of rows across all stocks. Only the segment name
+# and a read-only symbol index travel to the worker processes, so that a
+# lookup from a worker is neither an IPC round-trip nor a copy.
+# Stocks that are not in the arena (e.g. downloaded by a worker during the
+# scan) are read from/written to the overflow dictionary, which usually is
+# the multiprocessing.Manager().dict() that gets cached on disk later.
+class SharedStockArena:
+    def __init__(self, name, rows, floatColumns, intColumns, index, overflow=None):
+        self.name = name
+        self.rows = rows
+        self.floatColumns = floatColumns
+        self.intColumns = intColumns
+        self.index = index
+        self.overflow = {} if overflow is None else overflow
+        self._shm = None
+        self._owner = False
+        self._views = None
+
+    @staticmethod
+    def create(stockData, overflow=None):
+        floatColumns = []
+        intColumns = []
+        frames = {}
+        index = {}
+        rows = 0
+        for symbol in list(stockData.keys()):
+            frame = (
+                stockData.getFrame(symbol)
+                if isinstance(stockData, (StockDataStore, StockDataStoreDict))
+                else StockDataStore._frameFor(stockData.get(symbol))
+            )
+            if not isinstance(frame.index, pd.DatetimeIndex):
+                frame = frame.copy(deep=False)
+                frame.index = pd.DatetimeIndex(frame.index)
+            dtypes = {}
+            for column in frame.columns:
+                kind = frame[column].dtype.kind
+                if kind not in "iuf":
+                    raise ValueError(
+                        f"Column {column} of {symbol} is not numeric and cannot be shared."
+                    )
+                dtypes[column] = "float64" if kind == "f" else "int64"
+                if dtypes[column] == "float64":
+                    if column in intColumns:
+                        intColumns.remove(column)
+                    if column not in floatColumns:
+                        floatColumns.append(column)
+                elif column not in floatColumns and column not in intColumns:
+                    intColumns.append(column)
+            frames[symbol] = frame
+            index[symbol] = (
+                rows,
+                len(frame),
+                tuple(frame.columns),
+                dtypes,
+                None if frame.index.tz is None else str(frame.index.tz),
+                frame.index.name,
+                getattr(frame.index, "unit", "ns"),
+            )
+            rows += len(frame)
+        if rows == 0:
+            return None
+        size = 8 * rows * (1 + len(floatColumns) + len(intColumns))
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        arena = SharedStockArena(
+            shm.name, rows, floatColumns, intColumns, index, overflow=overflow
+        )
+        arena._shm = shm
+        arena._owner = True
+        indexBlock, floatBlock, intBlock = arena._blocks(writeable=True)
+        floatBlock[:] = np.nan
+        intBlock[:] = 0
+        for symbol, frame in frames.items():
+            start, length = index[symbol][:2]
+            end = start + length
+            # Stored as nanoseconds whatever the unit of the frame's index
+            indexBlock[start:end] = frame.index.values.astype("M8[ns]").view("i8")
+            for column in frame.columns:
+                values = frame[column].to_numpy()
+                if column in floatColumns:
+                    floatBlock[floatColumns.index(column), start:end] = values
+                else:
+                    intBlock[intColumns.index(column), start:end] = values
+        arena._views = None
+        return arena
+
+    def __getstate__(self):
+        return {
+            "name": self.name,
+            "rows": self.rows,
+            "floatColumns": self.floatColumns,
+            "intColumns": self.intColumns,
+            "index": self.index,
+            "overflow": self.overflow,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _attach(self):
+        if self._shm is None:
+            try:
+                # Python 3.13+ lets the non-owning processes opt out of tracking
+                self._shm = shared_memory.SharedMemory(name=self.name, track=False)
+            except TypeError:
+                self._shm = shared_memory.SharedMemory(name=self.name)
+        return self._shm
+
+    def _blocks(self, writeable=False):
+        if self._views is not None and not writeable:
+            return self._views
+        buffer = self._attach().buf
+        nFloat = len(self.floatColumns)
+        nInt = len(self.intColumns)
+        indexBlock = np.ndarray((self.rows,), dtype=np.int64, buffer=buffer)
+        floatBlock = np.ndarray(
+            (nFloat, self.rows), dtype=np.float64, buffer=buffer, offset=8 * self.rows
+        )
+        intBlock = np.ndarray(
+            (nInt, self.rows),
+            dtype=np.int64,
+            buffer=buffer,
+            offset=8 * self.rows * (1 + nFloat),
+        )
+        if not writeable:
+            # Workers share the same pages. Nobody gets to modify them.
+            for block in (indexBlock, floatBlock, intBlock):
+                block.flags.writeable = False
+            self._views = (indexBlock, floatBlock, intBlock)
+        return indexBlock, floatBlock, intBlock
+
+    def getFrame(self, symbol):
+        start, length, columns, dtypes, tz, indexName, unit = self.index[symbol]
+        end = start + length
+        indexBlock, floatBlock, intBlock = self._blocks()
+        dateIndex = pd.DatetimeIndex(indexBlock[start:end].view("M8[ns]"), name=indexName)
+        if unit != "ns":
+            dateIndex = dateIndex.as_unit(unit)
+        if tz is not None:
+            dateIndex = dateIndex.tz_localize("UTC").tz_convert(tz)
+        nFloat = len(self.floatColumns)
+        if columns[:nFloat] == tuple(self.floatColumns) and columns[nFloat:] == tuple(
+            self.intColumns
+        ) and all(dtypes[c] == "float64" for c in self.floatColumns):
+            # Fast path: all float columns become one block that directly
+            # views the shared memory.
+            frame = pd.DataFrame(
+                floatBlock[:, start:end].T,
+                index=dateIndex,
+                columns=self.floatColumns,
+                copy=False,
+            )
+            for i, column in enumerate(self.intColumns):
+                frame.insert(len(frame.columns), column, intBlock[i, start:end])
+            return frame
+        data = {}
+        for column in columns:
+            if column in self.floatColumns:
+                values = floatBlock[self.floatColumns.index(column), start:end]
+            else:
+                values = intBlock[self.intColumns.index(column), start:end]
+            data[column] = values.astype(dtypes[column])
+        return pd.DataFrame(data, index=dateIndex, columns=list(columns))
+
+    # Mirrors the dict-like interface of hostRef.objectDictionary. Stocks in
+    # the arena come back as DataFrames, everything else as stored (split dict).
+    def get(self, symbol, default=None):
+        if symbol in self.index:
+            try:
+                return self.getFrame(symbol)
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+        return self.overflow.get(symbol, default)
+
+    def __getitem__(self, symbol):
+        value = self.get(symbol)
+        if value is None:
+            raise KeyError(symbol)
+        return value
+
+    def __setitem__(self, symbol, value):
+        self.overflow[symbol] = value
+
+    def __contains__(self, symbol):
+        return symbol in self.index or symbol in self.overflow
+
+    def keys(self):
+        return list(self.index.keys()) + [
+            k for k in self.overflow.keys() if k not in self.index
+        ]
+
+    def __len__(self):
+        return len(self.keys())
+
+    def close(self):
+        self._views = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+
+    # Only the creating process should release the segment
+    def release(self):
+        self.close()
+        if self._owner and self._shm is not None:
+            try:
+                self._shm.unlink()
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+            self._owner = False
+        self._shm = None
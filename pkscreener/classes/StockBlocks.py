@@ -0,0 +1,115 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+# OHLCV data of a stock as it's held in the stock data dictionary: the float
+# columns in one (columns x rows) block, every other column as its own array
+# and the DatetimeIndex as is. Turning it back into a DataFrame wraps the
+# float block without copying it or inferring any types.
+# It can still be read like the DataFrame.to_dict("split") dictionary that
+# used to be held there (and that the pickled cache files hold), i.e.
+# value["index"], value["columns"] and value["data"].
+class StockBlocks(Mapping):
+    splitKeys = ("index", "columns", "data")
+
+    def __init__(self, index, columns, floatColumns, floats, others):
+        self.index = index
+        self.columns = columns
+        self.floatColumns = floatColumns
+        self.floats = floats
+        self.others = others
+
+    @staticmethod
+    def fromFrame(frame):
+        floatColumns = [
+            column for column in frame.columns if frame[column].dtype == np.float64
+        ]
+        floats = np.ascontiguousarray(
+            frame[floatColumns].to_numpy(dtype=np.float64).T
+        )
+        others = {
+            column: frame[column].to_numpy(copy=True)
+            for column in frame.columns
+            if column not in floatColumns
+        }
+        return StockBlocks(
+            frame.index, list(frame.columns), floatColumns, floats, others
+        )
+
+    # Takes whatever the stock data dictionary holds for a stock: StockBlocks,
+    # a DataFrame or a split dictionary
+    @staticmethod
+    def fromValue(value):
+        if isinstance(value, StockBlocks):
+            return value
+        return StockBlocks.fromFrame(StockBlocks.frameFor(value))
+
+    @staticmethod
+    def frameFor(value):
+        if isinstance(value, pd.DataFrame):
+            return value
+        if isinstance(value, StockBlocks):
+            return value.toFrame()
+        return pd.DataFrame(
+            value["data"], columns=value["columns"], index=value["index"]
+        )
+
+    # The blocks are shared by all the frames made from them, so they're
+    # read-only. Frames get new columns (e.g. the indicators) as usual.
+    def toFrame(self):
+        self.floats.flags.writeable = False
+        frame = pd.DataFrame(
+            self.floats.T, index=self.index, columns=self.floatColumns, copy=False
+        )
+        for position, column in enumerate(self.columns):
+            if column in self.others:
+                frame.insert(position, column, self.others[column])
+        return frame
+
+    def toSplit(self):
+        return self.toFrame().to_dict("split")
+
+    # The stock data dictionary in the format of the pickled cache files
+    @staticmethod
+    def toSplitDict(stockData):
+        return {
+            stock: value.toSplit() if isinstance(value, StockBlocks) else value
+            for stock, value in stockData.items()
+        }
+
+    def __len__(self):
+        return len(StockBlocks.splitKeys)
+
+    def __iter__(self):
+        return iter(StockBlocks.splitKeys)
+
+    def __getitem__(self, key):
+        if key not in StockBlocks.splitKeys:
+            raise KeyError(key)
+        return self.toSplit()[key]
@@ -0,0 +1,311 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import json
+import os
+import pickle
+import shutil
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.log import default_logger
+
+from pkscreener.classes.StockBlocks import StockBlocks
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+INDEX_FILE = "index.npy"
+STORE_SUFFIX = ".store"
+
+
+# Columnar, memory-mapped cache of OHLCV data for all stocks.
+# Every field (Open/High/Low/Close/Volume...) is kept in one contiguous
+# block (.npy) across all stocks and meta.json holds the symbol->offset index.
+# Blocks are opened with np.load(mmap_mode="r"), so opening a store only
+# reads meta.json and every stock is paged in lazily when it is accessed.
+class StockDataStore:
+    def __init__(self, path):
+        self.path = path
+        self._meta = None
+        self._blocks = {}
+
+    # Only the path (and meta) travel to other processes, which memory-map
+    # the blocks again themselves.
+    def __getstate__(self):
+        return {"path": self.path, "_meta": self._meta}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._blocks = {}
+
+    # Returns the store directory that goes alongside a stock_data_*.pkl file
+    @staticmethod
+    def storePathForCacheFile(cacheFile):
+        return f"{os.path.splitext(cacheFile)[0]}{STORE_SUFFIX}"
+
+    @staticmethod
+    def exists(path):
+        return os.path.isfile(os.path.join(path, META_FILE))
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with open(os.path.join(self.path, META_FILE), "r") as f:
+                self._meta = json.load(f)
+            if self._meta.get("version") != STORE_VERSION:
+                raise ValueError(
+                    f"Unsupported stock data store version:{self._meta.get('version')}"
+                )
+        return self._meta
+
+    def symbols(self):
+        return list(self.meta["symbols"].keys())
+
+    def keys(self):
+        return self.symbols()
+
+    def __len__(self):
+        return len(self.meta["symbols"])
+
+    def __contains__(self, symbol):
+        return symbol in self.meta["symbols"]
+
+    def __iter__(self):
+        return iter(self.symbols())
+
+    def _block(self, name):
+        block = self._blocks.get(name)
+        if block is None:
+            block = np.load(os.path.join(self.path, name), mmap_mode="r")
+            self._blocks[name] = block
+        return block
+
+    def _columnBlock(self, column):
+        return self._block(f"col_{self.meta['columns'].index(column)}.npy")
+
+    # Returns (index as int64 ns, {column: array}) for a stock. The arrays are
+    # read-only views into the memory-mapped blocks. Nothing gets copied.
+    def getArrays(self, symbol):
+        entry = self.meta["symbols"][symbol]
+        start = entry["offset"]
+        end = start + entry["length"]
+        index = self._block(INDEX_FILE)[start:end]
+        columns = {}
+        for column in entry["columns"]:
+            columns[column] = self._columnBlock(column)[start:end]
+        return index, columns
+
+    def getFrame(self, symbol, copy=False):
+        entry = self.meta["symbols"][symbol]
+        index, arrays = self.getArrays(symbol)
+        index = pd.DatetimeIndex(np.asarray(index).view("M8[ns]"), name=entry["indexName"])
+        if entry.get("unit", "ns") != "ns":
+            index = index.as_unit(entry["unit"])
+        if entry["tz"] is not None:
+            index = index.tz_localize("UTC").tz_convert(entry["tz"])
+        columns = {}
+        for column in entry["columns"]:
+            values = np.asarray(arrays[column])
+            dtype = entry["dtypes"][column]
+            if values.dtype != dtype:
+                values = values.astype(dtype)
+            elif copy:
+                values = np.array(values)
+            columns[column] = values
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    # Same as the values held in stockDict
+    def get(self, symbol, default=None):
+        if symbol not in self:
+            return default
+        return StockBlocks.fromFrame(self.getFrame(symbol, copy=True))
+
+    def toStockDict(self, stockDict, symbols=None):
+        for symbol in self.symbols() if symbols is None else symbols:
+            if symbol in self:
+                stockDict[symbol] = self.get(symbol)
+        return stockDict
+
+    @staticmethod
+    def _frameFor(value):
+        return StockBlocks.frameFor(value)
+
+    @staticmethod
+    def write(path, stockDict):
+        columns = []
+        blockDtypes = {}
+        frames = {}
+        entries = {}
+        offset = 0
+        for symbol in list(stockDict.keys()):
+            frame = (
+                stockDict.getFrame(symbol)
+                if isinstance(stockDict, StockDataStoreDict)
+                else StockDataStore._frameFor(stockDict.get(symbol))
+            )
+            if not isinstance(frame.index, pd.DatetimeIndex):
+                # Don't touch the index of the caller's frame
+                frame = frame.copy(deep=False)
+                frame.index = pd.DatetimeIndex(frame.index)
+            dtypes = {}
+            for column in frame.columns:
+                kind = frame[column].dtype.kind
+                if kind in "iu":
+                    dtypes[column] = "int64"
+                elif kind == "f":
+                    dtypes[column] = "float64"
+                else:
+                    raise ValueError(
+                        f"Column {column} of {symbol} is not numeric and cannot be stored."
+                    )
+                if column not in blockDtypes:
+                    columns.append(column)
+                    blockDtypes[column] = dtypes[column]
+                elif blockDtypes[column] != dtypes[column]:
+                    blockDtypes[column] = "float64"
+            frames[symbol] = frame
+            entries[symbol] = {
+                "offset": offset,
+                "length": len(frame),
+                "columns": [str(c) for c in frame.columns],
+                "dtypes": dtypes,
+                "tz": None if frame.index.tz is None else str(frame.index.tz),
+                "indexName": frame.index.name,
+                "unit": getattr(frame.index, "unit", "ns"),
+            }
+            offset += len(frame)
+
+        tmpPath = f"{path}.tmp"
+        if os.path.isdir(tmpPath):
+            shutil.rmtree(tmpPath, ignore_errors=True)
+        os.makedirs(tmpPath)
+        index = np.empty(offset, dtype=np.int64)
+        for symbol, frame in frames.items():
+            start = entries[symbol]["offset"]
+            # asi8 is in the index's own unit (s/ms/us on newer pandas). Blocks
+            # always hold nanoseconds.
+            index[start : start + len(frame)] = frame.index.values.astype("M8[ns]").view("i8")
+        np.save(os.path.join(tmpPath, INDEX_FILE), index)
+        del index
+        for columnIndex, column in enumerate(columns):
+            dtype = blockDtypes[column]
+            block = np.full(offset, 0 if dtype == "int64" else np.nan, dtype=dtype)
+            for symbol, frame in frames.items():
+                if column in frame.columns:
+                    start = entries[symbol]["offset"]
+                    block[start : start + len(frame)] = frame[column].to_numpy()
+            np.save(os.path.join(tmpPath, f"col_{columnIndex}.npy"), block)
+        meta = {
+            "version": STORE_VERSION,
+            "columns": [str(c) for c in columns],
+            "dtypes": blockDtypes,
+            "symbols": entries,
+        }
+        with open(os.path.join(tmpPath, META_FILE), "w") as f:
+            json.dump(meta, f)
+        # Swap the new store in only once it's completely written so that a
+        # reader never sees a half written store.
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmpPath, path)
+        return StockDataStore(path)
+
+    # Imports a pickled stockDict (e.g. the actions-data-download cache files)
+    @staticmethod
+    def importPickle(pickleFile, path=None):
+        if path is None:
+            path = StockDataStore.storePathForCacheFile(pickleFile)
+        with open(pickleFile, "rb") as f:
+            stockDict = pickle.load(f)
+        return StockDataStore.write(path, stockDict)
+
+    # Exports the store back into the pickled stockDict format
+    def exportPickle(self, pickleFile):
+        stockDict = StockBlocks.toSplitDict(self.toStockDict({}))
+        with open(pickleFile, "wb") as f:
+            pickle.dump(stockDict, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return pickleFile
+
+    @staticmethod
+    def deleteStores(directory, pattern="stock_data_", excludeStore=None):
+        for f in os.listdir(directory):
+            if not (f.startswith(pattern) and f.endswith(STORE_SUFFIX)):
+                continue
+            if excludeStore is not None and f == os.path.basename(excludeStore):
+                continue
+            try:
+                shutil.rmtree(os.path.join(directory, f))
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+
+
+# The stockDict that loadStockData hands out when the cache is a store. A
+# stock is only built (as StockBlocks) from the memory-mapped blocks when it
+# is looked up, instead of all of them up front. Everything assigned to it
+# (e.g. fresh downloads) goes into the overlay, which wins over the store.
+class StockDataStoreDict(MutableMapping):
+    def __init__(self, store, overlay=None):
+        self.store = store
+        self.overlay = {} if overlay is None else overlay
+
+    def __getitem__(self, symbol):
+        value = self.overlay.get(symbol)
+        if value is not None:
+            return value
+        if symbol in self.store:
+            return self.store.get(symbol)
+        raise KeyError(symbol)
+
+    def __setitem__(self, symbol, value):
+        self.overlay[symbol] = value
+
+    def __delitem__(self, symbol):
+        del self.overlay[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self.overlay or symbol in self.store
+
+    def __iter__(self):
+        overlaid = list(self.overlay.keys())
+        yield from overlaid
+        overlaid = set(overlaid)
+        for symbol in self.store.symbols():
+            if symbol not in overlaid:
+                yield symbol
+
+    def __len__(self):
+        return len(self.store) + sum(
+            1 for symbol in self.overlay.keys() if symbol not in self.store
+        )
+
+    # A snapshot of the overlay over the same store, so it's still lazy.
+    def copy(self):
+        return StockDataStoreDict(self.store, dict(self.overlay.items()))
+
+    def getFrame(self, symbol):
+        value = self.overlay.get(symbol)
+        if value is not None:
+            return StockBlocks.frameFor(value)
+        return self.store.getFrame(symbol)
@@ -0,0 +1,214 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import asyncio
+import threading
+from urllib.parse import urlparse
+
+import requests
+import yfinance as yf
+from PKDevTools.classes.log import default_logger
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Spaces out the requests made to the same host so that no host sees more
+# than requestsPerSecond of them.
+class HostRateLimiter:
+    def __init__(self, requestsPerSecond=None):
+        self.interval = (
+            0
+            if requestsPerSecond is None or requestsPerSecond <= 0
+            else 1 / requestsPerSecond
+        )
+        self.nextSlot = {}
+
+    async def wait(self, host):
+        if self.interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self.nextSlot.get(host, now))
+        self.nextSlot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# Downloads stock data for many stocks concurrently, so that the screening
+# workers don't have to wait on the network. The downloads themselves are
+# blocking yfinance calls, each made on a daemon thread of its own. An asyncio
+# event loop only schedules them: at most `concurrency` are in flight at any
+# time and they all share one pooled HTTP session that retries throttled and
+# failed (429/5xx) responses with a backoff.
+# Each stock is handed to the callback as soon as its download completes,
+# with None as data if nothing could be downloaded.
+class AsyncStockDownloader:
+    concurrency = 16
+    requestsPerSecond = 20
+    backoffFactor = 0.5
+    # Longest wait between two retries, in seconds
+    backoffMax = 10
+    # Retries of requests that couldn't connect or timed out reading. An
+    # unreachable host is given up on quickly instead of backing off for
+    # minutes.
+    connectionRetries = 1
+
+    def __init__(self, configManager, proxyServer=None, concurrency=None):
+        self.configManager = configManager
+        self.proxyServer = proxyServer
+        if concurrency is not None:
+            self.concurrency = max(1, concurrency)
+        self.stopped = threading.Event()
+        self.session = self.pooledSession()
+
+    def pooledSession(self):
+        retryOptions = dict(
+            total=None,
+            connect=self.connectionRetries,
+            read=self.connectionRetries,
+            status=self.configManager.maxNetworkRetryCount,
+            backoff_factor=self.backoffFactor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        try:
+            retries = Retry(backoff_max=self.backoffMax, **retryOptions)
+        except TypeError:  # pragma: no cover
+            # urllib3 < 2 caps the backoff at 120 seconds
+            retries = Retry(**retryOptions)
+        adapter = HTTPAdapter(
+            pool_connections=self.concurrency,
+            pool_maxsize=self.concurrency,
+            max_retries=retries,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # Downloads one stock the same way yf.download does for a single ticker
+    def fetchStockData(self, stockCode, period, duration):
+        ticker = yf.Ticker(stockCode + ".NS", session=self.session)
+        data = ticker.history(
+            period=period,
+            interval=duration,
+            proxy=self.proxyServer,
+            actions=False,
+            auto_adjust=False,
+            timeout=self.configManager.longTimeout,
+            many=True,
+        )
+        if data is None or len(data) == 0:
+            return None
+        data.index = data.index.tz_localize(None)
+        return data
+
+    # Runs fn on a daemon thread and returns an awaitable for its result.
+    # Unlike the threads of a ThreadPoolExecutor, a download still in flight
+    # doesn't keep the process from exiting.
+    @staticmethod
+    def runOnDaemonThread(fn, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(result, error):
+            if future.cancelled():
+                return
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        def run():
+            try:
+                result, error = fn(*args), None
+            except Exception as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(settle, result, error)
+            except RuntimeError:  # pragma: no cover
+                # The event loop is gone already
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    async def _fetch(self, stockCode, period, duration, semaphore, limiter):
+        async with semaphore:
+            if self.stopped.is_set():
+                return stockCode, None
+            await limiter.wait(urlparse(yf.base._BASE_URL_).netloc)
+            try:
+                data = await AsyncStockDownloader.runOnDaemonThread(
+                    self.fetchStockData, stockCode, period, duration
+                )
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+                data = None
+        return stockCode, data
+
+    async def _download(self, stockCodes, period, duration, callback):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiter = HostRateLimiter(self.requestsPerSecond)
+        downloads = [
+            self._fetch(stockCode, period, duration, semaphore, limiter)
+            for stockCode in stockCodes
+        ]
+        for download in asyncio.as_completed(downloads):
+            stockCode, data = await download
+            try:
+                callback(stockCode, data)
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+
+    # Downloads that haven't started yet are given up on (delivered as None)
+    def stop(self):
+        self.stopped.set()
+
+    def download(self, stockCodes, period, duration, callback):
+        delivered = set()
+
+        def deliver(stockCode, data):
+            delivered.add(stockCode)
+            callback(stockCode, data)
+
+        try:
+            asyncio.run(self._download(stockCodes, period, duration, deliver))
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+        finally:
+            # Nobody must be left waiting for a stock that never comes
+            for stockCode in stockCodes:
+                if stockCode not in delivered:
+                    callback(stockCode, None)
+
+    # Runs the downloads in the background and returns the thread doing them
+    def start(self, stockCodes, period, duration, callback):
+        thread = threading.Thread(
+            target=self.download,
+            args=(stockCodes, period, duration, callback),
+            daemon=True,
+        )
+        thread.start()
+        return thread
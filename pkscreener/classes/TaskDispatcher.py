@@ -0,0 +1,290 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import math
+import multiprocessing
+import queue
+import time
+
+# Position of the stock in the task tuples that StockConsumer.screenStocks
+# and StockConsumer.walkForwardBacktest take.
+STOCK_INDEX = 10
+
+
+# A chunk of tasks as it goes into the task queue. The id travels back with
+# the result, so that a chunk that's handed out again after its worker died
+# is only counted once.
+class TaskChunk(list):
+    def __init__(self, tasks, chunkId=None):
+        super().__init__(tasks)
+        self.chunkId = chunkId
+
+
+# What a worker sends back for a chunk of tasks: the (non-None) results, the
+# number of tasks processed and the wall clock and CPU time that took.
+class TaskChunkResult:
+    def __init__(self, results, count, elapsed, cpuTime, chunkId=None):
+        self.results = results
+        self.count = count
+        self.elapsed = elapsed
+        self.cpuTime = cpuTime
+        self.chunkId = chunkId
+
+
+# The processorMethod handed over to each PKMultiProcessorClient. It carries
+# the scan parameters that are the same for all tasks, so that they reach a
+# worker only once and the task queue only has to carry the stock names.
+class ChunkProcessor:
+    def __init__(self, processorMethod, template=None):
+        self.processorMethod = processorMethod
+        self.template = template
+
+    def __call__(self, chunk, hostRef=None):
+        results = []
+        start, startCpu = time.perf_counter(), time.process_time()
+        for task in chunk:
+            if self.template is not None:
+                args = list(self.template)
+                args[STOCK_INDEX] = task
+                task = args
+            result = self.processorMethod(*task, hostRef)
+            # Walk-forward backtests return all the results of a stock at once
+            if isinstance(result, list):
+                results.extend(result)
+            elif result is not None:
+                results.append(result)
+        return TaskChunkResult(
+            results,
+            len(chunk),
+            time.perf_counter() - start,
+            time.process_time() - startCpu,
+            getattr(chunk, "chunkId", None),
+        )
+
+
+# Hands tasks out to the workers in chunks. The chunk size follows the
+# observed latency per task so that every message carries about
+# targetSeconds of work, while the tail of the run is still spread evenly
+# across the workers. What's observed in a run is remembered (separately for
+# runs that fetch data and runs that use the cached data) to size the worker
+# pool and the first chunks of the next run.
+class TaskDispatcher:
+    targetSeconds = 0.5
+    maxChunkSize = 64
+    # Chunks kept in the queue for each worker
+    chunksPerWorker = 2
+    # Observed seconds per task and share of those spent on the CPU
+    observedLatency = {"fetch": None, "cached": None}
+    observedCpuShare = {"fetch": 0.5, "cached": 1.0}
+    # How long to wait for results before checking that the workers are alive
+    livenessSeconds = 5
+
+    def __init__(self, items, tasks_queue, workers, ioBound=False):
+        self.kind = "fetch" if ioBound else "cached"
+        self.tasks_queue = tasks_queue
+        self.workers = max(1, workers)
+        self.template = TaskDispatcher.templateFor(items)
+        self.pending = (
+            [item[STOCK_INDEX] for item in items]
+            if self.template is not None
+            else list(items)
+        )
+        self.outstanding = 0
+        # Chunks handed out that haven't come back yet, by their id
+        self.inflight = {}
+        # Chunks of workers that died, to be handed out again
+        self.requeued = []
+        self.chunkCount = 0
+        self.deadWorkers = 0
+        self.processed = 0
+        self.elapsed = 0.0
+        self.cpuTime = 0.0
+        self.exitSent = False
+        # Set when the tasks go to the pooled workers of a WorkerPool, which
+        # stay around after the scan instead of exiting.
+        self.generation = None
+        # Tasks held back until the data of their stock has been downloaded
+        self.awaiting = {}
+        self.arrivals = None
+        # Stocks given up on because no worker was left to screen them
+        self.lostStocks = []
+
+    # The item shared by all tasks (with the stock left in), if they only
+    # differ in the stock.
+    @staticmethod
+    def templateFor(items):
+        if len(items) == 0:
+            return None
+        template = list(items[0])
+        if len(template) <= STOCK_INDEX:
+            return None
+        for item in items:
+            if (
+                len(item) != len(template)
+                or list(item[:STOCK_INDEX]) != template[:STOCK_INDEX]
+                or list(item[STOCK_INDEX + 1 :]) != template[STOCK_INDEX + 1 :]
+            ):
+                return None
+        return tuple(template)
+
+    @staticmethod
+    def workerCount(tasks, ioBound=False, cacheEnabled=False):
+        cpus = multiprocessing.cpu_count()
+        if ioBound:
+            # Workers mostly wait for the network, so use more of them than
+            # there are CPUs, in proportion to the time they spend waiting.
+            cpuShare = max(TaskDispatcher.observedCpuShare["fetch"], 0.25)
+            workers = math.ceil(cpus / cpuShare)
+        else:
+            workers = cpus
+            if cacheEnabled and cpus > 2:
+                workers -= 1
+        workers = min(tasks, workers)
+        if workers == 1:
+            workers = 2  # This is required for single core machine
+        return workers
+
+    def stockOf(self, task):
+        return task if self.template is not None else task[STOCK_INDEX]
+
+    def processorFor(self, processorMethod):
+        return ChunkProcessor(processorMethod, self.template)
+
+    def chunkSize(self):
+        latency = (
+            self.elapsed / self.processed
+            if self.processed > 0
+            else TaskDispatcher.observedLatency[self.kind]
+        )
+        size = 1 if latency is None or latency <= 0 else self.targetSeconds / latency
+        # Leave enough chunks for all the workers towards the end of the run
+        fairShare = len(self.pending) / (self.workers * self.chunksPerWorker)
+        return int(max(1, min(size, fairShare, self.maxChunkSize)))
+
+    # Holds back the tasks of the given stocks until they show up in arrivals
+    # (a queue.Queue that the downloader puts the stocks in as they complete).
+    def awaitStocks(self, stockCodes, arrivals):
+        stockCodes = set(stockCodes)
+        pending = []
+        for task in self.pending:
+            stock = self.stockOf(task)
+            if stock in stockCodes:
+                self.awaiting.setdefault(stock, []).append(task)
+            else:
+                pending.append(task)
+        self.pending = pending
+        self.arrivals = arrivals
+
+    def collectArrivals(self):
+        while self.arrivals is not None and len(self.awaiting) > 0:
+            try:
+                stock = self.arrivals.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.extend(self.awaiting.pop(stock, []))
+
+    # How long to wait for results before checking for more arrivals or
+    # lost chunks
+    def pollInterval(self):
+        return 0.1 if len(self.awaiting) > 0 else self.livenessSeconds
+
+    # A chunk that a worker took off the queue is gone if the worker dies
+    # with it. Since there's no telling which of the chunks a dead worker
+    # held, all that are in flight get handed out again to the workers that
+    # are still alive and whichever copy of a chunk comes back first counts.
+    # Returns the number of tasks given up on because no worker is left.
+    def recoverLostChunks(self, consumers):
+        dead = sum(1 for consumer in consumers if not consumer.is_alive())
+        if dead <= self.deadWorkers:
+            return 0
+        self.deadWorkers = dead
+        lost = list(self.inflight.values())
+        self.inflight = {}
+        self.outstanding -= len(lost)
+        if dead < len(consumers):
+            self.requeued.extend(lost)
+            return 0
+        lost.extend(self.requeued)
+        lost.append(self.pending)
+        lost.extend(self.awaiting.values())
+        self.requeued, self.pending, self.awaiting = [], [], {}
+        self.lostStocks.extend(self.stockOf(task) for chunk in lost for task in chunk)
+        return sum(len(chunk) for chunk in lost)
+
+    def dispatch(self):
+        self.collectArrivals()
+        while (
+            len(self.pending) + len(self.requeued) > 0
+            and self.outstanding < self.workers * self.chunksPerWorker
+        ):
+            if len(self.requeued) > 0:
+                chunk = self.requeued.pop(0)
+            else:
+                size = self.chunkSize()
+                self.chunkCount += 1
+                chunk = TaskChunk(self.pending[:size], self.chunkCount)
+                self.pending = self.pending[size:]
+            self.inflight[chunk.chunkId] = chunk
+            self.tasks_queue.put(
+                (chunk,) if self.generation is None else (self.generation, chunk)
+            )
+            self.outstanding += 1
+        if self.finished() and not self.exitSent and self.generation is None:
+            # Exit signal for each process indicated by None. Only sent once
+            # every chunk is back: the chunks of a worker that dies before
+            # that are handed out again and mustn't end up behind the exit
+            # signals.
+            for _ in range(self.workers):
+                self.tasks_queue.put(None)
+            self.exitSent = True
+
+    def finished(self):
+        return (
+            len(self.pending) + len(self.requeued) == 0
+            and len(self.awaiting) == 0
+            and self.outstanding <= 0
+        )
+
+    # Takes in what a worker sent back and returns the results and the number
+    # of tasks it covered, handing out more tasks if there are any left.
+    def received(self, answer):
+        if not isinstance(answer, TaskChunkResult):
+            return ([] if answer is None else [answer]), 1
+        if answer.chunkId is not None:
+            if answer.chunkId not in self.inflight:
+                # The other copy of a chunk that was handed out again
+                return [], 0
+            del self.inflight[answer.chunkId]
+        self.outstanding -= 1
+        self.processed += answer.count
+        self.elapsed += answer.elapsed
+        self.cpuTime += answer.cpuTime
+        if self.processed > 0:
+            TaskDispatcher.observedLatency[self.kind] = self.elapsed / self.processed
+        if self.elapsed > 0:
+            TaskDispatcher.observedCpuShare[self.kind] = min(
+                1.0, self.cpuTime / self.elapsed
+            )
+        self.dispatch()
+        return answer.results, answer.count
@@ -45,32 +45,23 @@ from PKDevTools.classes.log import default_logger
 
 from pkscreener import Imports
 
-if Imports["keras"]:
-    import keras
-
 import warnings
 from time import sleep
 
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
 import pandas as pd
-from alive_progress import alive_bar
-from PIL import Image, ImageDraw, ImageFont
 from PKDevTools.classes import Archiver
 from PKDevTools.classes.ColorText import colorText
-from requests_cache import CachedSession
-from tabulate import tabulate
 
 import pkscreener.classes.ConfigManager as ConfigManager
 import pkscreener.classes.Fetcher as Fetcher
 from pkscreener.classes import VERSION, Changelog
 from pkscreener.classes.MenuOptions import menus
+from pkscreener.classes.DeltaRefresh import DeltaRefresh
+from pkscreener.classes.StockBlocks import StockBlocks
+from pkscreener.classes.StockDataStore import StockDataStore, StockDataStoreDict
 
-session = CachedSession(
-    cache_name=f"{Archiver.get_user_outputs_dir().split(os.sep)[-1]}{os.sep}PKDevTools_cache",
-    db_path=os.path.join(Archiver.get_user_outputs_dir(), "PKDevTools_cache.sqlite"),
-    cache_control=True,
-)
 fetcher = Fetcher.screenerStockDataFetcher(ConfigManager.tools())
 artText = """
 PPPPPPPPPPPPPPPPP   KKKKKKKKK    KKKKKKK   SSSSSSSSSSSSSSS                                                                                                                                         TM
@@ -278,6 +269,8 @@ class tools:
         addendum=None,
         addendumLabel=None,
     ):
+        from PIL import Image, ImageDraw, ImageFont
+
         warnings.filterwarnings("ignore", category=DeprecationWarning)
         # First 4 lines are headers. Last 1 line is bottom grid line
         fontURL = "https://raw.githubusercontent.com/pkjmesra/pkscreener/main/pkscreener/courbd.ttf"
@@ -642,12 +635,23 @@ class tools:
         )
         if exists:
             configManager.deleteFileWithPattern(excludeFile=cache_file)
+            StockDataStore.deleteStores(
+                Archiver.get_user_outputs_dir(),
+                pattern=cache_file.split("stock_data_")[0] + "stock_data_",
+                excludeStore=StockDataStore.storePathForCacheFile(cache_file),
+            )
         cache_file = os.path.join(Archiver.get_user_outputs_dir(), cache_file)
         if not os.path.exists(cache_file) or len(stockDict) > (loadCount + 1):
             try:
+                stockData = stockDict.copy()
                 with open(cache_file, "wb") as f:
-                    pickle.dump(stockDict.copy(), f, protocol=pickle.HIGHEST_PROTOCOL)
-                    print(colorText.BOLD + colorText.GREEN + "=> Done." + colorText.END)
+                    pickle.dump(
+                        StockBlocks.toSplitDict(stockData),
+                        f,
+                        protocol=pickle.HIGHEST_PROTOCOL,
+                    )
+                tools.saveStockDataStore(stockData, cache_file)
+                print(colorText.BOLD + colorText.GREEN + "=> Done." + colorText.END)
             except pickle.PicklingError as e:  # pragma: no cover
                 default_logger().debug(e, exc_info=True)
                 print(
@@ -663,6 +667,139 @@ class tools:
                 colorText.BOLD + colorText.GREEN + "=> Already Cached." + colorText.END
             )
 
+    # Keeps the columnar (memory-mapped) copy of the pickled cache in sync.
+    # The pickle stays around for import/export with actions-data-download.
+    def saveStockDataStore(stockData, cache_file):
+        try:
+            StockDataStore.write(
+                StockDataStore.storePathForCacheFile(cache_file), stockData
+            )
+            return True
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+        return False
+
+    def openStockDataStore(cache_file):
+        storePath = StockDataStore.storePathForCacheFile(cache_file)
+        if not StockDataStore.exists(storePath):
+            return None
+        # A newer pickle (e.g. freshly downloaded from the server) wins
+        if os.path.isfile(cache_file) and os.path.getmtime(
+            cache_file
+        ) > os.path.getmtime(os.path.join(storePath, "meta.json")):
+            return None
+        try:
+            store = StockDataStore(storePath)
+            store.meta
+            return store
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+        return None
+
+    # The trading date of a stock_data_<ddmmyy>.pkl file
+    def stockDataCacheDate(cache_file):
+        try:
+            return datetime.datetime.strptime(
+                cache_file.split("stock_data_")[-1][: -len(".pkl")], "%d%m%y"
+            ).date()
+        except ValueError:
+            return None
+
+    # The most recent stock_data_*.pkl (or its store) before cache_file
+    def previousStockDataCache(cache_file):
+        cacheDate = tools.stockDataCacheDate(cache_file)
+        if cacheDate is None:
+            return None
+        pattern = cache_file.split("stock_data_")[0] + "stock_data_"
+        previous = None
+        previousDate = None
+        outputsDir = Archiver.get_user_outputs_dir()
+        for f in os.listdir(outputsDir):
+            name = f
+            if os.path.isdir(os.path.join(outputsDir, f)):
+                if not StockDataStore.exists(os.path.join(outputsDir, f)):
+                    continue
+                name = os.path.splitext(f)[0] + ".pkl"
+            if not name.startswith(pattern) or not name.endswith(".pkl"):
+                continue
+            date = tools.stockDataCacheDate(name)
+            if date is None or date >= cacheDate:
+                continue
+            if previousDate is None or date > previousDate:
+                previous, previousDate = name, date
+        return previous
+
+    # Brings the most recent older cache up to date by downloading only the
+    # days it misses and saves that as cache_file.
+    def refreshStockData(stockDict, configManager, cache_file, intraday=False):
+        if intraday:
+            return False
+        previous = tools.previousStockDataCache(cache_file)
+        if previous is None:
+            return False
+        previousFile = os.path.join(Archiver.get_user_outputs_dir(), previous)
+        try:
+            store = tools.openStockDataStore(previousFile)
+            if store is None:
+                with open(previousFile, "rb") as f:
+                    store = pickle.load(f)
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            return False
+        print(
+            colorText.BOLD
+            + colorText.GREEN
+            + f"[+] Downloading only the days missing in {previous}, Please Wait..."
+            + colorText.END
+        )
+        try:
+            refreshed, resynced = DeltaRefresh(
+                Fetcher.screenerStockDataFetcher(configManager),
+                configManager,
+                fetcher.proxyServer,
+            ).refresh(
+                store,
+                tools.stockDataCacheDate(cache_file),
+                tools.currentDateTime().date(),
+            )
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            return False
+        default_logger().info(
+            f"Refreshed {len(refreshed)} of {len(store)} stocks from {previous}, "
+            f"re-synced:{resynced}"
+        )
+        # Not worth keeping if most of the downloads failed
+        if len(refreshed) < len(store) / 2:
+            return False
+        stockDict.update(
+            {stock: StockBlocks.fromFrame(frame) for stock, frame in refreshed.items()}
+        )
+        print(
+            colorText.BOLD
+            + colorText.GREEN
+            + f"[+] Caching {len(refreshed)} refreshed stocks for future use, "
+            + "Please Wait... "
+            + colorText.END,
+            end="",
+        )
+        cache_file = os.path.join(Archiver.get_user_outputs_dir(), cache_file)
+        try:
+            stockData = stockDict.copy()
+            with open(cache_file, "wb") as f:
+                pickle.dump(
+                    StockBlocks.toSplitDict(stockData),
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            tools.saveStockDataStore(stockData, cache_file)
+            print(colorText.BOLD + colorText.GREEN + "=> Done." + colorText.END)
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+        return True
+
+    # Returns the stockDict to screen with. That's a StockDataStoreDict over
+    # stockDict when the cache is a store, so the stocks are read lazily.
     def loadStockData(
         stockDict,
         configManager,
@@ -672,7 +809,7 @@ class tools:
         forceLoad=False,
     ):
         if downloadOnly:
-            return
+            return stockDict
         isIntraday = configManager.isIntradayConfig()
         exists, cache_file = tools.afterMarketStockDataExists(
             isIntraday, forceLoad=forceLoad
@@ -681,7 +818,23 @@ class tools:
             f"Stock data cache file:{cache_file} exists ->{str(exists)}"
         )
         stockDataLoaded = False
-        if exists:
+        store = (
+            tools.openStockDataStore(
+                os.path.join(Archiver.get_user_outputs_dir(), cache_file)
+            )
+            if exists
+            else None
+        )
+        if store is not None:
+            print(
+                colorText.BOLD
+                + colorText.GREEN
+                + f"[+] Automatically Using Cached Stock Data {'due to After-Market hours' if not tools.isTradingTime() else ''}!"
+                + colorText.END
+            )
+            stockDict = StockDataStoreDict(store, stockDict)
+            stockDataLoaded = True
+        elif exists:
             with open(
                 os.path.join(Archiver.get_user_outputs_dir(), cache_file), "rb"
             ) as f:
@@ -695,8 +848,12 @@ class tools:
                             + colorText.END
                         )
                     for stock in stockData:
-                        stockDict[stock] = stockData.get(stock)
+                        stockDict[stock] = StockBlocks.fromValue(stockData.get(stock))
                     stockDataLoaded = True
+                    tools.saveStockDataStore(
+                        stockData,
+                        os.path.join(Archiver.get_user_outputs_dir(), cache_file),
+                    )
                 except pickle.UnpicklingError as e:
                     default_logger().debug(e, exc_info=True)
                     f.close()
@@ -719,6 +876,10 @@ class tools:
                     )
                     if tools.promptFileExists(defaultAnswer=defaultAnswer) == "Y":
                         configManager.deleteFileWithPattern()
+        if not stockDataLoaded and not retrial:
+            stockDataLoaded = tools.refreshStockData(
+                stockDict, configManager, cache_file, intraday=isIntraday
+            )
         if (
             not stockDataLoaded
             and ("1d" if isIntraday else ConfigManager.default_period)
@@ -758,6 +919,8 @@ class tools:
                             "wb",
                         )  # .split(os.sep)[-1]
                         dl = 0
+                        from alive_progress import alive_bar
+
                         with alive_bar(
                             filesize, bar=bar, spinner=spinner, manual=True
                         ) as progressbar:
@@ -780,7 +943,7 @@ class tools:
                 print("")
                 if not retrial and not stockDataLoaded:
                     # Don't try for more than once.
-                    tools.loadStockData(
+                    return tools.loadStockData(
                         stockDict,
                         configManager,
                         downloadOnly,
@@ -795,6 +958,7 @@ class tools:
                 + "[+] Cache unavailable on pkscreener server, Continuing.."
                 + colorText.END
             )
+        return stockDict
 
     # Save screened results to excel
     def promptSaveResults(df, defaultAnswer=None):
@@ -1152,6 +1316,8 @@ class tools:
                             "wb",
                         )
                         dl = 0
+                        from alive_progress import alive_bar
+
                         with alive_bar(
                             filesize, bar=bar, spinner=spinner, manual=True
                         ) as progressbar:
@@ -1169,7 +1335,16 @@ class tools:
         try:
             if os.path.isfile(files[0]) and os.path.isfile(files[1]):
                 pkl = joblib.load(files[1])
-                model = keras.models.load_model(files[0]) if Imports["keras"] else None
+                if Imports["keras"]:
+                    # Loads TensorFlow, which takes seconds. Only the Nifty
+                    # prediction needs it.
+                    import keras
+
+                    model = keras.models.load_model(files[0])
+                elif Imports["h5py"]:
+                    from pkscreener.classes.NiftyModel import DenseNetwork
+
+                    model = DenseNetwork.fromH5(files[0])
         except Exception as e:  # pragma: no cover
             default_logger().debug(e, exc_info=True)
             os.remove(files[0])
@@ -0,0 +1,150 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import multiprocessing
+
+from PKDevTools.classes.log import default_logger
+
+
+# A scan as the pooled workers see it: what processes the tasks, where the
+# stock data comes from and the user config it's run with.
+class ScanConfiguration:
+    def __init__(self, generation, processor, objectDictionary, configManager):
+        self.generation = generation
+        self.processor = processor
+        self.objectDictionary = objectDictionary
+        self.configManager = configManager
+
+
+# The processorMethod of a pooled PKMultiProcessorClient. Tasks are tagged with
+# the generation of the scan they belong to. The first task of a new scan
+# makes the worker pick up that scan's configuration from its own control
+# queue, everything else the worker holds (imports, the screener and its
+# caches) stays as it is.
+class PooledProcessor:
+    def __init__(self, controlQueue):
+        self.controlQueue = controlQueue
+        self.generation = 0
+        self.processor = None
+
+    def __call__(self, generation, chunk, hostRef=None):
+        while self.generation < generation:
+            self.apply(self.controlQueue.get(), hostRef)
+        return self.processor(chunk, hostRef)
+
+    def apply(self, configuration, hostRef):
+        self.generation = configuration.generation
+        self.processor = configuration.processor
+        if hostRef is None:
+            return
+        previous = hostRef.objectDictionary
+        if previous is not configuration.objectDictionary and hasattr(
+            previous, "close"
+        ):
+            # Detach from the shared memory of the previous scan
+            try:
+                previous.close()
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+        hostRef.objectDictionary = configuration.objectDictionary
+        configManager = configuration.configManager
+        if configManager is None:
+            return
+        hostRef.configManager = configManager
+        for helper in [hostRef.fetcher, hostRef.screener]:
+            if helper is not None and hasattr(helper, "configManager"):
+                helper.configManager = configManager
+        if hostRef.screener is not None:
+            # The saved indicator state depends on the candle duration
+            hostRef.screener.indicatorStateStore = None
+
+
+# Worker processes that are kept around between the scans of a session (the
+# interactive menu or the --croninterval loop), so that each scan doesn't have
+# to spawn processes and import pandas, TA-Lib etc. all over again. The pool
+# owns the queues and the shared counters the workers were started with.
+class WorkerPool:
+    def __init__(
+        self,
+        size,
+        processingCounter=None,
+        processingResultsCounter=None,
+        keyboardInterruptEvent=None,
+    ):
+        self.size = size
+        self.tasks_queue = multiprocessing.JoinableQueue()
+        self.results_queue = multiprocessing.Queue()
+        self.controlQueues = [multiprocessing.Queue() for _ in range(size)]
+        self.processingCounter = processingCounter
+        self.processingResultsCounter = processingResultsCounter
+        self.keyboardInterruptEvent = keyboardInterruptEvent
+        self.consumers = []
+        self.generation = 0
+
+    # One processorMethod per worker, each with its own control queue
+    def processors(self):
+        return [PooledProcessor(controlQueue) for controlQueue in self.controlQueues]
+
+    def isAlive(self):
+        try:
+            if self.keyboardInterruptEvent is not None and (
+                self.keyboardInterruptEvent.is_set()
+            ):
+                return False
+            return len(self.consumers) == self.size and all(
+                worker.is_alive() for worker in self.consumers
+            )
+        except Exception as e:  # pragma: no cover
+            default_logger().debug(e, exc_info=True)
+            return False
+
+    def canRun(self, workers):
+        return self.isAlive() and self.size >= workers
+
+    # Hands the next scan to every worker and returns the generation its tasks
+    # need to be tagged with.
+    def configure(self, processor, objectDictionary, configManager=None):
+        self.generation += 1
+        configuration = ScanConfiguration(
+            self.generation, processor, objectDictionary, configManager
+        )
+        for controlQueue in self.controlQueues:
+            controlQueue.put(configuration)
+        return self.generation
+
+    def resetCounters(self):
+        if self.processingCounter is not None:
+            self.processingCounter.value = 1
+        if self.processingResultsCounter is not None:
+            self.processingResultsCounter.value = 0
+
+    def shutdown(self):
+        for worker in self.consumers:
+            try:
+                worker.terminate()
+            except Exception as e:  # pragma: no cover
+                default_logger().debug(e, exc_info=True)
+        for controlQueue in self.controlQueues:
+            controlQueue.close()
+        self.consumers = []
@@ -29,6 +29,7 @@ import os
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 import logging
 import multiprocessing
+import queue
 import sys
 import time
 import urllib
@@ -41,25 +42,17 @@ import numpy as np
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
 import pandas as pd
-from alive_progress import alive_bar
 from PKDevTools.classes import Archiver
 from PKDevTools.classes.ColorText import colorText
 from PKDevTools.classes.log import default_logger, tracelog
 from PKDevTools.classes.PKMultiProcessorClient import PKMultiProcessorClient
-from PKDevTools.classes.Telegram import (
-    is_token_telegram_configured,
-    send_document,
-    send_message,
-)
-from PKNSETools.morningstartools.PKMorningstarDataFetcher import morningstarDataFetcher
-from tabulate import tabulate
 
 import pkscreener.classes.ConfigManager as ConfigManager
 import pkscreener.classes.Fetcher as Fetcher
 import pkscreener.classes.Screener as Screener
 import pkscreener.classes.Utility as Utility
 from pkscreener.classes import VERSION, PortfolioXRay
-from pkscreener.classes.Backtest import backtest, backtestSummary
+from pkscreener.classes.Backtest import BacktestAccumulator, backtestSummary
 from pkscreener.classes.CandlePatterns import CandlePatterns
 from pkscreener.classes.MenuOptions import (
     level0MenuDict,
@@ -71,7 +64,12 @@ from pkscreener.classes.MenuOptions import (
     menus,
 )
 from pkscreener.classes.OtaUpdater import OTAUpdater
+from pkscreener.classes.PanelScreener import PanelScreener
 from pkscreener.classes.ParallelProcessing import StockConsumer
+from pkscreener.classes.SharedStockArena import SharedStockArena
+from pkscreener.classes.StockBlocks import StockBlocks
+from pkscreener.classes.TaskDispatcher import TaskDispatcher
+from pkscreener.classes.WorkerPool import WorkerPool
 
 multiprocessing.freeze_support()
 # import dataframe_image as dfi
@@ -87,7 +85,7 @@ configManager = ConfigManager.tools()
 configManager.getConfig(ConfigManager.parser)
 defaultAnswer = None
 fetcher = Fetcher.screenerStockDataFetcher(configManager)
-mstarFetcher = morningstarDataFetcher(configManager)
+mstarFetcher = None
 keyboardInterruptEvent = None
 loadCount = 0
 loadedStockData = False
@@ -106,6 +104,7 @@ selectedChoice = {"0": "", "1": "", "2": "", "3": "", "4": ""}
 stockDict = None
 userPassedArgs = None
 elapsed_time = 0
+workerPool = None
 
 
 def finishScreening(
@@ -555,16 +554,149 @@ def initPostLevel1Execution(tickerOption, executeOption=None, skip=[], retrial=F
     return tickerOption, executeOption
 
 
-def initQueues(minimumCount=0):
-    tasks_queue = multiprocessing.JoinableQueue()
-    results_queue = multiprocessing.Queue()
+# Fills stockDict with the stocks it doesn't have yet before the workers start,
+# downloading them in batches instead of one at a time in the workers.
+def prefetchStockData(listStockCodes, stockDict):
+    missing = [stock for stock in listStockCodes if stock not in stockDict]
+    if len(missing) == 0:
+        return []
+    print(
+        colorText.BOLD
+        + colorText.GREEN
+        + f"[+] Downloading data of {len(missing)} stocks in batches of "
+        + f"{configManager.downloadBatchSize}, Please Wait..."
+        + colorText.END
+    )
+    try:
+        return fetcher.prefetchStockData(missing, stockDict, fetcher.proxyServer)
+    except Exception as e:  # pragma: no cover
+        default_logger().debug(e, exc_info=True)
+        return []
+
 
-    totalConsumers = min(minimumCount, multiprocessing.cpu_count())
-    if totalConsumers == 1:
-        totalConsumers = 2  # This is required for single core machine
-    if configManager.cacheEnabled is True and multiprocessing.cpu_count() > 2:
-        totalConsumers -= 1
-    return tasks_queue, results_queue, totalConsumers
+# Starts downloading the stocks that stockDict doesn't have yet in the
+# background, so that the workers can already screen the stocks that have
+# arrived while the others are still downloading. Returns the stocks being
+# downloaded and the queue they show up in once they're in stockDict.
+def streamStockData(listStockCodes, stockDict):
+    missing = [stock for stock in listStockCodes if stock not in stockDict]
+    if len(missing) == 0:
+        return [], None
+    arrivals = queue.Queue()
+
+    def arrived(stock, data):
+        # Stocks that couldn't be downloaded are left for the workers to fetch
+        if data is not None:
+            stockDict[stock] = StockBlocks.fromFrame(data)
+        arrivals.put(stock)
+
+    try:
+        fetcher.startStockDataStream(missing, arrived, fetcher.proxyServer)
+    except Exception as e:  # pragma: no cover
+        default_logger().debug(e, exc_info=True)
+        return [], None
+    return missing, arrivals
+
+
+# Puts the already loaded/cached stock data into shared memory so that the
+# workers can read it without going through the Manager dict for every stock.
+def initSharedStockArena(stockDict, downloadOnly=False):
+    if downloadOnly or stockDict is None or len(stockDict) == 0:
+        return None
+    try:
+        return SharedStockArena.create(stockDict.copy(), overflow=stockDict)
+    except Exception as e:  # pragma: no cover
+        default_logger().debug(e, exc_info=True)
+    return None
+
+
+# Screens all cached stocks at once as a (time x stocks) panel and keeps only
+# those that may pass the chosen scan. The remaining stocks still go through
+# the regular per-stock screening which produces the results.
+def prefilterStockCodes(
+    listStockCodes,
+    stockData,
+    executeOption,
+    volumeRatio=None,
+    minRSI=0,
+    maxRSI=100,
+    backtestDuration=0,
+):
+    if (
+        listStockCodes is None
+        or stockData is None
+        or len(stockData) == 0
+        or executeOption not in PanelScreener.supportedOptions
+    ):
+        return listStockCodes
+    try:
+        candidates = PanelScreener(configManager).prefilter(
+            listStockCodes,
+            stockData,
+            executeOption,
+            volumeRatio=volumeRatio,
+            minRSI=minRSI,
+            maxRSI=maxRSI,
+            backtestDuration=backtestDuration,
+        )
+    except Exception as e:  # pragma: no cover
+        default_logger().debug(e, exc_info=True)
+        return listStockCodes
+    if len(candidates) < len(listStockCodes):
+        print(
+            colorText.BOLD
+            + colorText.GREEN
+            + f"[+] Pre-screening narrowed down {len(listStockCodes)} stocks to {len(candidates)} candidates."
+            + colorText.END
+        )
+    return candidates
+
+
+def initWorkerPool(totalConsumers):
+    global workerPool
+    if workerPool is not None:
+        if workerPool.canRun(totalConsumers):
+            return workerPool
+        workerPool.shutdown()
+    pool = WorkerPool(
+        totalConsumers, screenCounter, screenResultsCounter, keyboardInterruptEvent
+    )
+    cp = CandlePatterns()
+    f = Fetcher.screenerStockDataFetcher(configManager)
+    scr = Screener.tools(configManager, default_logger())
+    pool.consumers = [
+        PKMultiProcessorClient(
+            processor,
+            pool.tasks_queue,
+            pool.results_queue,
+            screenCounter,
+            screenResultsCounter,
+            None,
+            fetcher.proxyServer,
+            keyboardInterruptEvent,
+            default_logger(),
+            f,
+            configManager,
+            cp,
+            scr,
+        )
+        for processor in pool.processors()
+    ]
+    startWorkers(pool.consumers)
+    workerPool = pool
+    return pool
+
+
+# Keeps the workers for the next scan, unless this one didn't run to the end
+# and there may still be tasks or results of it in the queues.
+def releaseWorkerPool(pool, finished=True, testing=False):
+    global workerPool
+    if finished and not testing and pool.isAlive():
+        return
+    terminateAllWorkers(pool.consumers, pool.tasks_queue, testing)
+    pool.shutdown()
+    if workerPool is pool:
+        workerPool = None
 
 
 def labelDataForPrinting(screenResults, saveResults, configManager, volumeRatio):
@@ -601,9 +733,22 @@ def labelDataForPrinting(screenResults, saveResults, configManager, volumeRatio)
     return screenResults, saveResults
 
 
+# The Morningstar fetcher is only needed for the popular stocks options, so
+# it's created (and PKNSETools' morningstartools imported) on first use.
+def morningstarFetcher():
+    global mstarFetcher
+    if mstarFetcher is None:
+        from PKNSETools.morningstartools.PKMorningstarDataFetcher import (
+            morningstarDataFetcher,
+        )
+
+        mstarFetcher = morningstarDataFetcher(configManager)
+    return mstarFetcher
+
+
 @tracelog
 def main(userArgs=None):
-    global screenResults, selectedChoice, defaultAnswer, menuChoiceHierarchy, screenCounter, screenResultsCounter, stockDict, userPassedArgs, loadedStockData, keyboardInterruptEvent, loadCount, maLength, newlyListedOnly
+    global screenResults, selectedChoice, defaultAnswer, menuChoiceHierarchy, screenCounter, screenResultsCounter, stockDict, userPassedArgs, loadedStockData, keyboardInterruptEvent, loadCount, maLength, newlyListedOnly, elapsed_time
     selectedChoice = {"0": "", "1": "", "2": "", "3": "", "4": ""}
     testing = False if userArgs is None else (userArgs.testbuild and userArgs.prodbuild)
     testBuild = False if userArgs is None else (userArgs.testbuild and not testing)
@@ -613,9 +758,16 @@ def main(userArgs=None):
     defaultAnswer = None if userArgs is None else userArgs.answerdefault
     userPassedArgs = userArgs
     options = []
-    screenCounter = multiprocessing.Value("i", 1)
-    screenResultsCounter = multiprocessing.Value("i", 0)
-    keyboardInterruptEvent = multiprocessing.Manager().Event()
+    if workerPool is not None and workerPool.isAlive():
+        # The warm workers keep counting with what they were started with
+        screenCounter = workerPool.processingCounter
+        screenResultsCounter = workerPool.processingResultsCounter
+        keyboardInterruptEvent = workerPool.keyboardInterruptEvent
+        workerPool.resetCounters()
+    else:
+        screenCounter = multiprocessing.Value("i", 1)
+        screenResultsCounter = multiprocessing.Value("i", 0)
+        keyboardInterruptEvent = multiprocessing.Manager().Event()
 
     if stockDict is None:
         stockDict = multiprocessing.Manager().dict()
@@ -860,9 +1012,11 @@ def main(userArgs=None):
             selectedChoice["3"] = str(popOption)
         updateMenuChoiceHierarchy()
         if popOption == 3:
-            screenResults = mstarFetcher.fetchMorningstarTopDividendsYieldStocks()
+            screenResults = (
+                morningstarFetcher().fetchMorningstarTopDividendsYieldStocks()
+            )
         elif popOption > 0 and popOption <= 2:
-            screenResults = mstarFetcher.fetchMorningstarFundFavouriteStocks(
+            screenResults = morningstarFetcher().fetchMorningstarFundFavouriteStocks(
                 "NoOfFunds" if popOption == 2 else "ChangeInShares"
             )
         printNotifySaveScreenedResults(
@@ -889,7 +1043,9 @@ def main(userArgs=None):
         else:
             selectedChoice["3"] = str(popOption)
         updateMenuChoiceHierarchy()
-        screenResults = mstarFetcher.fetchMorningstarStocksPerformanceForExchange()
+        screenResults = (
+            morningstarFetcher().fetchMorningstarStocksPerformanceForExchange()
+        )
         printNotifySaveScreenedResults(
             screenResults,
             screenResults,
@@ -957,12 +1113,10 @@ def main(userArgs=None):
                 result_df = pd.DataFrame(
                     columns=["Time", "Stock/Index", "Action", "SL", "Target", "R:R"]
                 )
-                last_signal = {}
                 first_scan = True
                 result_df = screener.monitorFiveEma(  # Dummy scan to avoid blank table on 1st scan
                     fetcher=fetcher,
                     result_df=result_df,
-                    last_signal=last_signal,
                 )
                 try:
                     while True:
@@ -972,7 +1126,6 @@ def main(userArgs=None):
                             result_df = screener.monitorFiveEma(
                                 fetcher=fetcher,
                                 result_df=result_df,
-                                last_signal=last_signal,
                             )
                         except Exception as e:  # pragma: no cover
                             default_logger().debug(e, exc_info=True)
@@ -1044,7 +1197,7 @@ def main(userArgs=None):
             and not loadedStockData
             and not testing
         ):
-            Utility.tools.loadStockData(
+            stockDict = Utility.tools.loadStockData(
                 stockDict,
                 configManager,
                 downloadOnly=downloadOnly,
@@ -1053,6 +1206,40 @@ def main(userArgs=None):
             )
             loadedStockData = True
         loadCount = len(stockDict)
+        streamDownloads = False
+        if (
+            menuOption == "X"
+            and (downloadOnly or configManager.cacheEnabled)
+            and not newlyListedOnly
+            and not testing
+        ):
+            if downloadOnly:
+                prefetched = prefetchStockData(listStockCodes, stockDict)
+                # The workers only need to retry what the batches missed
+                with screenResultsCounter.get_lock():
+                    screenResultsCounter.value += len(prefetched)
+                prefetched = set(prefetched)
+                listStockCodes = [
+                    stock for stock in listStockCodes if stock not in prefetched
+                ]
+            else:
+                # Downloaded in the background once the workers are up
+                streamDownloads = True
+        stockArena = initSharedStockArena(stockDict, downloadOnly)
+        if menuOption == "X" and not downloadOnly and not newlyListedOnly:
+            listStockCodes = prefilterStockCodes(
+                listStockCodes,
+                stockDict if stockArena is None else stockArena,
+                executeOption,
+                volumeRatio,
+                minRSI,
+                maxRSI,
+                backtestDuration=(
+                    0
+                    if userPassedArgs is None or userPassedArgs.backtestdaysago is None
+                    else int(userPassedArgs.backtestdaysago)
+                ),
+            )
 
         if not downloadOnly:
             print(
@@ -1092,8 +1279,11 @@ def main(userArgs=None):
         actualHistoricalDuration = samplingDuration - fillerPlaceHolder
         # Lets begin from y days ago, evaluate from that date if the selected strategy had yielded any result
         # and then keep coming to the next day (x-1) until we get to today (actualHistoricalDuration = 0)
-        while actualHistoricalDuration >= 0:
-            moreItems = [
+        if menuOption == "B":
+            # Each stock is backtested for all the days in a single task,
+            # beginning from y days ago and coming to the next day until
+            # the day before today.
+            items = [
                 (
                     executeOption,
                     reversalOption,
@@ -1111,10 +1301,34 @@ def main(userArgs=None):
                     volumeRatio,
                     testBuild,
                     userArgs.log,
+                    list(range(actualHistoricalDuration, 0, -1)),
+                    backtestPeriod,
+                    default_logger().level,
+                    True,
+                )
+                for stock in listStockCodes
+            ]
+        else:
+            while actualHistoricalDuration >= 0:
+                moreItems = [
                     (
-                        actualHistoricalDuration
-                        if (menuOption == "B")
-                        else (
+                        executeOption,
+                        reversalOption,
+                        maLength,
+                        daysForLowestVolume,
+                        minRSI,
+                        maxRSI,
+                        respChartPattern,
+                        insideBarToLookback,
+                        len(listStockCodes),
+                        configManager.cacheEnabled,
+                        stock,
+                        newlyListedOnly,
+                        downloadOnly,
+                        volumeRatio,
+                        testBuild,
+                        userArgs.log,
+                        (
                             (backtestPeriod)
                             if (menuOption == "G")
                             else (
@@ -1122,64 +1336,76 @@ def main(userArgs=None):
                                 if (userPassedArgs.backtestdaysago is None)
                                 else (int(userPassedArgs.backtestdaysago))
                             )
-                        )
-                    ),
-                    (
-                        backtestPeriod
-                        if menuOption == "B"
-                        else configManager.daysToLookback
-                    ),
-                    default_logger().level,
-                    (menuOption in ["B", "G"])
-                    or (userPassedArgs.backtestdaysago is not None),
-                )
-                for stock in listStockCodes
-            ]
-            items.extend(moreItems)
-            fillerPlaceHolder = fillerPlaceHolder + 1
-            actualHistoricalDuration = samplingDuration - fillerPlaceHolder
-
-        tasks_queue, results_queue, totalConsumers = initQueues(len(items))
-        cp = CandlePatterns()
-        cm = configManager
-        f = Fetcher.screenerStockDataFetcher(configManager)
-        scr = Screener.tools(configManager, default_logger())
-        consumers = [
-            PKMultiProcessorClient(
-                StockConsumer().screenStocks,
-                tasks_queue,
-                results_queue,
-                screenCounter,
-                screenResultsCounter,
-                stockDict,
-                fetcher.proxyServer,
-                keyboardInterruptEvent,
-                default_logger(),
-                f,
-                cm,
-                cp,
-                scr,
+                        ),
+                        configManager.daysToLookback,
+                        default_logger().level,
+                        (menuOption == "G")
+                        or (userPassedArgs.backtestdaysago is not None),
+                    )
+                    for stock in listStockCodes
+                ]
+                items.extend(moreItems)
+                fillerPlaceHolder = fillerPlaceHolder + 1
+                actualHistoricalDuration = samplingDuration - fillerPlaceHolder
+
+        if len(items) == 0:
+            # The pre-screening ruled out every stock, so there's nothing
+            # to hand to the workers.
+            screenResults, saveResults = pd.DataFrame([]), pd.DataFrame([])
+            elapsed_time = 0
+        else:
+            # Runs that have to fetch most of the data wait on the network
+            # rather than the CPU
+            ioBound = downloadOnly or (
+                not streamDownloads
+                and sum(1 for stock in listStockCodes if stock not in stockDict)
+                > len(listStockCodes) / 2
+            )
+            totalConsumers = TaskDispatcher.workerCount(
+                len(items),
+                ioBound=ioBound,
+                cacheEnabled=configManager.cacheEnabled is True,
+            )
+            pool = initWorkerPool(totalConsumers)
+            dispatcher = TaskDispatcher(
+                items, pool.tasks_queue, pool.size, ioBound=ioBound
+            )
+            if streamDownloads:
+                # Only started now, so that no download threads run while the
+                # workers get forked
+                streamedStocks, arrivals = streamStockData(listStockCodes, stockDict)
+                if arrivals is not None:
+                    dispatcher.awaitStocks(streamedStocks, arrivals)
+            dispatcher.generation = pool.configure(
+                dispatcher.processorFor(
+                    StockConsumer().walkForwardBacktest
+                    if menuOption == "B"
+                    else StockConsumer().screenStocks
+                ),
+                stockDict if stockArena is None else stockArena,
+                configManager,
+            )
+            screenResults, saveResults, backtest_df = runScanners(
+                menuOption,
+                items,
+                pool.tasks_queue,
+                pool.results_queue,
+                listStockCodes,
+                backtestPeriod,
+                dispatcher,
+                pool.consumers,
+                screenResults,
+                saveResults,
+                backtest_df,
+                testing=testing,
             )
-            for _ in range(totalConsumers)
-        ]
-        startWorkers(consumers)
-        screenResults, saveResults, backtest_df = runScanners(
-            menuOption,
-            items,
-            tasks_queue,
-            results_queue,
-            listStockCodes,
-            backtestPeriod,
-            samplingDuration - 1,
-            consumers,
-            screenResults,
-            saveResults,
-            backtest_df,
-            testing=testing,
-        )
 
-        print(colorText.END)
-        terminateAllWorkers(consumers, tasks_queue, testing)
+            print(colorText.END)
+            if streamDownloads:
+                fetcher.stopStockDataStream()
+            releaseWorkerPool(pool, dispatcher.finished(), testing)
+        if stockArena is not None:
+            stockArena.release()
         if not downloadOnly and menuOption in ["X", "G"]:
             if menuOption == "G":
                 userPassedArgs.backtestdaysago = backtestPeriod
@@ -1211,6 +1437,8 @@ def main(userArgs=None):
 
         if menuOption == "B" and backtest_df is not None and len(backtest_df) > 0:
             Utility.tools.clearScreen()
+            forwardReturns = backtest_df.forwardReturns()
+            backtest_df = backtest_df.toDataFrame()
             # Let's do the portfolio calculation first
             df_grouped = backtest_df.groupby("Date")
             userPassedArgs.backtestdaysago = backtestPeriod
@@ -1233,7 +1461,7 @@ def main(userArgs=None):
                 lambda x: x.replace("-", "/")
             )
             showBacktestResults(df_xray, sortKey="Date", optionalName="Insights")
-            summary_df = backtestSummary(backtest_df)
+            summary_df = backtestSummary(forwardReturns)
             backtest_df.loc[:, "Date"] = backtest_df.loc[:, "Date"].apply(
                 lambda x: x.replace("-", "/")
             )
@@ -1326,15 +1554,6 @@ def updateMenuChoiceHierarchy():
     default_logger().info(menuChoiceHierarchy)
 
 
-def populateQueues(items, tasks_queue, exit=False):
-    for item in items:
-        tasks_queue.put(item)
-    if exit:
-        # Append exit signal for each process indicated by None
-        for _ in range(multiprocessing.cpu_count()):
-            tasks_queue.put(None)
-
-
 def printNotifySaveScreenedResults(
     screenResults, saveResults, selectedChoice, menuChoiceHierarchy, testing, user=None
 ):
@@ -1410,6 +1629,9 @@ def printNotifySaveScreenedResults(
             "RUNNER" in os.environ.keys()
             or "PKDevTools_Default_Log_Level" in os.environ.keys()
         ):
+            # The telegram client brings PIL along, so it's only loaded here
+            from PKDevTools.classes.Telegram import is_token_telegram_configured
+
             eligible = is_token_telegram_configured()
             if eligible:
                 # There's no need to save data locally.
@@ -1654,7 +1876,7 @@ def runScanners(
     results_queue,
     listStockCodes,
     backtestPeriod,
-    iterations,
+    dispatcher,
     consumers,
     screenResults,
     saveResults,
@@ -1664,30 +1886,43 @@ def runScanners(
     global selectedChoice, userPassedArgs, elapsed_time
     choices = userReportName(selectedChoice)
     try:
-        numStocks = len(listStockCodes) * int(iterations)
-        queueCounter = 0
+        numStocks = len(items)
         dumpFreq = 1
         print(colorText.END + colorText.BOLD)
         bar, spinner = Utility.tools.getProgressbarStyle()
         counter = 0
         start_time = time.time()
+        from alive_progress import alive_bar
+
         with alive_bar(numStocks, bar=bar, spinner=spinner) as progressbar:
             lstscreen = []
             lstsave = []
-            while numStocks:
-                if counter == 0 and queueCounter < int(iterations) and numStocks > 0:
-                    populateQueues(
-                        items[
-                            len(listStockCodes)
-                            * queueCounter : len(listStockCodes)
-                            * (queueCounter + 1)
-                        ],
-                        tasks_queue,
-                        queueCounter + 1 == int(iterations),
-                    )
-                counter += 1
-                result = results_queue.get()
-                if result is not None:
+            dispatcher.dispatch()
+            while numStocks > 0:
+                try:
+                    answer = results_queue.get(timeout=dispatcher.pollInterval())
+                except queue.Empty:
+                    # Hand out the tasks of stocks that have been downloaded
+                    # and those that went down with a worker that died
+                    lost = dispatcher.recoverLostChunks(consumers)
+                    if lost > 0:
+                        numStocks -= lost
+                        progressbar(lost)
+                        lostStocks = ", ".join(map(str, dispatcher.lostStocks))
+                        default_logger().debug(
+                            f"No worker left to screen {lostStocks}"
+                        )
+                        print(
+                            colorText.BOLD
+                            + colorText.FAIL
+                            + f"\n[+] All workers stopped. Could not screen: {lostStocks}"
+                            + colorText.END
+                        )
+                    dispatcher.dispatch()
+                    continue
+                results, count = dispatcher.received(answer)
+                counter += count
+                for result in results:
                     lstscreen.append(result[0])
                     lstsave.append(result[1])
                     sampleDays = result[4]
@@ -1702,23 +1937,20 @@ def runScanners(
                             backtest_df,
                         )
 
-                numStocks -= 1
+                numStocks -= count
                 progressbar.text(
                     colorText.BOLD
                     + colorText.GREEN
                     + f"Found {screenResultsCounter.value} Stocks"
                     + colorText.END
                 )
-                progressbar()
+                progressbar(count)
                 # If it's being run under unit testing, let's wrap up if we find at least 1
                 # stock or if we've already tried screening through 5% of the list.
                 if testing and (
                     len(lstscreen) >= 1 or counter >= int(len(listStockCodes) * 0.05)
                 ):
                     break
-                if counter >= len(listStockCodes):
-                    queueCounter += 1
-                    counter = 0
         elapsed_time = time.time() - start_time
         if menuOption in ["X", "G"]:
             # create extension
@@ -1736,6 +1968,7 @@ def runScanners(
             + "\n[+] Terminating Script, Please wait..."
             + colorText.END
         )
+        fetcher.stopStockDataStream()
         for worker in consumers:
             worker.terminate()
         logging.shutdown()
@@ -1749,14 +1982,15 @@ def updateBacktestResults(
     sellSignal = (
         str(selectedChoice["2"]) in ["6", "7"] and str(selectedChoice["3"]) in ["2"]
     ) or selectedChoice["2"] in ["15", "16", "19"]
-    backtest_df = backtest(
+    if backtest_df is None:
+        backtest_df = BacktestAccumulator()
+    backtest_df.add(
         result[3],
         result[2],
         result[1],
         result[0],
         backtestPeriod,
         sampleDays,
-        backtest_df,
         sellSignal,
     )
     elapsed_time = time.time() - start_time
@@ -1800,6 +2034,8 @@ def saveNotifyResultsFile(
     screenResults, saveResults, defaultAnswer, menuChoiceHierarchy, user=None
 ):
     global userPassedArgs
+    from PKDevTools.classes.Telegram import send_document, send_message
+
     if user is None and userPassedArgs.user is not None:
         user = userPassedArgs.user
     caption = f'<b>{menuChoiceHierarchy.split(">")[-1]}</b>'
@@ -27,9 +27,11 @@ from unittest.mock import patch
 
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
+import numpy as np
 import pandas as pd
 import pytest
 
+from pkscreener import Imports
 from pkscreener.classes import Pktalib
 from pkscreener.classes.CandlePatterns import CandlePatterns
 
@@ -50,39 +52,16 @@ def prepData():
     return df
 
 
-def prepPatch(keyCandle):
-    cdls = [
-        "CDLDOJI",
-        "CDLMORNINGSTAR",
-        "CDLMORNINGDOJISTAR",
-        "CDLEVENINGSTAR",
-        "CDLEVENINGDOJISTAR",
-        "CDLLADDERBOTTOM",
-        "CDL3LINESTRIKE",
-        "CDL3BLACKCROWS",
-        "CDL3INSIDE",
-        "CDL3OUTSIDE",
-        "CDL3WHITESOLDIERS",
-        "CDLHARAMI",
-        "CDLHARAMICROSS",
-        "CDLMARUBOZU",
-        "CDLHANGINGMAN",
-        "CDLHAMMER",
-        "CDLINVERTEDHAMMER",
-        "CDLSHOOTINGSTAR",
-        "CDLDRAGONFLYDOJI",
-        "CDLGRAVESTONEDOJI",
-        "CDLENGULFING",
-    ]
-    cdl_obj = None
-    for cdl in cdls:
-        if cdl != keyCandle:
-            patch.object(Pktalib.pktalib, cdl, autospec=getattr(Pktalib.pktalib, cdl))
-        else:
-            cdl_obj = patch.object(
-                Pktalib.pktalib, keyCandle, autospec=getattr(Pktalib.pktalib, keyCandle)
-            )
-    return cdl_obj
+def prepPatch(keyCandle, df):
+    functions = [function for function, _, _, _ in CandlePatterns.patterns]
+
+    # Only keyCandle is found, with the value of the latest close
+    def patternMatrix(*args):
+        values = np.zeros((1, len(functions)), dtype=np.int32)
+        values[0, functions.index(keyCandle)] = df["Close"].iloc[-1]
+        return values
+
+    return patch.object(CandlePatterns, "patternMatrix", side_effect=patternMatrix)
 
 
 def test_findPattern_positive(candle_patterns):
@@ -98,8 +77,7 @@ def test_findPattern_doji(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLDOJI") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLDOJI", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
         assert dict["Pattern"] == "\033[1mDoji\033[0m"
         assert saveDict["Pattern"] == "Doji"
@@ -109,8 +87,7 @@ def test_findPattern_morning_star(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLMORNINGSTAR") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLMORNINGSTAR", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mMorning Star\033[0m"
     assert saveDict["Pattern"] == "Morning Star"
@@ -120,8 +97,7 @@ def test_findPattern_morning_dojistar(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLMORNINGDOJISTAR") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLMORNINGDOJISTAR", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mMorning Doji Star\033[0m"
     assert saveDict["Pattern"] == "Morning Doji Star"
@@ -131,8 +107,7 @@ def test_findPattern_evening_star(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLEVENINGSTAR") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLEVENINGSTAR", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mEvening Star\033[0m"
     assert saveDict["Pattern"] == "Evening Star"
@@ -142,8 +117,7 @@ def test_findPattern_ladder_bottom_bullish(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLLADDERBOTTOM") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLLADDERBOTTOM", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mLadder Bottom\033[0m"
     assert saveDict["Pattern"] == "Bullish Ladder Bottom"
@@ -153,9 +127,8 @@ def test_findPattern_ladder_bottom_bearish(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLLADDERBOTTOM") as cdl_obj:
+    with prepPatch("CDLLADDERBOTTOM", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mLadder Bottom\033[0m"
     assert saveDict["Pattern"] == "Bearish Ladder Bottom"
@@ -165,8 +138,7 @@ def test_findPattern_3_line_strike_bullish(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3LINESTRIKE") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDL3LINESTRIKE", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92m3 Line Strike\033[0m"
     assert saveDict["Pattern"] == "3 Line Strike"
@@ -176,9 +148,8 @@ def test_findPattern_3_line_strike_bearish(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3LINESTRIKE") as cdl_obj:
+    with prepPatch("CDL3LINESTRIKE", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91m3 Line Strike\033[0m"
     assert saveDict["Pattern"] == "3 Line Strike"
@@ -188,8 +159,7 @@ def test_findPattern_3_black_crows(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3BLACKCROWS") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDL3BLACKCROWS", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91m3 Black Crows\033[0m"
     assert saveDict["Pattern"] == "3 Black Crows"
@@ -199,8 +169,7 @@ def test_findPattern_3_inside_up(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3INSIDE") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDL3INSIDE", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92m3 Outside Up\033[0m"
     assert saveDict["Pattern"] == "3 Inside Up"
@@ -210,9 +179,8 @@ def test_findPattern_3_inside_down(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3INSIDE") as cdl_obj:
+    with prepPatch("CDL3INSIDE", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91m3 Outside Down\033[0m"
     assert saveDict["Pattern"] == "3 Inside Down"
@@ -222,8 +190,7 @@ def test_findPattern_3_outside_up(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3OUTSIDE") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDL3OUTSIDE", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92m3 Outside Up\033[0m"
     assert saveDict["Pattern"] == "3 Outside Up"
@@ -233,9 +200,8 @@ def test_findPattern_3_outside_down(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3OUTSIDE") as cdl_obj:
+    with prepPatch("CDL3OUTSIDE", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91m3 Outside Down\033[0m"
     assert saveDict["Pattern"] == "3 Outside Down"
@@ -245,8 +211,7 @@ def test_findPattern_3_white_soldiers(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDL3WHITESOLDIERS") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDL3WHITESOLDIERS", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92m3 White Soldiers\033[0m"
     assert saveDict["Pattern"] == "3 White Soldiers"
@@ -256,8 +221,7 @@ def test_findPattern_bullish_harami(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLHARAMI") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLHARAMI", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mBullish Harami\033[0m"
     assert saveDict["Pattern"] == "Bullish Harami"
@@ -267,9 +231,8 @@ def test_findPattern_bearish_harami(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLHARAMI") as cdl_obj:
+    with prepPatch("CDLHARAMI", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mBearish Harami\033[0m"
     assert saveDict["Pattern"] == "Bearish Harami"
@@ -279,8 +242,7 @@ def test_findPattern_bullish_harami_cross(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLHARAMICROSS") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLHARAMICROSS", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mBullish Harami Cross\033[0m"
     assert saveDict["Pattern"] == "Bullish Harami Cross"
@@ -290,9 +252,8 @@ def test_findPattern_bearish_harami_cross(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLHARAMICROSS") as cdl_obj:
+    with prepPatch("CDLHARAMICROSS", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mBearish Harami Cross\033[0m"
     assert saveDict["Pattern"] == "Bearish Harami Cross"
@@ -302,8 +263,7 @@ def test_findPattern_bullish_marubozu(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLMARUBOZU") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLMARUBOZU", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mBullish Marubozu\033[0m"
     assert saveDict["Pattern"] == "Bullish Marubozu"
@@ -313,9 +273,8 @@ def test_findPattern_bearish_marubozu(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLMARUBOZU") as cdl_obj:
+    with prepPatch("CDLMARUBOZU", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mBearish Marubozu\033[0m"
     assert saveDict["Pattern"] == "Bearish Marubozu"
@@ -325,8 +284,7 @@ def test_findPattern_hanging_man(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLHANGINGMAN") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLHANGINGMAN", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mHanging Man\033[0m"
     assert saveDict["Pattern"] == "Hanging Man"
@@ -336,8 +294,7 @@ def test_findPattern_hammer(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLHAMMER") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLHAMMER", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mHammer\033[0m"
     assert saveDict["Pattern"] == "Hammer"
@@ -347,8 +304,7 @@ def test_findPattern_inverted_hammer(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLINVERTEDHAMMER") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLINVERTEDHAMMER", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mInverted Hammer\033[0m"
     assert saveDict["Pattern"] == "Inverted Hammer"
@@ -358,8 +314,7 @@ def test_findPattern_shooting_star(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLSHOOTINGSTAR") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLSHOOTINGSTAR", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mShooting Star\033[0m"
     assert saveDict["Pattern"] == "Shooting Star"
@@ -369,8 +324,7 @@ def test_findPattern_dragonfly_doji(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLDRAGONFLYDOJI") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLDRAGONFLYDOJI", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mDragonfly Doji\033[0m"
     assert saveDict["Pattern"] == "Dragonfly Doji"
@@ -380,8 +334,7 @@ def test_findPattern_gravestone_doji(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLGRAVESTONEDOJI") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLGRAVESTONEDOJI", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mGravestone Doji\033[0m"
     assert saveDict["Pattern"] == "Gravestone Doji"
@@ -391,8 +344,7 @@ def test_findPattern_bullish_engulfing(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLENGULFING") as cdl_obj:
-        cdl_obj.return_value = df.tail(1).squeeze()
+    with prepPatch("CDLENGULFING", df):
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[92mBullish Engulfing\033[0m"
     assert saveDict["Pattern"] == "Bullish Engulfing"
@@ -402,9 +354,82 @@ def test_findPattern_bearish_engulfing(candle_patterns):
     dict = {}
     saveDict = {}
     df = prepData()
-    with prepPatch("CDLENGULFING") as cdl_obj:
+    with prepPatch("CDLENGULFING", df):
         df["Close"][3] = -1
-        cdl_obj.return_value = df.tail(1).squeeze()
         assert candle_patterns.findPattern(df, dict, saveDict) is True
     assert dict["Pattern"] == "\033[1m\033[91mBearish Engulfing\033[0m"
     assert saveDict["Pattern"] == "Bearish Engulfing"
+
+
+def randomCandles(stocks, candles, seed=0):
+    rng = np.random.default_rng(seed)
+    open = np.round(rng.uniform(9, 11, (stocks, candles)), 1)
+    close = np.round(rng.uniform(9, 11, (stocks, candles)), 1)
+    high = np.maximum(open, close) + 0.5
+    low = np.minimum(open, close) - 0.5
+    return open, high, low, close
+
+
+@pytest.mark.skipif(not Imports["talib"], reason="TA-Lib is not installed")
+def test_patternMatrix_matches_talib():
+    import talib
+
+    for candles in [3, 4, 16]:
+        open, high, low, close = randomCandles(300, candles, candles)
+        open[::5, 0] = np.nan
+        matrix = CandlePatterns.patternMatrix(open, high, low, close)
+        assert matrix[:, -1].any()
+        for row in range(len(open)):
+            for column, (function, _, _, _) in enumerate(CandlePatterns.patterns):
+                expected = getattr(talib, function)(
+                    open[row], high[row], low[row], close[row]
+                )[-1]
+                assert matrix[row, column] == expected
+
+
+def test_findPattern_same_as_latest_row_of_patternMatrix(candle_patterns):
+    open, high, low, close = randomCandles(200, 4, 7)
+    matrix = CandlePatterns.patternMatrix(open, high, low, close)
+    for row in range(len(open)):
+        # findPattern expects the latest candle first
+        df = pd.DataFrame(
+            {
+                "Open": open[row][::-1],
+                "High": high[row][::-1],
+                "Low": low[row][::-1],
+                "Close": close[row][::-1],
+            }
+        )
+        dict = {}
+        saveDict = {}
+        found = CandlePatterns.labelFor(matrix[row])
+        assert candle_patterns.findPattern(df, dict, saveDict) is (found is not None)
+        assert saveDict["Pattern"] == ("" if found is None else found[2])
+
+
+def test_findPattern_bullish_engulfing_from_prices(candle_patterns):
+    df = pd.DataFrame(
+        {
+            "Open": [9, 12, 10, 10],
+            "High": [13, 13, 13, 13],
+            "Low": [8, 8, 8, 8],
+            "Close": [12.5, 10.5, 11, 11],
+        }
+    )
+    dict = {}
+    saveDict = {}
+    assert candle_patterns.findPattern(df, dict, saveDict) is True
+    assert saveDict["Pattern"] == "Bullish Engulfing"
+    assert saveDict["Pattern"] in CandlePatterns.reversalPatternsBullish
+
+
+def test_patternMatrix_without_talib_uses_pktalib():
+    open, high, low, close = randomCandles(2, 4)
+    with patch.dict(Imports, {"talib": False}):
+        with patch.object(
+            Pktalib.pktalib, "CDLHAMMER", return_value=pd.Series([0, 100])
+        ) as hammer:
+            matrix = CandlePatterns.patternMatrix(open, high, low, close)
+    assert hammer.call_count == 2
+    column = [p[0] for p in CandlePatterns.patterns].index("CDLHAMMER")
+    assert (matrix[:, column] == 100).all()
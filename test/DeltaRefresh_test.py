@@ -0,0 +1,167 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import datetime
+from unittest.mock import Mock
+
+import numpy as np
+import pandas as pd
+
+from pkscreener.classes import ConfigManager
+from pkscreener.classes.DeltaRefresh import DeltaRefresh
+
+
+def candles(start, days, closeOffset=0.0):
+    index = pd.bdate_range(start, periods=days, name="Date")
+    close = np.arange(100.0, 100.0 + days) + closeOffset
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": np.arange(1000, 1000 + days, dtype="int64"),
+        },
+        index=index,
+    )
+
+
+# Yahoo finance as of 2023-12-08 for stocks with 30 trading days of history
+def fakeFetcher(fullHistory):
+    fetcher = Mock()
+
+    def fetchStockDataInBatches(stockCodes, period, duration, proxyServer=None):
+        days = int(period[:-1])
+        lastDay = pd.Timestamp("2023-12-08")
+        return {
+            stock: fullHistory[stock][
+                fullHistory[stock].index > lastDay - pd.Timedelta(days=days)
+            ]
+            for stock in stockCodes
+            if stock in fullHistory
+        }
+
+    fetcher.fetchStockDataInBatches.side_effect = fetchStockDataInBatches
+    return fetcher
+
+
+def refresher(fetcher, period="300d"):
+    configManager = ConfigManager.tools()
+    configManager.period = period
+    return DeltaRefresh(fetcher, configManager)
+
+
+def test_refresh_downloads_only_the_missing_days():
+    full = candles("2023-10-30", 30)
+    fetcher = fakeFetcher({"SBIN": full, "ITC": full})
+    stored = {
+        "SBIN": full.iloc[:-3].to_dict("split"),
+        "ITC": full.iloc[:-3],
+    }
+    lastDate = datetime.date(2023, 12, 8)
+    refreshed, resynced = refresher(fetcher).refresh(stored, lastDate)
+    assert resynced == []
+    for stock in ["SBIN", "ITC"]:
+        # The split dicts of the pickled cache don't keep the index name
+        pd.testing.assert_frame_equal(
+            refreshed[stock], full, check_freq=False, check_names=False
+        )
+    fetcher.fetchStockDataInBatches.assert_called_once()
+    stocks, period = fetcher.fetchStockDataInBatches.call_args.args[:2]
+    assert sorted(stocks) == ["ITC", "SBIN"]
+    assert period == "4d"
+
+
+def test_refresh_skips_stocks_that_are_up_to_date():
+    full = candles("2023-10-30", 30)
+    fetcher = fakeFetcher({"SBIN": full})
+    refreshed, resynced = refresher(fetcher).refresh(
+        {"SBIN": full}, datetime.date(2023, 12, 8)
+    )
+    assert refreshed["SBIN"] is full
+    fetcher.fetchStockDataInBatches.assert_not_called()
+
+
+def test_refresh_leaves_the_callers_index_alone():
+    full = candles("2023-10-30", 30)
+    fetcher = fakeFetcher({"SBIN": full})
+    stored = full.copy()
+    stored.index = stored.index.strftime("%Y-%m-%d")
+    refreshed, _ = refresher(fetcher).refresh(
+        {"SBIN": stored}, datetime.date(2023, 12, 8)
+    )
+    assert isinstance(refreshed["SBIN"].index, pd.DatetimeIndex)
+    assert not isinstance(stored.index, pd.DatetimeIndex)
+    assert stored.index[0] == "2023-10-30"
+
+
+def test_refresh_resyncs_adjusted_and_broken_stocks():
+    full = candles("2023-10-30", 30)
+    # The whole history got adjusted (e.g. after a split)
+    split = candles("2023-10-30", 30, closeOffset=-50.0)
+    broken = full.copy()
+    broken.iloc[-1, broken.columns.get_loc("Close")] = np.nan
+    fetcher = Mock()
+    stored = {
+        "SPLIT": full.iloc[:-2],
+        "BROKEN": full.iloc[:-2],
+        "GONE": full.iloc[:-2],
+    }
+    fetches = []
+
+    def fetchStockDataInBatches(stockCodes, period, duration, proxyServer=None):
+        fetches.append((sorted(stockCodes), period))
+        if period == "300d":
+            return {"SPLIT": split, "BROKEN": full}
+        return {"SPLIT": split.iloc[-3:], "BROKEN": broken.iloc[-3:]}
+
+    fetcher.fetchStockDataInBatches.side_effect = fetchStockDataInBatches
+    refreshed, resynced = refresher(fetcher).refresh(
+        stored, datetime.date(2023, 12, 8)
+    )
+    assert sorted(resynced) == ["BROKEN", "GONE", "SPLIT"]
+    assert fetches[-1] == (["BROKEN", "GONE", "SPLIT"], "300d")
+    pd.testing.assert_frame_equal(refreshed["SPLIT"], split)
+    pd.testing.assert_frame_equal(refreshed["BROKEN"], full)
+    assert "GONE" not in refreshed
+
+
+def test_refresh_ignores_candles_after_the_cache_date_and_trims_the_period():
+    full = candles("2023-10-30", 30)
+    fetcher = fakeFetcher({"SBIN": full})
+    refreshed, _ = refresher(fetcher, period="20d").refresh(
+        {"SBIN": full.iloc[:-5]},
+        datetime.date(2023, 12, 6),
+        today=datetime.date(2023, 12, 8),
+    )
+    frame = refreshed["SBIN"]
+    assert frame.index[-1] == pd.Timestamp("2023-12-06")
+    assert frame.index[0] >= pd.Timestamp("2023-11-18")
+    pd.testing.assert_frame_equal(frame, full.loc[frame.index], check_freq=False)
+
+
+def test_periodDays():
+    assert DeltaRefresh.periodDays("280d") == 280
+    assert DeltaRefresh.periodDays("1y") is None
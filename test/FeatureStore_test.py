@@ -0,0 +1,98 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.FeatureStore import FeatureStore
+from pkscreener.classes.Pktalib import pktalib
+from pkscreener.classes.Screener import tools
+
+
+# Stock data as the validators get it, with the latest candle first
+def sampleFrame(rows=260, seed=0):
+    r = np.random.default_rng(seed)
+    close = 100 + np.cumsum(r.normal(0.2, 2, rows))
+    data = pd.DataFrame(
+        {
+            "Open": close + r.normal(0, 1, rows),
+            "High": close + 2,
+            "Low": close - 2,
+            "Close": close,
+            "Volume": r.integers(1e5, 1e6, rows).astype(float),
+        },
+        index=pd.bdate_range("2022-01-03", periods=rows),
+    )
+    return data[::-1]
+
+
+def test_frame_is_oldest_first_and_computed_once():
+    data = sampleFrame()
+    features = FeatureStore(data)
+    frame = features.frame()
+    assert frame.index.is_monotonic_increasing
+    assert frame is features.frame()
+    # Prices without NaN or inf need no separate unclean frame
+    assert features.frame(clean=False) is frame
+
+
+def test_indicators_are_computed_once_per_name_and_params():
+    features = FeatureStore(sampleFrame())
+    with patch.object(pktalib, "EMA", wraps=pktalib.EMA) as ema:
+        first = features.get("EMA", 10)
+        assert features.get("EMA", 10, clean=False) is first
+        features.get("EMA", 20)
+        assert ema.call_count == 2
+    expected = pktalib.EMA(features.frame()["Close"], 10)
+    pd.testing.assert_series_equal(first, expected)
+    volume = features.get("SMA", 20, columns=("Volume",))
+    assert np.isclose(volume.iloc[-1], features.frame()["Volume"].tail(20).mean())
+
+
+def test_data_with_gaps_keeps_clean_and_unclean_indicators_apart():
+    data = sampleFrame().copy()
+    data.iloc[5, data.columns.get_loc("Close")] = np.nan
+    features = FeatureStore(data)
+    assert features.frame()["Close"].iloc[-6] == 0
+    assert np.isnan(features.frame(clean=False)["Close"].iloc[-6])
+    clean = features.get("SMA", 10)
+    unclean = features.get("SMA", 10, clean=False)
+    assert not np.isnan(clean.iloc[-1])
+    assert np.isnan(unclean.iloc[-1])
+
+
+def test_validators_share_the_features_of_the_same_data():
+    screener = tools(ConfigManager.tools(), dl())
+    data = sampleFrame()
+    with patch.object(pktalib, "MACD", wraps=pktalib.MACD) as macd:
+        screener.validateBullishForTomorrow(data)
+        screener.validateMACDHistogramBelow0(data)
+        assert macd.call_count == 1
+        screener.validateMACDHistogramBelow0(data.copy())
+        assert macd.call_count == 2
+    assert screener.features(data) is not screener.features(data.copy())
@@ -37,6 +37,7 @@ from urllib3.exceptions import ReadTimeoutError
 
 from pkscreener.classes import ConfigManager
 from pkscreener.classes.Fetcher import screenerStockDataFetcher
+from pkscreener.classes.StockDownloader import AsyncStockDownloader
 
 
 @pytest.fixture
@@ -352,6 +353,21 @@ def test_fetchFiveEmaData_positive(configManager, tools_instance):
         )
 
 
+def test_fetchIntradayBars(configManager, tools_instance):
+    with patch("yfinance.download") as mock_download:
+        mock_download.return_value = pd.DataFrame({"Close": [100, 200, 300]})
+        bars = tools_instance.fetchIntradayBars("^NSEI", period="1d")
+        mock_download.assert_called_once_with(
+            tickers="^NSEI",
+            period="1d",
+            interval="5m",
+            proxy=None,
+            progress=False,
+            timeout=configManager.longTimeout,
+        )
+        assert bars["Close"].tolist() == [100, 200, 300]
+
+
 def test_fetchWatchlist_positive(tools_instance):
     with patch("pandas.read_excel") as mock_read_excel:
         mock_read_excel.return_value = pd.DataFrame({"Stock Code": ["AAPL", "GOOG"]})
@@ -577,3 +593,116 @@ def test_postURL_retry_enable_cache_uninstall(tools_instance, configManager):
 #                         mock_restart_cache.assert_not_called()
 #                         mock_uninstall_cache.assert_not_called()
 #                         mock_clear_cache.assert_not_called()
+
+
+# Made-up candles of a few days per ticker, the way yf.download returns them
+# for a single ticker. DELISTED.NS has no data.
+def stubCandles(ticker):
+    if ticker == "DELISTED.NS":
+        return None
+    # Tickers trade on different days to make the batch unaligned
+    days = 10 if ticker.startswith("S") else 7
+    base = sum(ord(c) for c in ticker)
+    closes = [float(base + i) for i in range(days)]
+    return pd.DataFrame(
+        {
+            "Open": closes,
+            "High": [c + 1 for c in closes],
+            "Low": [c - 1 for c in closes],
+            "Close": closes,
+            "Adj Close": closes,
+            "Volume": [1000 * (i + 1) for i in range(days)],
+        },
+        index=pd.DatetimeIndex(
+            pd.to_datetime([1700006400 + 86400 * i for i in range(days)], unit="s"),
+            name="Date",
+        ),
+    )
+
+
+# Stands in for Yahoo finance, so that these tests don't go to the network:
+# yf.download for one or many tickers and AsyncStockDownloader.fetchStockData.
+class StubYahoo:
+    requested = []
+
+    @staticmethod
+    def candlesOrEmpty(ticker):
+        StubYahoo.requested.append(ticker)
+        data = stubCandles(ticker)
+        if data is None:
+            return pd.DataFrame(
+                columns=["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+            )
+        return data
+
+    @staticmethod
+    def download(tickers, group_by="column", **kwargs):
+        if isinstance(tickers, str):
+            return StubYahoo.candlesOrEmpty(tickers)
+        # Many tickers come aligned on the dates of all of them
+        data = pd.concat(
+            {ticker: StubYahoo.candlesOrEmpty(ticker) for ticker in tickers}, axis=1
+        )
+        data.index.name = "Date"
+        return data
+
+    @staticmethod
+    def fetchStockData(downloader, stockCode, period, duration):
+        StubYahoo.requested.append(stockCode + ".NS")
+        return stubCandles(stockCode + ".NS")
+
+
+@pytest.fixture
+def stubYahoo():
+    StubYahoo.requested = []
+    with patch("yfinance.download", side_effect=StubYahoo.download), patch.object(
+        AsyncStockDownloader, "fetchStockData", StubYahoo.fetchStockData
+    ):
+        yield StubYahoo
+
+
+def test_fetchStockDataInBatches_matches_single_downloads(tools_instance, stubYahoo):
+    stocks = ["SBIN", "ITC", "DELISTED", "SUNPHARMA", "INFY"]
+    stockData = tools_instance.fetchStockDataInBatches(stocks, "10d", "1d", batchSize=2)
+    assert sorted(stockData.keys()) == ["INFY", "ITC", "SBIN", "SUNPHARMA"]
+    assert sorted(stubYahoo.requested) == sorted(f"{s}.NS" for s in stocks)
+    for stock, data in stockData.items():
+        expected = tools_instance.fetchStockData(
+            stock, "10d", "1d", None, None, None, 0
+        )
+        pd.testing.assert_frame_equal(data, expected, check_freq=False)
+    assert len(stockData["SBIN"]) == 10 and len(stockData["ITC"]) == 7
+
+
+def test_prefetchStockData_fills_only_missing_stocks(tools_instance, stubYahoo):
+    stockDict = {"SBIN": {"data": []}}
+    fetched = tools_instance.prefetchStockData(["SBIN", "ITC", "DELISTED"], stockDict)
+    assert fetched == ["ITC"]
+    assert sorted(stubYahoo.requested) == ["DELISTED.NS", "ITC.NS"]
+    assert stockDict["SBIN"] == {"data": []}
+    assert stockDict["ITC"]["columns"] == [
+        "Open",
+        "High",
+        "Low",
+        "Close",
+        "Adj Close",
+        "Volume",
+    ]
+    assert tools_instance.prefetchStockData(["SBIN", "ITC"], stockDict) == []
+
+
+def test_startStockDataStream_delivers_every_stock(tools_instance, stubYahoo):
+    stocks = ["SBIN", "ITC", "DELISTED", "INFY"]
+    arrived = {}
+    thread = tools_instance.startStockDataStream(
+        stocks, lambda stock, data: arrived.update({stock: data})
+    )
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert sorted(arrived.keys()) == sorted(stocks)
+    assert arrived["DELISTED"] is None
+    for stock in ["SBIN", "ITC", "INFY"]:
+        expected = tools_instance.fetchStockData(
+            stock, "280d", "1d", None, None, None, 0
+        )
+        pd.testing.assert_frame_equal(arrived[stock], expected, check_freq=False)
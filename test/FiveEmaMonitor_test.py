@@ -0,0 +1,173 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.FiveEmaMonitor import FiveEmaMonitor, ReplayBars
+from pkscreener.classes.Screener import tools
+
+talib = pytest.importorskip("talib")
+
+
+# Two trading days of 5 minute candles
+def sampleBars(seed=0, volatility=8):
+    r = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01 09:15", periods=75, freq="5min")
+    index = index.append(pd.date_range("2024-01-02 09:15", periods=75, freq="5min"))
+    index = index.tz_localize("Asia/Kolkata")
+    close = 20000 + np.cumsum(r.normal(0, volatility, len(index)))
+    opens = np.r_[close[0], close[:-1]]
+    return pd.DataFrame(
+        {
+            "High": np.maximum(opens, close) + np.abs(r.normal(0, 3, len(index))),
+            "Low": np.minimum(opens, close) - np.abs(r.normal(0, 3, len(index))),
+            "Close": close,
+        },
+        index=index,
+    )
+
+
+# The trades of the strategy computed over the whole frame at once
+def expectedSignals(bars, action, riskReward=3):
+    d = bars.copy()
+    d["5EMA"] = talib.EMA(d["Close"].values, 5)
+    d = d.dropna().round(2)
+    if action == "sell":
+        alert = d.Low - d["5EMA"] > 0.5
+        stopLoss = d.High.shift(1)
+        trade = alert.shift(1, fill_value=False) & (d.Close < d["5EMA"])
+    else:
+        alert = d["5EMA"] - d.High > 0.5
+        stopLoss = d.Low.shift(1)
+        trade = alert.shift(1, fill_value=False) & (d.Close > d["5EMA"])
+    target = (d.Close - (stopLoss - d.Close) * riskReward).round(2)
+    return [(t, stopLoss[t], target[t]) for t in d.index[trade]]
+
+
+class FrameSource:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def poll(self):
+        frames, self.frames = self.frames, {}
+        return frames
+
+
+def test_streams_follow_talib_and_resampled_candles():
+    bars = sampleBars()
+    monitor = FiveEmaMonitor(FrameSource({}))
+    monitor.feed("nifty", bars)
+    sell = monitor.streams[("nifty", "sell")]
+    buy = monitor.streams[("nifty", "buy")]
+    # The last candle may still be forming, so it isn't committed
+    emas = np.round(talib.EMA(bars["Close"].values, 5), 2)
+    np.testing.assert_allclose([bar[4] for bar in sell.bars], emas[4:-1])
+    candles = bars.resample("15min").agg(
+        {"High": "max", "Low": "min", "Close": "last"}
+    )
+    candles = candles.dropna()
+    committed = candles.iloc[4:-1].round(2)
+    assert [bar[0] for bar in buy.bars] == list(committed.index)
+    np.testing.assert_allclose(
+        [bar[1:4] for bar in buy.bars], committed[["High", "Low", "Close"]].values
+    )
+    emas = np.round(talib.EMA(candles["Close"].values, 5), 2)
+    np.testing.assert_allclose([bar[4] for bar in buy.bars], emas[4:-1])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_signals_match_whole_frame_computation(seed):
+    bars = sampleBars(seed, volatility=12)
+    monitor = FiveEmaMonitor(FrameSource({}))
+    # Candles arrive one at a time, each of them first seen while forming
+    for position in range(len(bars)):
+        candle = bars.iloc[position : position + 1]
+        monitor.feed("nifty", candle.assign(High=candle.Close, Low=candle.Close))
+        monitor.feed("nifty", candle)
+    candles = bars.resample("15min").agg({"High": "max", "Low": "min", "Close": "last"})
+    assert monitor.streams[("nifty", "sell")].signals == expectedSignals(
+        bars.iloc[:-1], "sell"
+    )
+    assert monitor.streams[("nifty", "buy")].signals == expectedSignals(
+        candles.dropna().iloc[:-1], "buy"
+    )
+    assert len(monitor.streams[("nifty", "sell")].signals) > 0
+
+
+def test_scan_replays_a_file_and_reports_only_new_trades(tmp_path):
+    bars = sampleBars(1, volatility=12)
+    frames = []
+    for name in FiveEmaMonitor.instruments.keys():
+        frame = bars.tz_localize(None).assign(Instrument=name)
+        frames.append(frame.rename_axis("Datetime").reset_index())
+    path = tmp_path / "replay.csv"
+    pd.concat(frames).to_csv(path, index=False)
+    source = ReplayBars(path, barsPerPoll=25, historyBars=75)
+    monitor = FiveEmaMonitor(source)
+    result_df = monitor.scan()
+    assert result_df.empty
+    while not source.exhausted():
+        result_df = monitor.scan(result_df)
+    bars = bars.tz_localize(None)
+    candles = bars.resample("15min").agg({"High": "max", "Low": "min", "Close": "last"})
+    # Trades of the candles committed by the first scan were not reported
+    sells = [
+        signal
+        for signal in expectedSignals(bars.iloc[:-1], "sell")
+        if signal[0] >= bars.index[74]
+    ]
+    buys = [
+        signal
+        for signal in expectedSignals(candles.dropna().iloc[:-1], "buy")
+        if signal[0] >= bars.index[74].floor("15min")
+    ]
+    assert len(sells) > 0 and len(buys) > 0
+    assert len(result_df) == 2 * (len(sells) + len(buys))
+    actions = result_df["Action"].str.contains("SELL")
+    assert actions.sum() == 2 * len(sells)
+    assert list(result_df.columns) == FiveEmaMonitor.columns
+    assert result_df["R:R"].unique().tolist() == ["1:3"]
+    times = result_df["Time"].tolist()
+    assert times == sorted(times, reverse=True)
+    assert str(max(sells + buys)[0]) in times[0]
+
+
+def test_monitorFiveEma_downloads_history_once():
+    fetcher = MagicMock()
+    bars = sampleBars()
+    fetcher.fetchIntradayBars.side_effect = [bars, bars, bars.tail(3), bars.tail(3)]
+    screener = tools(ConfigManager.tools(), dl())
+    result_df = screener.monitorFiveEma(fetcher, None)
+    result_df = screener.monitorFiveEma(fetcher, result_df)
+    periods = [
+        call.kwargs["period"] for call in fetcher.fetchIntradayBars.call_args_list
+    ]
+    assert periods == ["5d", "5d", "1d", "1d"]
+    assert screener.fiveEmaMonitor.primed
@@ -0,0 +1,180 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.IndicatorState import IndicatorState, IndicatorStateStore
+from pkscreener.classes.Screener import tools
+
+pytestmark = pytest.mark.skipif(
+    not tools.carriesIndicatorState(), reason="needs TA-Lib or the NumPy backend"
+)
+
+
+def sampleFrame(rows=320, seed=0):
+    r = np.random.default_rng(seed)
+    close = 100 + np.cumsum(r.normal(0.2, 2, rows))
+    openPrice = close + r.normal(0, 1, rows)
+    high = np.maximum(close, openPrice) + np.abs(r.normal(0, 1, rows))
+    low = np.minimum(close, openPrice) - np.abs(r.normal(0, 1, rows))
+    return pd.DataFrame(
+        {
+            "Open": openPrice,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": r.integers(1e5, 1e6, rows),
+        },
+        index=pd.bdate_range("2022-01-03", periods=rows),
+    )
+
+
+@pytest.fixture(params=[False, True], ids=["SMA", "EMA"])
+def screener(request, tmp_path):
+    configManager = ConfigManager.tools()
+    configManager.useEMA = request.param
+    screener = tools(configManager, dl())
+    screener.indicatorStateStore = IndicatorStateStore(str(tmp_path))
+    return screener
+
+
+def assertSameIndicators(actual, expected):
+    np.testing.assert_allclose(
+        actual[IndicatorState.COLUMNS].to_numpy(),
+        expected[IndicatorState.COLUMNS].to_numpy(),
+        rtol=1e-9,
+        atol=1e-9,
+    )
+
+
+def test_preprocessData_computes_only_new_candles(screener):
+    data = sampleFrame()
+    screener.preprocessData(data.head(300).copy(), stock="SBIN")
+    assert screener.indicatorStateStore.get(
+        "SBIN", useEMA=screener.configManager.useEMA
+    ) is not None
+    for rows in [301, 303, 303, 310]:
+        with pytest.MonkeyPatch.context() as m:
+            m.setattr(
+                "pkscreener.classes.Screener.pktalib.RSI",
+                lambda *args, **kwargs: pytest.fail("RSI was recomputed"),
+            )
+            fullData, _ = screener.preprocessData(
+                data.head(rows).copy(), stock="SBIN"
+            )
+        expected, _ = tools(screener.configManager, dl()).preprocessData(
+            data.head(rows).copy()
+        )
+        assertSameIndicators(fullData.dropna(), expected.dropna())
+        assert list(fullData.columns) == list(expected.columns)
+
+
+def test_forming_candle_is_not_committed(screener):
+    data = sampleFrame()
+    screener.preprocessData(data.head(300).copy(), stock="SBIN")
+    forming = data.head(301).copy()
+    forming.iloc[-1, forming.columns.get_loc("Close")] += 5
+    screener.preprocessData(forming, stock="SBIN")
+    fullData, _ = screener.preprocessData(data.head(301).copy(), stock="SBIN")
+    expected, _ = tools(screener.configManager, dl()).preprocessData(
+        data.head(301).copy()
+    )
+    assertSameIndicators(fullData.dropna(), expected.dropna())
+
+
+def test_forming_candle_does_not_rewrite_the_state(screener, monkeypatch):
+    data = sampleFrame()
+    screener.preprocessData(data.head(300).copy(), stock="SBIN")
+    store = screener.indicatorStateStore
+    puts = []
+    monkeypatch.setattr(store, "put", lambda stock, state: puts.append(stock))
+    # The last candle of the first run is still forming
+    forming = data.head(300).copy()
+    for change in [1, 2]:
+        forming.iloc[-1, forming.columns.get_loc("Close")] += change
+        screener.preprocessData(forming.copy(), stock="SBIN")
+    assert puts == []
+    screener.preprocessData(data.head(301).copy(), stock="SBIN")
+    assert puts == ["SBIN"]
+
+
+def test_sliding_window_rebuilds_the_state(screener):
+    data = sampleFrame()
+    screener.preprocessData(data.head(300).copy(), stock="SBIN")
+    for start in [1, 5]:
+        window = data.iloc[start : start + 301].copy()
+        fullData, _ = screener.preprocessData(window.copy(), stock="SBIN")
+        expected, _ = tools(screener.configManager, dl()).preprocessData(window)
+        assertSameIndicators(fullData.dropna(), expected.dropna())
+        state = screener.indicatorStateStore.get(
+            "SBIN", useEMA=screener.configManager.useEMA
+        )
+        assert state.index[0] == data.index[start]
+
+
+def test_extend_rejects_revised_history():
+    data = sampleFrame()
+    state = IndicatorState.fromFrame(
+        tools(ConfigManager.tools(), dl()).preprocessData(data.head(300).copy())[0][
+            ::-1
+        ]
+    )
+    revised = data.head(305).copy()
+    revised.iloc[250, revised.columns.get_loc("Close")] *= 0.5
+    assert state.extend(revised) is None
+    revised = data.head(305).copy()
+    revised.iloc[0, revised.columns.get_loc("Close")] *= 0.5
+    assert state.extend(revised) is None
+    assert state.extend(data.iloc[150:305]) is None
+    assert state.extend(data.head(305)) is not None
+
+
+def test_fromFrame_needs_enough_clean_candles():
+    screener = tools(ConfigManager.tools(), dl())
+    shortData = screener.preprocessData(sampleFrame(150))[0][::-1]
+    assert IndicatorState.fromFrame(shortData) is None
+    data = sampleFrame()
+    data.iloc[10, data.columns.get_loc("Close")] = np.nan
+    assert IndicatorState.fromFrame(screener.preprocessData(data)[0][::-1]) is None
+
+
+def test_store_roundtrip_and_mode_mismatch(tmp_path):
+    store = IndicatorStateStore(str(tmp_path))
+    state = IndicatorState(useEMA=True)
+    store.put("SBIN", state)
+    assert store.get("SBIN", useEMA=True).useEMA
+    assert store.get("SBIN", useEMA=False) is None
+    store.delete("SBIN")
+    store.delete("SBIN")
+    assert store.get("SBIN", useEMA=True) is None
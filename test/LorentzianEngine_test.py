@@ -0,0 +1,100 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import sys
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.LorentzianEngine import LorentzianEngine
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 11), reason="advanced_ta needs Python 3.11"
+)
+
+
+def sampleData(rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.abs(50 + np.cumsum(rng.normal(0, 1, rows))) + 5
+    data = pd.DataFrame(
+        {
+            "Open": close * (1 + rng.normal(0, 0.01, rows)),
+            "High": close * 1.02,
+            "Low": close * 0.98,
+            "Close": close,
+            "Volume": rng.integers(1e4, 1e6, rows).astype(float),
+        },
+        index=pd.bdate_range("2022-01-03", periods=rows),
+    )
+    # Latest candle first, as the scans see it
+    return data[::-1]
+
+
+def test_signal_same_as_LorentzianClassification():
+    from advanced_ta import LorentzianClassification
+
+    for seed in range(3):
+        data = sampleData(seed=seed)
+        frame = data[::-1].rename(columns=str.lower)
+        latest = LorentzianClassification(data=frame).df.iloc[-1]
+        assert LorentzianEngine().signal(data, "A") == (
+            latest["isNewBuySignal"],
+            latest["isNewSellSignal"],
+        )
+
+
+def test_signal_classifies_each_stock_data_once():
+    engine = LorentzianEngine()
+    data = sampleData()
+    with patch.object(
+        LorentzianEngine, "classify", return_value=(True, False)
+    ) as mock_classify:
+        assert engine.signal(data, "A") == (True, False)
+        assert engine.signal(data.copy(), "A") == (True, False)
+        assert mock_classify.call_count == 1
+        # Another stock, a new candle or no stock name to key it by
+        engine.signal(data, "B")
+        engine.signal(data.iloc[1:], "A")
+        engine.signal(data, None)
+        engine.signal(data, None)
+        assert mock_classify.call_count == 5
+    assert (engine.calls, engine.cachedCalls) == (6, 1)
+    assert engine.elapsed > 0
+
+
+def test_signal_keeps_maxEntries():
+    engine = LorentzianEngine()
+    data = sampleData(rows=10)
+    with patch.object(LorentzianEngine, "maxEntries", 2), patch.object(
+        LorentzianEngine, "classify", return_value=(False, False)
+    ) as mock_classify:
+        for stock in ["A", "B", "A", "C", "A", "B"]:
+            engine.signal(data, stock)
+    assert list(engine.signals.keys()) == [
+        LorentzianEngine.keyFor(data, "A"),
+        LorentzianEngine.keyFor(data, "B"),
+    ]
+    assert mock_classify.call_count == 4
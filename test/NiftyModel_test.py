@@ -0,0 +1,136 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.NiftyModel import DenseNetwork, NiftyModelService
+from pkscreener.classes.Screener import tools
+
+modelsDir = os.path.join(os.path.dirname(__file__), os.pardir, "pkscreener", "ml")
+
+
+def sampleNifty(rows=60, seed=0):
+    r = np.random.default_rng(seed)
+    close = 20000 + np.cumsum(r.normal(0, 100, rows))
+    return pd.DataFrame(
+        {
+            "Open": close + r.normal(0, 20, rows),
+            "High": close + 50,
+            "Low": close - 50,
+            "Close": close,
+            "Volume": 1e6,
+        },
+        index=pd.bdate_range("2023-01-02", periods=rows),
+    )
+
+
+class IdentityScaler:
+    def transform(self, rows):
+        return np.asarray(rows, dtype=np.float64)
+
+
+def sampleNetwork():
+    r = np.random.default_rng(1)
+    return DenseNetwork(
+        [
+            (r.normal(size=(4, 3)), r.normal(size=3), "relu"),
+            (r.normal(size=(3, 1)), r.normal(size=1), "sigmoid"),
+        ]
+    )
+
+
+def test_DenseNetwork_forward_pass():
+    network = sampleNetwork()
+    inputs = np.random.default_rng(2).normal(size=(5, 4))
+    (k1, b1, _), (k2, b2, _) = network.layers
+    hidden = np.maximum(inputs @ k1 + b1, 0)
+    expected = 1 / (1 + np.exp(-(hidden @ k2 + b2)))
+    np.testing.assert_allclose(network.predict(inputs), expected, rtol=1e-6)
+    assert network.predict(inputs[0]).shape == (1, 1)
+
+
+def test_DenseNetwork_reads_the_nifty_model():
+    pytest.importorskip("h5py")
+    network = DenseNetwork.fromH5(os.path.join(modelsDir, "nifty_model_v2.h5"))
+    assert [kernel.shape for kernel, _, _ in network.layers][0] == (4, 64)
+    assert [activation for _, _, activation in network.layers][-1] == "sigmoid"
+    predictions = network.predict(np.zeros((3, 4)))
+    assert predictions.shape == (3, 1)
+    assert ((predictions > 0) & (predictions < 1)).all()
+
+
+def test_service_loads_the_model_once():
+    service = NiftyModelService()
+    pkl = {"columns": ["Open", "Close", "High", "Low"], "scaler": IdentityScaler()}
+    with patch(
+        "pkscreener.classes.Utility.tools.getNiftyModel",
+        return_value=(sampleNetwork(), pkl),
+    ) as getNiftyModel:
+        assert service.get() == service.get()
+        assert getNiftyModel.call_count == 1
+        service.loadedAt -= NiftyModelService.maxAge + 1
+        service.get()
+        assert getNiftyModel.call_count == 2
+    assert NiftyModelService.instance() is NiftyModelService.instance()
+
+
+def test_service_predicts_in_one_batch():
+    model = MagicMock(wraps=sampleNetwork())
+    pkl = {"columns": ["Open", "Close", "High", "Low"], "scaler": IdentityScaler()}
+    service = NiftyModelService()
+    service.model, service.pkl, service.loadedAt = model, pkl, float("inf")
+    data = sampleNifty()
+    predictions = service.predict(data)
+    assert predictions.shape == (len(data) - 1,)
+    assert model.predict.call_count == 1
+    latest = service.predictLatest({"recent": data, "earlier": data.iloc[:-5]})
+    assert model.predict.call_count == 2
+    np.testing.assert_allclose(
+        [latest["recent"], latest["earlier"]],
+        [predictions[-1], predictions[-6]],
+        rtol=1e-6,
+    )
+
+
+def test_getNiftyPrediction_reuses_the_loaded_model():
+    screener = tools(ConfigManager.tools(), dl())
+    screener.niftyModel = NiftyModelService()
+    pkl = {"columns": ["Open", "Close", "High", "Low"], "scaler": IdentityScaler()}
+    with patch(
+        "pkscreener.classes.Utility.tools.getNiftyModel",
+        return_value=(sampleNetwork(), pkl),
+    ) as getNiftyModel:
+        first = screener.getNiftyPrediction(sampleNifty())
+        second = screener.getNiftyPrediction(sampleNifty(seed=1))
+        assert getNiftyModel.call_count == 1
+    for prediction, predictionText, strengthText in [first, second]:
+        assert "Market may Open" in predictionText
+        assert "Probability/Strength of Prediction" in strengthText
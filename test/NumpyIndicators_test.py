@@ -0,0 +1,91 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pytest
+
+import pkscreener.classes.NumpyIndicators as NumpyIndicators
+
+talib = pytest.importorskip("talib")
+
+
+def samplePrices(rows=120, seed=1):
+    r = np.random.default_rng(seed)
+    close = 100 + np.cumsum(r.normal(0, 2, rows))
+    high = close + np.abs(r.normal(0, 1, rows))
+    low = close - np.abs(r.normal(0, 1, rows))
+    return high, low, close
+
+
+def assertSame(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("timeperiod", [5, 20, 50])
+def test_SMA_EMA_RSI_match_talib(timeperiod):
+    _, _, close = samplePrices()
+    close[:3] = np.nan
+    assertSame(NumpyIndicators.SMA(close, timeperiod), talib.SMA(close, timeperiod))
+    assertSame(NumpyIndicators.EMA(close, timeperiod), talib.EMA(close, timeperiod))
+    assertSame(NumpyIndicators.RSI(close, timeperiod), talib.RSI(close, timeperiod))
+
+
+def test_CCI_STOCHRSI_match_talib():
+    high, low, close = samplePrices()
+    assertSame(
+        NumpyIndicators.CCI(high, low, close, 14), talib.CCI(high, low, close, 14)
+    )
+    fastk, fastd = NumpyIndicators.STOCHRSI(close, 14, 5, 3, 0)
+    expectedK, expectedD = talib.STOCHRSI(close, 14, 5, 3, 0)
+    assertSame(fastk, expectedK)
+    assertSame(fastd, expectedD)
+
+
+def test_panel_columns_are_computed_independently():
+    panel = np.column_stack([samplePrices(seed=s)[2] for s in range(4)])
+    panel[:10, 1] = np.nan
+    rsi = NumpyIndicators.RSI(panel, 14)
+    assert rsi.shape == panel.shape
+    for col in range(panel.shape[1]):
+        assertSame(rsi[:, col], talib.RSI(panel[:, col], 14))
+
+
+@pytest.mark.parametrize("periods", [(12, 26, 9), (10, 18, 9)])
+def test_MACD_matches_talib(periods):
+    _, _, close = samplePrices(rows=200)
+    close[:3] = np.nan
+    for actual, expected in zip(
+        NumpyIndicators.MACD(close, *periods), talib.MACD(close, *periods)
+    ):
+        assertSame(actual, expected)
+
+
+def test_AROON_matches_talib_with_equal_extremes():
+    high, low, _ = samplePrices()
+    # Rounding leaves several equal highs and lows inside each window
+    high, low = np.round(high), np.round(low)
+    for actual, expected in zip(
+        NumpyIndicators.AROON(high, low, 14), talib.AROON(high, low, 14)
+    ):
+        assertSame(actual, expected)
@@ -0,0 +1,135 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import warnings
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PanelScreener import PanelScreener, StockPanel
+from pkscreener.classes.Screener import tools
+
+
+def sampleFrame(rows=300, seed=0):
+    r = np.random.default_rng(seed)
+    close = np.abs(100 + np.cumsum(r.normal(0.1, 2, rows))) + 5
+    openPrice = close * (1 + r.normal(0, 0.01, rows))
+    high = np.maximum(close, openPrice) * (1 + np.abs(r.normal(0, 0.01, rows)))
+    low = np.minimum(close, openPrice) * (1 - np.abs(r.normal(0, 0.01, rows)))
+    volume = r.integers(5e3, 1e6, rows)
+    if seed % 3 == 0:
+        volume[-1] *= 5
+    index = pd.bdate_range("2022-01-03", periods=rows)
+    return pd.DataFrame(
+        {
+            "Open": openPrice,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": volume,
+        },
+        index=index,
+    )
+
+
+@pytest.fixture
+def configManager():
+    configManager = ConfigManager.tools()
+    configManager.stageTwo = False
+    return configManager
+
+
+@pytest.fixture
+def stockData():
+    return {
+        f"S{i}": sampleFrame(rows=60 + 37 * i, seed=i).to_dict("split")
+        for i in range(12)
+    }
+
+
+def test_fromStockData_aligns_on_latest_candle(stockData):
+    panel = StockPanel.fromStockData(stockData, backtestDuration=2)
+    lengths = [len(stockData[s]["data"]) - 2 for s in panel.symbols]
+    assert list(panel.lengths) == lengths
+    assert panel.rows == max(lengths)
+    shortest = panel.symbols.index("S0")
+    expected = pd.DataFrame(**stockData["S0"])["Close"].to_numpy()[:-2]
+    assert np.isnan(panel.close[: panel.rows - lengths[shortest], shortest]).all()
+    np.testing.assert_array_equal(
+        panel.close[panel.rows - lengths[shortest] :, shortest], expected
+    )
+    assert panel.present[:, shortest].sum() == lengths[shortest]
+
+
+def test_fromStockData_skips_missing_and_short_stocks(stockData):
+    stockData["TINY"] = sampleFrame(rows=1).to_dict("split")
+    panel = StockPanel.fromStockData(stockData, symbols=["S1", "TINY", "NOPE"])
+    assert panel.symbols == ["S1"]
+    assert StockPanel.fromStockData({}, symbols=["S1"]) is None
+
+
+def test_evaluate_matches_screener_validators(configManager, stockData):
+    screener = tools(configManager, dl())
+    panel = StockPanel.fromStockData(stockData)
+    results = PanelScreener(configManager).evaluate(
+        panel, volumeRatio=2.5, minRSI=40, maxRSI=70
+    )
+    for col, symbol in enumerate(panel.symbols):
+        data = pd.DataFrame(**stockData[symbol])
+        fullData, processedData = screener.preprocessData(
+            data, daysToLookback=configManager.daysToLookback
+        )
+        isVolumeHigh, hasMinVolQty = screener.validateVolume(
+            processedData, {}, {}, volumeRatio=2.5
+        )
+        assert results["hasMinVolQty"][col] == hasMinVolQty
+        assert results["hasMinVolumeRatio"][col] == isVolumeHigh
+        assert results["isValidRsi"][col] == screener.validateRSI(
+            processedData, {}, {}, 40, 70
+        )
+        assert results["Consol."][col] == screener.validateConsolidation(
+            processedData, {}, {}, percentage=configManager.consolidationPercentage
+        )
+        assert results["ltpValid"][col] == screener.validateLTP(
+            fullData, {}, {}, minLTP=configManager.minLTP, maxLTP=configManager.maxLTP
+        )[0]
+
+
+def test_prefilter_keeps_unknown_and_unsupported(configManager, stockData):
+    screener = PanelScreener(configManager)
+    codes = list(stockData.keys()) + ["UNKNOWN"]
+    assert screener.prefilter(codes, stockData, 6) == codes
+    filtered = screener.prefilter(codes, stockData, 9, volumeRatio=2.5)
+    assert "UNKNOWN" in filtered
+    assert set(filtered) - {"UNKNOWN"} == set(
+        screener.candidates(StockPanel.fromStockData(stockData), 9, volumeRatio=2.5)
+    )
+    assert len(filtered) < len(codes)
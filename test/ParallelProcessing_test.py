@@ -0,0 +1,274 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import logging
+import multiprocessing
+import warnings
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+warnings.simplefilter("ignore", DeprecationWarning)
+warnings.simplefilter("ignore", FutureWarning)
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+import pkscreener.classes.Screener as Screener
+from pkscreener.classes.CandlePatterns import CandlePatterns
+from pkscreener.classes.ParallelProcessing import StockConsumer
+
+
+def sampleFrame(rows=260, seed=0):
+    r = np.random.default_rng(seed)
+    close = np.abs(50 + np.cumsum(r.normal(0.05, 1, rows))) + 5
+    openPrice = close * (1 + r.normal(0, 0.01, rows))
+    high = np.maximum(close, openPrice) * (1 + np.abs(r.normal(0, 0.01, rows)))
+    low = np.minimum(close, openPrice) * (1 - np.abs(r.normal(0, 0.01, rows)))
+    volume = r.integers(5e3, 1e6, rows)
+    volume[r.integers(rows - 8, rows, 3)] *= 6
+    return pd.DataFrame(
+        {
+            "Open": openPrice,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": volume,
+        },
+        index=pd.bdate_range("2022-01-03", periods=rows),
+    )
+
+
+@pytest.fixture
+def hostRef():
+    configManager = ConfigManager.tools()
+    configManager.stageTwo = False
+    stockDict = {f"S{i}": sampleFrame(seed=i).to_dict("split") for i in range(4)}
+    return SimpleNamespace(
+        objectDictionary=stockDict,
+        configManager=configManager,
+        fetcher=None,
+        screener=Screener.tools(configManager, dl()),
+        candlePatterns=CandlePatterns(),
+        proxyServer=None,
+        processingCounter=multiprocessing.Value("i", 1),
+        processingResultsCounter=multiprocessing.Value("i", 0),
+        default_logger=dl(),
+    )
+
+
+def scanArgs(executeOption, stock):
+    return [executeOption, None, None, 30, 0, 100, None, 7, 4, True, stock]
+
+
+def preprocessEveryDay(self, screener, stock, data, backtestDuration, daysToLookback):
+    return screener.preprocessData(
+        data.head(len(data) - backtestDuration), daysToLookback=daysToLookback
+    )
+
+
+@pytest.mark.parametrize("executeOption", [3, 9])
+def test_walkForwardBacktest_matches_daily_backtests(hostRef, executeOption):
+    backtestDurations = list(range(5, 0, -1))
+    with patch.object(Screener.tools, "validateLorentzian", return_value=False):
+        walkForward = []
+        for stock in hostRef.objectDictionary.keys():
+            consumer = StockConsumer()
+            consumer.isTradingTime = False
+            walkForward.extend(
+                consumer.walkForwardBacktest(
+                    *scanArgs(executeOption, stock),
+                    False,
+                    False,
+                    2.5,
+                    False,
+                    False,
+                    backtestDurations,
+                    30,
+                    logging.NOTSET,
+                    True,
+                    hostRef,
+                )
+                or []
+            )
+        daily = []
+        with patch.object(
+            StockConsumer, "preprocessBacktestData", preprocessEveryDay
+        ):
+            for stock in hostRef.objectDictionary.keys():
+                consumer = StockConsumer()
+                consumer.isTradingTime = False
+                for backtestDuration in backtestDurations:
+                    result = consumer.screenStocks(
+                        *scanArgs(executeOption, stock),
+                        False,
+                        False,
+                        2.5,
+                        False,
+                        False,
+                        backtestDuration,
+                        30,
+                        logging.NOTSET,
+                        True,
+                        hostRef,
+                    )
+                    if result is not None:
+                        daily.append(result)
+    assert len(daily) > 0
+    assert [(r[3], r[4]) for r in walkForward] == [(r[3], r[4]) for r in daily]
+    for actual, expected in zip(walkForward, daily):
+        assert actual[0] == expected[0]
+        assert actual[1] == expected[1]
+        pd.testing.assert_frame_equal(actual[2], expected[2])
+
+
+def test_preprocessBacktestData_preprocesses_once(hostRef):
+    consumer = StockConsumer()
+    data = sampleFrame()
+    with patch.object(
+        hostRef.screener, "preprocessData", wraps=hostRef.screener.preprocessData
+    ) as mock_preprocess:
+        for backtestDuration in [5, 4, 3]:
+            fullData, processedData = consumer.preprocessBacktestData(
+                hostRef.screener, "S0", data, backtestDuration, 30
+            )
+            expected, _ = Screener.tools(
+                hostRef.configManager, dl()
+            ).preprocessData(data.head(len(data) - backtestDuration))
+            pd.testing.assert_frame_equal(fullData, expected)
+            assert len(processedData) == 30
+    mock_preprocess.assert_called_once()
+
+
+def test_validateBacktestVCP_matches_validateVCP_on_each_day(hostRef):
+    consumer = StockConsumer()
+    data = sampleFrame(seed=3)
+    screener = hostRef.screener
+    found = 0
+    for backtestDuration in range(1, 120):
+        fullData, _ = consumer.preprocessBacktestData(
+            screener, "S3", data, backtestDuration, 30
+        )
+        expectedScreen, expectedSave = {}, {}
+        expected = screener.validateVCP(fullData, expectedScreen, expectedSave)
+        screenDict, saveDict = {}, {}
+        assert (
+            consumer.validateBacktestVCP(
+                screener, backtestDuration, screenDict, saveDict
+            )
+            == expected
+        )
+        assert (screenDict, saveDict) == (expectedScreen, expectedSave)
+        found += expected
+    assert found > 0
+
+
+def test_findBacktestTrendlines_matches_findTrendlines_on_each_day(hostRef):
+    consumer = StockConsumer()
+    data = sampleFrame(seed=4)
+    screener = hostRef.screener
+    found = 0
+    for backtestDuration in range(1, 120):
+        fullData, _ = consumer.preprocessBacktestData(
+            screener, "S4", data, backtestDuration, 30
+        )
+        expectedScreen, expectedSave = {}, {}
+        expected = screener.findTrendlines(fullData, expectedScreen, expectedSave)
+        screenDict, saveDict = {}, {}
+        assert (
+            consumer.findBacktestTrendlines(
+                screener, backtestDuration, screenDict, saveDict
+            )
+            == expected
+        )
+        assert (screenDict, saveDict) == (expectedScreen, expectedSave)
+        found += expected
+    assert found > 0
+
+
+@pytest.mark.parametrize(
+    "executeOption, reversalOption, classified", [(3, None, 0), (6, 7, 1)]
+)
+def test_screenStocks_classifies_Lorentzian_only_for_reversal_7(
+    hostRef, executeOption, reversalOption, classified
+):
+    consumer = StockConsumer()
+    consumer.isTradingTime = False
+    args = scanArgs(executeOption, "S0")
+    args[1] = reversalOption
+    args[2] = 1
+    with patch.object(
+        Screener.tools, "validateLorentzian", return_value=True
+    ) as mock_lorentzian:
+        result = consumer.screenStocks(
+            *args,
+            False,
+            False,
+            2.5,
+            False,
+            False,
+            0,
+            30,
+            logging.NOTSET,
+            False,
+            hostRef,
+        )
+    assert mock_lorentzian.call_count == classified
+    if classified:
+        assert result is not None
+        assert mock_lorentzian.call_args.kwargs["stockName"] == "S0"
+
+
+@pytest.mark.parametrize("lowestVolume", [False, True])
+def test_screenStocks_fills_columns_only_for_stocks_passing_the_scan(
+    hostRef, lowestVolume
+):
+    consumer = StockConsumer()
+    consumer.isTradingTime = False
+    with patch.object(
+        Screener.tools, "validateLowestVolume", return_value=lowestVolume
+    ) as mock_lowestVolume, patch.object(
+        Screener.tools, "findTrend", return_value="Sideways"
+    ) as mock_trend:
+        result = consumer.screenStocks(
+            *scanArgs(4, "S0"),
+            False,
+            False,
+            2.5,
+            False,
+            False,
+            0,
+            30,
+            logging.NOTSET,
+            False,
+            hostRef,
+        )
+    assert mock_lowestVolume.call_count == 1
+    assert mock_trend.call_count == int(lowestVolume)
+    assert (result is not None) == lowestVolume
+    if lowestVolume:
+        assert result[1]["52Wk H"] != 0
@@ -0,0 +1,114 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes import Pktalib
+from pkscreener.classes.Pktalib import pktalib
+
+talib = pytest.importorskip("talib")
+
+
+def sampleData(rows=250, seed=3):
+    r = np.random.default_rng(seed)
+    close = 100 + np.cumsum(r.normal(0, 2, rows))
+    index = pd.date_range("2023-01-02", periods=rows, freq="B")
+    return pd.DataFrame(
+        {
+            "High": close + np.abs(r.normal(0, 1, rows)),
+            "Low": close - np.abs(r.normal(0, 1, rows)),
+            "Close": close,
+        },
+        index=index,
+    )
+
+
+def assertSame(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_backend_is_resolved_to_talib_when_installed():
+    assert pktalib.backend is Pktalib.TalibBackend
+
+
+def test_resolveBackend_honours_PKTALIB_BACKEND():
+    with patch.dict(os.environ, {"PKTALIB_BACKEND": "numpy"}):
+        assert Pktalib.resolveBackend() == "numpy"
+    with patch.dict(os.environ, {"PKTALIB_BACKEND": "pandas_ta"}):
+        # Only the installed library can be asked for
+        assert Pktalib.resolveBackend() == "talib"
+    with patch.dict(os.environ, {"PKTALIB_BACKEND": ""}):
+        assert Pktalib.resolveBackend() == "talib"
+
+
+def test_numpy_backend_matches_talib_backend():
+    data = sampleData()
+    high, low, close = data["High"], data["Low"], data["Close"]
+    calls = [
+        ("EMA", (close, 10)),
+        ("SMA", (close, 50)),
+        ("MA", (close, 20)),
+        ("RSI", (close, 14)),
+        ("CCI", (high, low, close, 14)),
+    ]
+    for name, args in calls:
+        expected = getattr(Pktalib.TalibBackend, name)(*args)
+        with patch.object(pktalib, "backend", Pktalib.NumpyBackend):
+            actual = getattr(pktalib, name)(*args)
+        assert isinstance(actual, pd.Series)
+        assert actual.index.equals(close.index)
+        assertSame(actual, expected)
+    with patch.object(pktalib, "backend", Pktalib.NumpyBackend):
+        macd = pktalib.MACD(close, 12, 26, 9)
+        aroon = pktalib.Aroon(high, low, 14)
+        stochrsi = pktalib.STOCHRSI(close, 14, 5, 3, 0)
+    for actual, expected in zip(macd, talib.MACD(close, 12, 26, 9)):
+        assertSame(actual, expected)
+    expectedAroon = Pktalib.TalibBackend.Aroon(high, low, 14)
+    assert list(aroon.columns) == list(expectedAroon.columns)
+    assertSame(aroon.values, expectedAroon.values)
+    for actual, expected in zip(stochrsi, talib.STOCHRSI(close.values, 14, 5, 3, 0)):
+        assertSame(actual, expected)
+
+
+def test_numpy_backend_leaves_candle_patterns_to_talib():
+    data = sampleData()
+    opens = data["Close"].shift(1).bfill()
+    with patch.object(pktalib, "backend", Pktalib.NumpyBackend):
+        hammer = pktalib.CDLHAMMER(opens, data["High"], data["Low"], data["Close"])
+    assertSame(hammer, talib.CDLHAMMER(opens, data["High"], data["Low"], data["Close"]))
+
+
+def test_numpy_backend_candle_patterns_need_a_native_library():
+    data = sampleData()
+    with patch.object(pktalib, "backend", Pktalib.NumpyBackend), patch.object(
+        Pktalib, "nativeBackend", return_value="numpy"
+    ):
+        with pytest.raises(ImportError):
+            pktalib.CDLHAMMER(data["Close"], data["High"], data["Low"], data["Close"])
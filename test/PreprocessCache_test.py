@@ -0,0 +1,107 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from PKDevTools.classes.log import default_logger as dl
+
+import pkscreener.classes.ConfigManager as ConfigManager
+from pkscreener.classes.PreprocessCache import PreprocessCache
+from pkscreener.classes.Screener import tools
+
+
+def sampleFrame(rows=260, seed=0):
+    r = np.random.default_rng(seed)
+    close = 100 + np.cumsum(r.normal(0.2, 2, rows))
+    return pd.DataFrame(
+        {
+            "Open": close + r.normal(0, 1, rows),
+            "High": close + 2,
+            "Low": close - 2,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": r.integers(1e5, 1e6, rows),
+        },
+        index=pd.bdate_range("2022-01-03", periods=rows),
+    )
+
+
+@pytest.fixture(params=[False, True], ids=["SMA", "EMA"])
+def screener(request):
+    configManager = ConfigManager.tools()
+    configManager.useEMA = request.param
+    screener = tools(configManager, dl())
+    # Only the in-memory cache is looked at here
+    screener.incrementalIndicators = lambda data, stock: None
+    screener.saveIndicatorState = lambda data, stock: None
+    return screener
+
+
+def test_preprocessData_reuses_indicators_of_same_data(screener, monkeypatch):
+    data = sampleFrame()
+    expected = screener.preprocessData(data.copy(), stock="SBIN")
+    monkeypatch.setattr(
+        "pkscreener.classes.Screener.pktalib.RSI",
+        lambda *args, **kwargs: pytest.fail("RSI was recomputed"),
+    )
+    rawData = data.copy()
+    actual = screener.preprocessData(rawData, daysToLookback=10, stock="SBIN")
+    pd.testing.assert_frame_equal(actual[0], expected[0])
+    pd.testing.assert_frame_equal(actual[1], expected[0].head(10))
+    # The caller's frame gets the indicator columns just the same
+    assert list(rawData.columns) == list(expected[0].columns)
+    actual[0]["RSI"] = 0
+    again = screener.preprocessData(data.copy(), stock="SBIN")
+    pd.testing.assert_frame_equal(again[0], expected[0])
+    cache = screener.preprocessCache
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_preprocessData_recomputes_changed_or_unnamed_data(screener):
+    data = sampleFrame()
+    screener.preprocessData(data.copy(), stock="SBIN")
+    forming = data.copy()
+    forming.iloc[-1, forming.columns.get_loc("Close")] += 5
+    screener.preprocessData(forming, stock="SBIN")
+    screener.preprocessData(data.copy())
+    screener.preprocessData(data.copy(), stock="TCS")
+    cache = screener.preprocessCache
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert len(cache.entries) == 3
+
+
+def test_cache_evicts_least_recently_used_beyond_maxBytes():
+    indicators = {"RSI": np.zeros(100), "CCI": np.zeros(100)}
+    cache = PreprocessCache(maxBytes=3 * 1600)
+    for key in ["A", "B", "C"]:
+        cache.put(key, indicators)
+    assert cache.get("A") is not None
+    cache.put("D", indicators)
+    assert list(cache.entries) == ["C", "A", "D"]
+    assert cache.bytes == 3 * 1600
+    cache.put("E", {"RSI": np.zeros(1000)})
+    assert "E" not in cache.entries
+    assert cache.get(None) is None
+    assert (cache.hits, cache.misses) == (1, 0)
@@ -0,0 +1,94 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+from unittest.mock import MagicMock
+
+from pkscreener.classes.ScanPlan import ScanPlan
+
+
+def writer(key, value, result):
+    def check(screenDict, saveDict):
+        screenDict[key] = value
+        saveDict[key] = value
+        return result
+
+    return MagicMock(side_effect=check)
+
+
+def test_prefilter_runs_cheapest_checks_first_and_stops_at_rejection():
+    calls = []
+    checks = {
+        name: MagicMock(side_effect=lambda s, v, name=name: calls.append(name))
+        for name in ["ltp", "cci", "trend"]
+    }
+    plan = ScanPlan(8)
+    assert not plan.prefilter(checks, {}, {})
+    assert calls == ["ltp"]
+    checks["ltp"].side_effect = lambda s, v: True
+    plan = ScanPlan(8)
+    assert not plan.prefilter(checks, {}, {})
+    # cci reads the trend, so the trend is computed before it
+    assert calls == ["ltp", "trend", "cci"]
+
+
+def test_prefilter_passes_when_any_check_of_a_group_passes():
+    checks = {
+        "ltp": MagicMock(return_value=True),
+        "volumeRatio": MagicMock(return_value=True),
+        "breakout": MagicMock(return_value=False),
+        "potentialBreakout": MagicMock(return_value=True),
+    }
+    assert ScanPlan(1).prefilter(checks, {}, {})
+    checks["potentialBreakout"].return_value = False
+    assert not ScanPlan(1).prefilter(checks, {}, {})
+
+
+def test_prefilter_uses_accepts_and_leaves_unknown_scans_alone():
+    checks = {"ltp": MagicMock(return_value=True)}
+    checks["consolidation"] = MagicMock(return_value=12)
+    accepts = {"consolidation": lambda value: 0 < value <= 10}
+    assert not ScanPlan(3).prefilter(checks, {}, {}, accepts=accepts)
+    checks["consolidation"].return_value = 8
+    assert ScanPlan(3).prefilter(checks, {}, {}, accepts=accepts)
+    assert ScanPlan(0).prefilter({}, {}, {})
+    assert ScanPlan(21).prefilter({}, {}, {})
+
+
+def test_value_replays_writes_of_prefilters_in_their_usual_order():
+    checks = {
+        "ltp": MagicMock(return_value=True),
+        "momentum": writer("Pattern", "Momentum Gainer", True),
+        "vsa": writer("Pattern", "Demand Rise", False),
+    }
+    screenDict, saveDict = {"Pattern": ""}, {"Pattern": ""}
+    plan = ScanPlan(6, reversalOption=3)
+    assert plan.prefilter(checks, screenDict, saveDict)
+    assert saveDict["Pattern"] == ""
+    saveDict["Pattern"] = "Doji"
+    assert plan.value("momentum", screenDict, saveDict)
+    assert saveDict["Pattern"] == "Momentum Gainer"
+    assert not plan.value("vsa", screenDict, saveDict)
+    assert saveDict["Pattern"] == "Demand Rise"
+    assert checks["momentum"].call_count == 1
+    assert checks["vsa"].call_count == 1
@@ -0,0 +1,124 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import multiprocessing
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.SharedStockArena import SharedStockArena
+
+
+def sampleFrame(rows=5, start=100.0):
+    index = pd.date_range("2023-12-01", periods=rows, freq="D", name="Date")
+    close = np.arange(rows, dtype=float) + start
+    return pd.DataFrame(
+        {
+            "Open": close - 1,
+            "High": close + 2,
+            "Low": close - 2,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": np.arange(rows, dtype=np.int64) * 1000,
+        },
+        index=index,
+    )
+
+
+@pytest.fixture
+def arena():
+    stockDict = {
+        "SBIN": sampleFrame().to_dict("split"),
+        "TCS": sampleFrame(rows=8, start=3000.0).to_dict("split"),
+    }
+    arena = SharedStockArena.create(stockDict, overflow={})
+    yield arena
+    arena.release()
+
+
+def readClose(arena, symbol, queue):
+    queue.put(float(arena.get(symbol)["Close"].iloc[-1]))
+
+
+def test_getFrame_matches_source(arena):
+    for symbol, rows, start in [("SBIN", 5, 100.0), ("TCS", 8, 3000.0)]:
+        split = sampleFrame(rows, start).to_dict("split")
+        expected = pd.DataFrame(split["data"], columns=split["columns"], index=split["index"])
+        pd.testing.assert_frame_equal(arena.get(symbol), expected, check_freq=False)
+    assert len(arena) == 2
+    assert "TCS" in arena
+
+
+def test_getFrame_keeps_dates_of_non_ns_index():
+    frame = sampleFrame()
+    frame.index = frame.index.astype("datetime64[us]")
+    arena = SharedStockArena.create({"SBIN": frame}, overflow={})
+    try:
+        restored = arena.getFrame("SBIN")
+        assert list(restored.index) == list(frame.index)
+        assert restored.index.dtype == frame.index.dtype
+        assert restored.index[0] == pd.Timestamp("2023-12-01")
+    finally:
+        arena.release()
+
+
+def test_getFrame_is_a_readonly_view(arena):
+    frame = arena.get("SBIN")
+    _, floatBlock, _ = arena._blocks()
+    assert np.shares_memory(frame["Close"].to_numpy(), floatBlock)
+    with pytest.raises(ValueError):
+        frame.iloc[0, 0] = 0
+
+
+def test_overflow_for_missing_stocks(arena):
+    assert arena.get("INFY") is None
+    arena["INFY"] = sampleFrame(rows=2).to_dict("split")
+    assert arena.overflow["INFY"] == arena.get("INFY")
+    assert "INFY" in arena.keys()
+    with pytest.raises(KeyError):
+        arena["WIPRO"]
+
+
+def test_pickled_arena_attaches_by_name(arena):
+    attached = pickle.loads(pickle.dumps(arena))
+    pd.testing.assert_frame_equal(attached.get("TCS"), arena.get("TCS"))
+    attached.release()
+    # The worker side never unlinks the segment
+    assert arena.get("SBIN") is not None
+
+
+def test_arena_is_readable_in_spawned_process(arena):
+    queue = multiprocessing.get_context("spawn").Queue()
+    process = multiprocessing.get_context("spawn").Process(
+        target=readClose, args=(arena, "TCS", queue)
+    )
+    process.start()
+    process.join(60)
+    assert queue.get(timeout=5) == 3007.0
+
+
+def test_create_returns_none_without_rows():
+    assert SharedStockArena.create({}) is None
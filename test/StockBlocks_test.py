@@ -0,0 +1,84 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.StockBlocks import StockBlocks
+
+
+def sampleFrame(rows=30, tz=None):
+    close = np.linspace(100.0, 130.0, rows)
+    return pd.DataFrame(
+        {
+            "Open": close - 1,
+            "High": close + 2,
+            "Low": close - 2,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": np.arange(rows, dtype=np.int64) * 1000,
+        },
+        index=pd.bdate_range("2023-01-02", periods=rows, tz=tz, name="Date"),
+    )
+
+
+@pytest.mark.parametrize("tz", [None, "Asia/Kolkata"])
+def test_toFrame_matches_frame_built_from_split(tz):
+    split = sampleFrame(tz=tz).to_dict("split")
+    blocks = StockBlocks.fromValue(split)
+    expected = pd.DataFrame(
+        split["data"], columns=split["columns"], index=split["index"]
+    )
+    pd.testing.assert_frame_equal(blocks.toFrame(), expected)
+    restored = pickle.loads(pickle.dumps(blocks))
+    pd.testing.assert_frame_equal(restored.toFrame(), expected)
+
+
+def test_toFrame_wraps_the_float_block_without_copying():
+    blocks = StockBlocks.fromFrame(sampleFrame())
+    frame = blocks.toFrame()
+    assert np.shares_memory(frame["Close"].to_numpy(), blocks.floats)
+    with pytest.raises(ValueError):
+        frame.loc[frame.index[0], "Close"] = 0
+    frame.insert(6, "SMA", frame["Close"].rolling(5).mean())
+    assert list(blocks.toFrame().columns) == list(sampleFrame().columns)
+    assert blocks.toFrame()["Close"].iloc[0] == 100.0
+
+
+def test_reads_like_the_split_dictionary():
+    frame = sampleFrame()
+    split = frame.to_dict("split")
+    blocks = StockBlocks.fromFrame(frame)
+    assert blocks["columns"] == split["columns"]
+    assert blocks == split and split == blocks
+    assert StockBlocks.toSplitDict({"SBIN": blocks, "TCS": split}) == {
+        "SBIN": split,
+        "TCS": split,
+    }
+    assert type(StockBlocks.toSplitDict({"SBIN": blocks})["SBIN"]) is dict
+    with pytest.raises(KeyError):
+        blocks["Close"]
@@ -0,0 +1,178 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import os
+import pickle
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkscreener.classes.StockDataStore import StockDataStore, StockDataStoreDict
+
+
+def sampleFrame(rows=5, start=100.0, tz=None):
+    index = pd.date_range("2023-12-01", periods=rows, freq="D", tz=tz, name="Date")
+    close = np.arange(rows, dtype=float) + start
+    return pd.DataFrame(
+        {
+            "Open": close - 1,
+            "High": close + 2,
+            "Low": close - 2,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": np.arange(rows, dtype=np.int64) * 1000,
+        },
+        index=index,
+    )
+
+
+@pytest.fixture
+def stockDict():
+    return {
+        "SBIN": sampleFrame().to_dict("split"),
+        "TCS": sampleFrame(rows=8, start=3000.0).to_dict("split"),
+        "INFY": sampleFrame(rows=3, start=1500.0, tz="Asia/Kolkata").to_dict("split"),
+    }
+
+
+def test_write_and_read_roundtrip(tmp_path, stockDict):
+    store = StockDataStore.write(os.path.join(tmp_path, "stock_data_1.store"), stockDict)
+    assert StockDataStore.exists(store.path)
+    assert sorted(store.symbols()) == sorted(stockDict.keys())
+    assert len(store) == 3
+    assert "TCS" in store and "ABC" not in store
+    for symbol, split in stockDict.items():
+        expected = pd.DataFrame(split["data"], columns=split["columns"], index=split["index"])
+        pd.testing.assert_frame_equal(store.getFrame(symbol), expected, check_freq=False)
+        assert store.get(symbol) == split
+    assert store.get("ABC") is None
+
+
+def test_roundtrip_keeps_dates_of_non_ns_index(tmp_path):
+    sbin = sampleFrame()
+    sbin.index = sbin.index.astype("datetime64[s]")
+    infy = sampleFrame(rows=3, start=1500.0, tz="Asia/Kolkata")
+    infy.index = infy.index.astype("datetime64[us, Asia/Kolkata]")
+    frames = {"SBIN": sbin, "INFY": infy}
+    store = StockDataStore.write(os.path.join(tmp_path, "stock_data_1.store"), frames)
+    for symbol, frame in frames.items():
+        restored = store.getFrame(symbol)
+        assert list(restored.index) == list(frame.index)
+        assert restored.index.dtype == frame.index.dtype
+        assert restored.index[0] == pd.Timestamp("2023-12-01", tz=frame.index.tz)
+
+
+def test_getArrays_are_memory_mapped_views(tmp_path, stockDict):
+    path = os.path.join(tmp_path, "stock_data_1.store")
+    StockDataStore.write(path, stockDict)
+    store = StockDataStore(path)
+    index, columns = store.getArrays("TCS")
+    assert len(index) == 8
+    assert isinstance(columns["Close"].base, np.memmap) or isinstance(
+        columns["Close"], np.memmap
+    )
+    assert not columns["Close"].flags.writeable
+    assert columns["Volume"].dtype == np.int64
+
+
+def test_getFrame_copy_is_writeable(tmp_path, stockDict):
+    store = StockDataStore.write(os.path.join(tmp_path, "s.store"), stockDict)
+    frame = store.getFrame("SBIN", copy=True)
+    frame.loc[frame.index[0], "Close"] = 0
+    assert store.getFrame("SBIN")["Close"].iloc[0] == 100.0
+
+
+def test_pickle_import_export(tmp_path, stockDict):
+    pickleFile = os.path.join(tmp_path, "stock_data_1.pkl")
+    with open(pickleFile, "wb") as f:
+        pickle.dump(stockDict, f, protocol=pickle.HIGHEST_PROTOCOL)
+    store = StockDataStore.importPickle(pickleFile)
+    assert store.path == os.path.join(tmp_path, "stock_data_1.store")
+    exported = store.exportPickle(os.path.join(tmp_path, "exported.pkl"))
+    with open(exported, "rb") as f:
+        assert pickle.load(f) == stockDict
+    assert store.toStockDict({}) == stockDict
+
+
+def test_write_leaves_callers_index_alone(tmp_path):
+    frame = sampleFrame()
+    frame.index = frame.index.strftime("%Y-%m-%d")
+    store = StockDataStore.write(os.path.join(tmp_path, "s.store"), {"SBIN": frame})
+    assert not isinstance(frame.index, pd.DatetimeIndex)
+    assert isinstance(store.getFrame("SBIN").index, pd.DatetimeIndex)
+
+
+def test_StockDataStoreDict_builds_stocks_on_access(tmp_path, stockDict):
+    store = StockDataStore.write(os.path.join(tmp_path, "s.store"), stockDict)
+    overlay = {"WIPRO": sampleFrame(start=400.0).to_dict("split")}
+    lazy = StockDataStoreDict(store, overlay)
+    with patch.object(store, "get", wraps=store.get) as mock_get:
+        assert len(lazy) == 4
+        assert sorted(lazy) == ["INFY", "SBIN", "TCS", "WIPRO"]
+        assert "TCS" in lazy and "ABC" not in lazy
+        mock_get.assert_not_called()
+        assert lazy["TCS"] == stockDict["TCS"]
+        mock_get.assert_called_once_with("TCS")
+    assert lazy.get("ABC") is None
+    lazy["SBIN"] = overlay["WIPRO"]
+    assert overlay["SBIN"] == overlay["WIPRO"]
+    assert lazy["SBIN"] == overlay["WIPRO"]
+    assert len(lazy) == 4
+    snapshot = lazy.copy()
+    lazy["ITC"] = overlay["WIPRO"]
+    assert "ITC" not in snapshot and snapshot.store is store
+    pd.testing.assert_frame_equal(
+        StockDataStore.write(os.path.join(tmp_path, "c.store"), snapshot).getFrame(
+            "TCS"
+        ),
+        store.getFrame("TCS"),
+    )
+
+
+def test_StockDataStoreDict_pickles_without_the_blocks(tmp_path, stockDict):
+    store = StockDataStore.write(os.path.join(tmp_path, "s.store"), stockDict)
+    lazy = StockDataStoreDict(store)
+    assert lazy["SBIN"] == stockDict["SBIN"]
+    assert len(store._blocks) > 0
+    restored = pickle.loads(pickle.dumps(lazy))
+    assert restored.store._blocks == {}
+    assert restored["TCS"] == stockDict["TCS"]
+
+
+def test_write_rejects_non_numeric_columns(tmp_path):
+    frame = sampleFrame()
+    frame["Name"] = "SBIN"
+    with pytest.raises(ValueError):
+        StockDataStore.write(os.path.join(tmp_path, "s.store"), {"SBIN": frame})
+    assert not StockDataStore.exists(os.path.join(tmp_path, "s.store"))
+
+
+def test_deleteStores(tmp_path, stockDict):
+    StockDataStore.write(os.path.join(tmp_path, "stock_data_1.store"), stockDict)
+    StockDataStore.write(os.path.join(tmp_path, "stock_data_2.store"), stockDict)
+    StockDataStore.deleteStores(tmp_path, excludeStore="stock_data_2.store")
+    assert not os.path.isdir(os.path.join(tmp_path, "stock_data_1.store"))
+    assert StockDataStore.exists(os.path.join(tmp_path, "stock_data_2.store"))
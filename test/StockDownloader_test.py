@@ -0,0 +1,130 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from pkscreener.classes import ConfigManager
+from pkscreener.classes.StockDownloader import AsyncStockDownloader, HostRateLimiter
+
+
+def test_HostRateLimiter_spaces_out_requests_per_host():
+    async def requestTimes():
+        limiter = HostRateLimiter(requestsPerSecond=20)
+        loop = asyncio.get_running_loop()
+        times = {"a": [], "b": []}
+
+        async def request(host):
+            await limiter.wait(host)
+            times[host].append(loop.time())
+
+        await asyncio.gather(*[request(host) for host in ["a", "b"] * 4])
+        return times
+
+    times = asyncio.run(requestTimes())
+    for host in ["a", "b"]:
+        gaps = [later - earlier for earlier, later in zip(times[host], times[host][1:])]
+        assert all(gap >= 0.045 for gap in gaps)
+    # Hosts don't wait for each other
+    assert abs(times["a"][0] - times["b"][0]) < 0.04
+
+
+def test_AsyncStockDownloader_bounds_concurrency_and_reports_failures():
+    configManager = ConfigManager.tools()
+    downloader = AsyncStockDownloader(configManager, concurrency=2)
+    downloader.requestsPerSecond = None
+    inFlight = {"now": 0, "max": 0}
+
+    def fetchStockData(stockCode, period, duration):
+        inFlight["now"] += 1
+        inFlight["max"] = max(inFlight["max"], inFlight["now"])
+        time.sleep(0.02)
+        inFlight["now"] -= 1
+        if stockCode == "BAD":
+            raise ValueError(stockCode)
+        return MagicMock()
+
+    arrived = {}
+    with patch.object(downloader, "fetchStockData", side_effect=fetchStockData):
+        downloader.download(
+            ["A", "B", "BAD", "C", "D"],
+            "280d",
+            "1d",
+            lambda stock, data: arrived.update({stock: data}),
+        )
+    assert sorted(arrived.keys()) == ["A", "B", "BAD", "C", "D"]
+    assert arrived["BAD"] is None
+    assert inFlight["max"] <= 2
+
+
+def test_AsyncStockDownloader_retries_with_backoff():
+    configManager = ConfigManager.tools()
+    configManager.maxNetworkRetryCount = 3
+    downloader = AsyncStockDownloader(configManager, concurrency=4)
+    adapter = downloader.session.get_adapter("https://query2.finance.yahoo.com")
+    retries = adapter.max_retries
+    assert retries.status == 3
+    assert retries.backoff_factor == downloader.backoffFactor
+    assert 429 in retries.status_forcelist
+    # Unreachable hosts aren't retried for long
+    assert retries.total is None
+    assert retries.connect == retries.read == downloader.connectionRetries
+    assert retries.backoff_max == downloader.backoffMax
+    assert adapter._pool_maxsize == 4
+
+
+def test_AsyncStockDownloader_downloads_on_daemon_threads():
+    downloader = AsyncStockDownloader(ConfigManager.tools(), concurrency=2)
+    downloader.requestsPerSecond = None
+    daemons = []
+
+    def fetchStockData(stockCode, period, duration):
+        daemons.append(threading.current_thread().daemon)
+        return MagicMock()
+
+    with patch.object(downloader, "fetchStockData", side_effect=fetchStockData):
+        downloader.download(["A", "B"], "280d", "1d", lambda stock, data: None)
+    assert daemons == [True, True]
+
+
+def test_AsyncStockDownloader_stop_gives_up_pending_downloads():
+    downloader = AsyncStockDownloader(ConfigManager.tools(), concurrency=1)
+    downloader.requestsPerSecond = None
+    fetched = []
+
+    def fetchStockData(stockCode, period, duration):
+        fetched.append(stockCode)
+        downloader.stop()
+        return MagicMock()
+
+    arrived = {}
+    with patch.object(downloader, "fetchStockData", side_effect=fetchStockData):
+        downloader.download(
+            ["A", "B", "C"], "280d", "1d", lambda stock, data: arrived.update({stock: data})
+        )
+    assert len(fetched) == 1
+    assert sorted(arrived.keys()) == ["A", "B", "C"]
+    assert [stock for stock, data in arrived.items() if data is not None] == fetched
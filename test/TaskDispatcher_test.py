@@ -0,0 +1,215 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import queue
+from unittest.mock import Mock, patch
+
+from pkscreener.classes.TaskDispatcher import (
+    STOCK_INDEX,
+    ChunkProcessor,
+    TaskChunk,
+    TaskChunkResult,
+    TaskDispatcher,
+)
+
+
+def makeItems(stocks):
+    return [
+        tuple(stock if i == STOCK_INDEX else i for i in range(STOCK_INDEX + 3))
+        for stock in stocks
+    ]
+
+
+def drain(tasks_queue):
+    tasks = []
+    while not tasks_queue.empty():
+        tasks.append(tasks_queue.get())
+    return tasks
+
+
+def test_templateFor():
+    items = makeItems(["A", "B", "C"])
+    template = TaskDispatcher.templateFor(items)
+    assert template[:STOCK_INDEX] == items[0][:STOCK_INDEX]
+    assert template[STOCK_INDEX + 1 :] == items[0][STOCK_INDEX + 1 :]
+    items[1] = tuple("x" if i == 0 else v for i, v in enumerate(items[1]))
+    assert TaskDispatcher.templateFor(items) is None
+    assert TaskDispatcher.templateFor([]) is None
+
+
+def test_ChunkProcessor_substitutes_stocks_and_flattens_results():
+    template = makeItems(["A"])[0]
+
+    def processor(*args):
+        stock = args[STOCK_INDEX]
+        if stock == "LIST":
+            return [("L1",), ("L2",)]
+        return None if stock == "NONE" else (stock,)
+
+    answer = ChunkProcessor(processor, template)(["A", "NONE", "LIST"], None)
+    assert isinstance(answer, TaskChunkResult)
+    assert answer.count == 3
+    assert answer.results == [("A",), ("L1",), ("L2",)]
+    assert answer.elapsed >= 0 and answer.cpuTime >= 0
+
+
+def test_dispatch_sends_stock_names_and_exit_signals():
+    stocks = [f"S{i}" for i in range(10)]
+    tasks_queue = queue.Queue()
+    with patch.dict(TaskDispatcher.observedLatency, {"cached": None}):
+        dispatcher = TaskDispatcher(makeItems(stocks), tasks_queue, 2)
+        dispatcher.dispatch()
+        tasks = drain(tasks_queue)
+        assert len(tasks) == 4
+        assert [task[0] for task in tasks] == [["S0"], ["S1"], ["S2"], ["S3"]]
+        sent = [stock for task in tasks for stock in task[0]]
+        answered = 0
+        while len(tasks) == 0 or tasks[-1] is not None:
+            # Exit signals only go out once every chunk is back
+            assert answered < len(sent)
+            results, count = dispatcher.received(
+                TaskChunkResult([("r",)], 1, 0.001, 0.001)
+            )
+            answered += 1
+            assert results == [("r",)] and count == 1
+            tasks = drain(tasks_queue)
+            sent.extend(
+                stock for task in tasks if task is not None for stock in task[0]
+            )
+        assert tasks[-2:] == [None, None]
+        assert answered == len(sent)
+        assert sorted(sent) == sorted(stocks)
+
+
+def test_chunkSize_follows_latency():
+    tasks_queue = queue.Queue()
+    with patch.dict(TaskDispatcher.observedLatency, {"cached": 0.01}):
+        dispatcher = TaskDispatcher(makeItems(range(1000)), tasks_queue, 2)
+        # 0.5s worth of 10ms tasks, capped by maxChunkSize
+        assert dispatcher.chunkSize() == 50
+        dispatcher.processed, dispatcher.elapsed = 10, 0.001
+        assert dispatcher.chunkSize() == TaskDispatcher.maxChunkSize
+        # Towards the end the remaining work is shared between the workers
+        dispatcher.pending = dispatcher.pending[:12]
+        assert dispatcher.chunkSize() == 3
+
+
+def test_received_handles_plain_results():
+    dispatcher = TaskDispatcher(makeItems(["A"]), queue.Queue(), 2)
+    assert dispatcher.received(None) == ([], 1)
+    assert dispatcher.received(("A",)) == ([("A",)], 1)
+
+
+def test_workerCount():
+    with patch("multiprocessing.cpu_count", return_value=4):
+        assert TaskDispatcher.workerCount(100) == 4
+        assert TaskDispatcher.workerCount(100, cacheEnabled=True) == 3
+        assert TaskDispatcher.workerCount(1) == 2
+        with patch.dict(TaskDispatcher.observedCpuShare, {"fetch": 0.5}):
+            assert TaskDispatcher.workerCount(100, ioBound=True) == 8
+        with patch.dict(TaskDispatcher.observedCpuShare, {"fetch": 0.01}):
+            assert TaskDispatcher.workerCount(100, ioBound=True) == 16
+
+
+def test_awaitStocks_holds_back_stocks_until_they_arrive():
+    tasks_queue = queue.Queue()
+    arrivals = queue.Queue()
+    dispatcher = TaskDispatcher(makeItems(["A", "B", "C"]), tasks_queue, 2)
+    dispatcher.awaitStocks(["B", "C"], arrivals)
+    assert dispatcher.pollInterval() is not None
+    dispatcher.dispatch()
+    assert drain(tasks_queue) == [(["A"],)]
+    arrivals.put("C")
+    dispatcher.dispatch()
+    assert drain(tasks_queue) == [(["C"],)]
+    assert not dispatcher.finished()
+    arrivals.put("B")
+    dispatcher.dispatch()
+    assert drain(tasks_queue) == [(["B"],)]
+    for chunkId in [1, 2]:
+        dispatcher.received(TaskChunkResult([], 1, 0.001, 0.001, chunkId))
+    assert drain(tasks_queue) == []
+    dispatcher.received(TaskChunkResult([], 1, 0.001, 0.001, 3))
+    assert drain(tasks_queue) == [None, None]
+    assert dispatcher.pollInterval() == TaskDispatcher.livenessSeconds
+
+
+def test_ChunkProcessor_sends_the_chunk_id_back():
+    template = makeItems(["A"])[0]
+    answer = ChunkProcessor(lambda *args: None, template)(TaskChunk(["A"], 7), None)
+    assert answer.chunkId == 7
+
+
+def test_recoverLostChunks_hands_out_chunks_of_dead_workers_again():
+    tasks_queue = queue.Queue()
+    consumers = [Mock(is_alive=Mock(return_value=True)) for _ in range(2)]
+    with patch.dict(TaskDispatcher.observedLatency, {"cached": None}):
+        dispatcher = TaskDispatcher(makeItems(["A", "B"]), tasks_queue, 1)
+        dispatcher.generation = 1
+        dispatcher.dispatch()
+        tasks = drain(tasks_queue)
+        assert tasks == [(1, ["A"]), (1, ["B"])]
+        assert dispatcher.recoverLostChunks(consumers) == 0
+        assert drain(tasks_queue) == []
+        consumers[0].is_alive.return_value = False
+        assert dispatcher.recoverLostChunks(consumers) == 0
+        dispatcher.dispatch()
+        assert drain(tasks_queue) == tasks
+        # Whichever copy of a chunk comes back first counts
+        answers = [TaskChunkResult([(i,)], 1, 0.001, 0.001, i) for i in [2, 1, 2]]
+        assert dispatcher.received(answers[0]) == ([(2,)], 1)
+        assert dispatcher.received(answers[1]) == ([(1,)], 1)
+        assert dispatcher.received(answers[2]) == ([], 0)
+        assert dispatcher.finished()
+        assert dispatcher.recoverLostChunks(consumers) == 0
+
+
+def test_recoverLostChunks_gives_up_when_no_worker_is_left():
+    tasks_queue = queue.Queue()
+    consumers = [Mock(is_alive=Mock(return_value=False)) for _ in range(2)]
+    with patch.dict(TaskDispatcher.observedLatency, {"cached": None}):
+        dispatcher = TaskDispatcher(makeItems(range(10)), tasks_queue, 1)
+        dispatcher.generation = 1
+        dispatcher.dispatch()
+        assert dispatcher.recoverLostChunks(consumers) == 10
+        assert dispatcher.finished()
+        assert sorted(dispatcher.lostStocks) == list(range(10))
+
+
+def test_chunks_of_a_dead_worker_go_out_before_the_exit_signals():
+    tasks_queue = queue.Queue()
+    consumers = [Mock(is_alive=Mock(return_value=True)) for _ in range(2)]
+    with patch.dict(TaskDispatcher.observedLatency, {"cached": None}):
+        dispatcher = TaskDispatcher(makeItems(["A", "B"]), tasks_queue, 2)
+        dispatcher.dispatch()
+        assert drain(tasks_queue) == [(["A"],), (["B"],)]
+        dispatcher.received(TaskChunkResult([], 1, 0.001, 0.001, 1))
+        # The worker holding B dies
+        consumers[1].is_alive.return_value = False
+        assert dispatcher.recoverLostChunks(consumers) == 0
+        dispatcher.dispatch()
+        assert drain(tasks_queue) == [(["B"],)]
+        dispatcher.received(TaskChunkResult([], 1, 0.001, 0.001, 2))
+        assert drain(tasks_queue) == [None, None]
+        assert dispatcher.finished() and dispatcher.lostStocks == []
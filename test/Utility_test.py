@@ -24,17 +24,20 @@
 """
 import datetime
 import os
+import pickle
 import platform
 import warnings
 from unittest.mock import ANY, Mock, patch
 
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
+import numpy as np
 import pandas as pd
 import pytz
 from PKDevTools.classes import Archiver
 from PKDevTools.classes.ColorText import colorText
 
+from pkscreener.classes import ConfigManager
 from pkscreener.classes.Utility import tools
 
 
@@ -302,6 +305,81 @@ def test_loadStockData():
     os.remove(os.path.join(Archiver.get_user_outputs_dir(), "stock_data_2.pkl"))
 
 
+# Positive test case for loadStockData() function using the columnar store
+def test_loadStockData_from_store():
+    from pkscreener.classes.StockDataStore import StockDataStore, StockDataStoreDict
+
+    frame = pd.DataFrame(
+        {"Open": [1.0, 2.0], "Close": [1.5, 2.5], "Volume": [10, 20]},
+        index=pd.DatetimeIndex(["2023-12-01", "2023-12-04"], name="Date"),
+    )
+    cacheFile = os.path.join(Archiver.get_user_outputs_dir(), "stock_data_3.pkl")
+    frame.to_pickle(cacheFile)
+    storePath = StockDataStore.storePathForCacheFile(cacheFile)
+    StockDataStore.write(storePath, {"SBIN": frame.to_dict("split")})
+    with patch("pickle.load") as mock_load:
+        with patch(
+            "pkscreener.classes.Utility.tools.afterMarketStockDataExists"
+        ) as mock_data:
+            mock_data.return_value = True, "stock_data_3.pkl"
+            stockDict = tools.loadStockData({}, Mock(), False, "Y")
+            mock_load.assert_not_called()
+    assert isinstance(stockDict, StockDataStoreDict)
+    assert stockDict == {"SBIN": frame.to_dict("split")}
+    os.remove(cacheFile)
+    StockDataStore.deleteStores(Archiver.get_user_outputs_dir())
+
+
+# Positive test case for loadStockData() bringing an older cache up to date
+def test_loadStockData_refreshes_previous_cache():
+    from pkscreener.classes.StockDataStore import StockDataStore
+
+    outputsDir = Archiver.get_user_outputs_dir()
+    index = pd.bdate_range("2023-11-27", periods=10)
+    full = pd.DataFrame(
+        {"Close": np.arange(100.0, 110.0), "Volume": np.arange(10, 20)},
+        index=index,
+    )
+    with open(os.path.join(outputsDir, "stock_data_061223.pkl"), "wb") as f:
+        pickle.dump({"SBIN": full.iloc[:-2].to_dict("split")}, f)
+
+    def fetchStockDataInBatches(stockCodes, period, duration, proxyServer=None):
+        return {"SBIN": full.iloc[-int(period[:-1]) :]}
+
+    try:
+        with patch(
+            "pkscreener.classes.Utility.tools.afterMarketStockDataExists",
+            return_value=(False, "stock_data_081223.pkl"),
+        ), patch(
+            "pkscreener.classes.Fetcher.screenerStockDataFetcher.fetchStockDataInBatches",
+            side_effect=fetchStockDataInBatches,
+        ), patch(
+            "pkscreener.classes.Utility.tools.currentDateTime",
+            return_value=datetime.datetime(2023, 12, 8, 18, 0),
+        ), patch(
+            "pkscreener.classes.Utility.fetcher.fetchURL"
+        ) as mock_fetchURL:
+            stockDict = {}
+            tools.loadStockData(stockDict, ConfigManager.tools(), False, "Y")
+            mock_fetchURL.assert_not_called()
+        refreshed = pd.DataFrame(
+            stockDict["SBIN"]["data"],
+            columns=stockDict["SBIN"]["columns"],
+            index=stockDict["SBIN"]["index"],
+        )
+        assert refreshed.index[-1] == pd.Timestamp("2023-12-08")
+        assert refreshed["Close"].tolist() == full["Close"].tolist()
+        with open(os.path.join(outputsDir, "stock_data_081223.pkl"), "rb") as f:
+            assert pickle.load(f) == stockDict
+    finally:
+        for cacheFile in ["stock_data_061223.pkl", "stock_data_081223.pkl"]:
+            try:
+                os.remove(os.path.join(outputsDir, cacheFile))
+            except FileNotFoundError:
+                pass
+        StockDataStore.deleteStores(outputsDir)
+
+
 # Positive test case for promptSaveResults() function
 def test_promptSaveResults():
     # Mocking the pd.DataFrame.to_excel() function
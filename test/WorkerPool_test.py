@@ -0,0 +1,121 @@
+"""
+    The MIT License (MIT)
+
+    Copyright (c) 2023 pkjmesra
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+
+"""
+import multiprocessing
+import os
+from unittest.mock import Mock
+
+from PKDevTools.classes.PKMultiProcessorClient import PKMultiProcessorClient
+
+from pkscreener.classes.TaskDispatcher import STOCK_INDEX, TaskDispatcher
+from pkscreener.classes.WorkerPool import PooledProcessor, ScanConfiguration, WorkerPool
+
+
+def tagStock(*args):
+    hostRef = args[-1]
+    return (args[STOCK_INDEX], hostRef.objectDictionary["tag"], os.getpid())
+
+
+def runScan(pool, stocks, tag):
+    items = [
+        tuple(stock if i == STOCK_INDEX else i for i in range(STOCK_INDEX + 2))
+        for stock in stocks
+    ]
+    dispatcher = TaskDispatcher(items, pool.tasks_queue, pool.size)
+    dispatcher.generation = pool.configure(
+        dispatcher.processorFor(tagStock), {"tag": tag}
+    )
+    dispatcher.dispatch()
+    found = []
+    remaining = len(items)
+    while remaining > 0:
+        results, count = dispatcher.received(pool.results_queue.get(timeout=30))
+        found.extend(results)
+        remaining -= count
+    assert dispatcher.finished()
+    return found
+
+
+def test_WorkerPool_reuses_workers_across_scans():
+    pool = WorkerPool(
+        2,
+        multiprocessing.Value("i", 1),
+        multiprocessing.Value("i", 0),
+        multiprocessing.Event(),
+    )
+    pool.consumers = [
+        PKMultiProcessorClient(
+            processor,
+            pool.tasks_queue,
+            pool.results_queue,
+            pool.processingCounter,
+            pool.processingResultsCounter,
+            None,
+            None,
+            pool.keyboardInterruptEvent,
+            None,
+        )
+        for processor in pool.processors()
+    ]
+    for worker in pool.consumers:
+        worker.daemon = True
+        worker.start()
+    try:
+        stocks = [f"S{i}" for i in range(20)]
+        first = runScan(pool, stocks, "first")
+        assert sorted(r[0] for r in first) == sorted(stocks)
+        assert all(r[1] == "first" for r in first)
+        assert pool.isAlive()
+        assert pool.canRun(2) and not pool.canRun(3)
+        second = runScan(pool, stocks[:5], "second")
+        assert sorted(r[0] for r in second) == sorted(stocks[:5])
+        assert all(r[1] == "second" for r in second)
+        workerPids = set(worker.pid for worker in pool.consumers)
+        assert set(r[2] for r in first + second) <= workerPids
+    finally:
+        pool.shutdown()
+    assert not pool.isAlive()
+
+
+def test_PooledProcessor_applies_configuration():
+    controlQueue = Mock()
+    previousArena = Mock()
+    hostRef = Mock()
+    hostRef.objectDictionary = previousArena
+    configManager = Mock()
+    processor = Mock(return_value="done")
+    controlQueue.get.return_value = ScanConfiguration(
+        1, processor, {"A": 1}, configManager
+    )
+    pooledProcessor = PooledProcessor(controlQueue)
+    assert pooledProcessor(1, ["A"], hostRef) == "done"
+    processor.assert_called_once_with(["A"], hostRef)
+    previousArena.close.assert_called_once()
+    assert hostRef.objectDictionary == {"A": 1}
+    assert hostRef.configManager is configManager
+    assert hostRef.screener.configManager is configManager
+    assert hostRef.screener.indicatorStateStore is None
+    # The same scan doesn't read the control queue again
+    pooledProcessor(1, ["B"], hostRef)
+    assert controlQueue.get.call_count == 1
@@ -27,11 +27,155 @@ import warnings
 
 warnings.simplefilter("ignore", DeprecationWarning)
 warnings.simplefilter("ignore", FutureWarning)
+import numpy as np
 import pandas as pd
 import pytest
+from PKDevTools.classes.ColorText import colorText
 
 from pkscreener.classes import Utility
-from pkscreener.classes.Backtest import backtest, backtestSummary
+from pkscreener.classes.Backtest import (
+    BacktestAccumulator,
+    backtestStatistics,
+    backtestSummary,
+)
+
+
+# The backtest of one result at a time that BacktestAccumulator replaced,
+# kept as the reference the accumulator's output is checked against.
+def backtest(
+    stock,
+    data,
+    saveDict=None,
+    screenedDict=None,
+    periods=30,
+    sampleDays=0,
+    backTestedData=None,
+    sellSignal=False,
+):
+    if stock == "" or data is None:
+        print(f"No data/stock{(stock)} received for backtesting!")
+        return
+    if screenedDict is None or len(screenedDict) == 0:
+        print(f"{(stock)}No backtesting strategy or screened dictionary received!")
+        return
+    calcPeriods = [1, 2, 3, 4, 5, 10, 15, 22, 30]
+    allStockBacktestData = []
+    # Take the data based on which the result set for a strategy may have been arrived at
+    # The results must have been arrived at with data based on configManager.backtestPeriod -sampleDays
+    # but we also need the periods days to be able to calculate the next few days' returns
+    # s1    d0
+    # s1    d1
+    # s1    d2  <----------------On this day the recommendation was made
+    # s1    d3  ^
+    #   ....    |
+    # s1    dn  |----------------We need to make calculations upto 30 day period from d2
+    previous_recent = data.head(
+        1
+    )  # This is the row which has the date for which the recommendation is valid
+    previous_recent.reset_index(inplace=True)
+    if len(previous_recent) <= 0:
+        return backTestedData
+    data = data.head(periods + 1)
+    # Let's check the returns for the given strategy over a period ranging from 1 period to 30 periods.
+    if backTestedData is None:
+        backTestedData = pd.DataFrame(
+            columns=[
+                "Stock",
+                "Date",
+                "Volume",
+                "Trend",
+                "MA-Signal",
+                "LTP",
+                "52Wk H",
+                "52Wk L",
+                "1-Pd",
+                "2-Pd",
+                "3-Pd",
+                "4-Pd",
+                "5-Pd",
+                "10-Pd",
+                "15-Pd",
+                "22-Pd",
+                "30-Pd",
+            ]
+        )
+    backTestedStock = {
+        "Stock": "",
+        "Date": "",
+        "Volume": "",
+        "Trend": "",
+        "MA-Signal": "",
+        "LTP": "",
+        "52Wk H": "",
+        "52Wk L": "",
+        "1-Pd": "",
+        "2-Pd": "",
+        "3-Pd": "",
+        "4-Pd": "",
+        "5-Pd": "",
+        "10-Pd": "",
+        "15-Pd": "",
+        "22-Pd": "",
+        "30-Pd": "",
+    }
+    backTestedStock["Stock"] = stock
+    targetDate = (
+        previous_recent["Date"].iloc[0]
+        if "Date" in previous_recent.columns
+        else str(previous_recent.iloc[:, 0][0])
+    )
+    targetDate = targetDate.split(" ")[0]  # Date or index column
+    backTestedStock["Date"] = targetDate
+    backTestedStock["Consol."] = screenedDict["Consol."]
+    backTestedStock["Breakout"] = screenedDict["Breakout"]
+    backTestedStock["MA-Signal"] = screenedDict["MA-Signal"]
+    backTestedStock["Volume"] = screenedDict["Volume"]
+    backTestedStock["LTP"] = screenedDict["LTP"]
+    backTestedStock["52Wk H"] = screenedDict["52Wk H"]
+    backTestedStock["52Wk L"] = screenedDict["52Wk L"]
+    backTestedStock["RSI"] = screenedDict["RSI"]
+    backTestedStock["Trend"] = screenedDict["Trend"]
+    backTestedStock["Pattern"] = screenedDict["Pattern"]
+    backTestedStock["CCI"] = screenedDict["CCI"]
+    today = Utility.tools.currentDateTime()
+    gap = Utility.tools.trading_days_between(
+        Utility.tools.dateFromYmdString(targetDate).replace(tzinfo=today.tzinfo).date(),
+        today.date(),
+    )
+    periods = gap if gap > periods else periods
+    for prd in calcPeriods:
+        if prd <= periods:
+            try:
+                rolling_pct = data["Close"].pct_change(periods=prd) * 100
+                pct_change = rolling_pct.iloc[prd]
+                if not sellSignal:
+                    colored_pct = colorText.GREEN if pct_change >= 0 else colorText.FAIL
+                else:
+                    colored_pct = colorText.FAIL if pct_change >= 0 else colorText.GREEN
+                backTestedStock[f"{abs(prd)}-Pd"] = (
+                    colored_pct + "%.2f%%" % pct_change + colorText.END
+                )
+            except Exception:
+                pass
+        # Let's capture the portfolio data, if available
+        try:
+            backTestedStock[f"LTP{prd}"] = saveDict[f"LTP{prd}"]
+            backTestedStock[f"Growth{prd}"] = saveDict[f"Growth{prd}"]
+        except Exception:
+            pass
+        # else:
+        #     del backTestedStock[f"{abs(prd)}-Pd"]
+        #     try:
+        #         backTestedData = backTestedData.drop(f"{abs(prd)}-Pd", axis=1)
+        #     except Exception:
+        #         continue
+    allStockBacktestData.append(backTestedStock)
+    df = pd.DataFrame(allStockBacktestData)  # , columns=backTestedData.columns)
+    try:
+        backTestedData = pd.concat([backTestedData, df])
+    except Exception:
+        pass
+    return backTestedData
 
 
 def sample_data():
@@ -74,22 +218,24 @@ def sample_screened_dict():
 
 
 def test_backtest_no_data():
-    result = backtest("", None)
-    assert result is None
+    assert not BacktestAccumulator().add("", None)
 
 
 def test_backtest_no_strategy():
-    result = backtest("AAPL", sample_data(), saveDict=None, screenedDict=None)
-    assert result is None
+    assert not BacktestAccumulator().add(
+        "AAPL", sample_data(), saveDict=None, screenedDict=None
+    )
 
 
 def test_backtest_with_data_and_strategy(sample_screened_dict):
-    result = backtest(
+    accumulator = BacktestAccumulator()
+    assert accumulator.add(
         "AAPL",
         sample_data(),
         saveDict=sample_screened_dict,
         screenedDict=sample_screened_dict,
     )
+    result = accumulator.toDataFrame()
     assert isinstance(result, pd.DataFrame)
     assert len(result) == 1
 
@@ -302,3 +448,129 @@ def test_formattedOutput():
     assert Utility.tools.formattedBacktestOutput(85) == "\x1b[92m85.00%\x1b[0m"
     assert Utility.tools.formattedBacktestOutput(70) == "\x1b[93m70.00%\x1b[0m"
     assert Utility.tools.formattedBacktestOutput(40) == "\x1b[91m40.00%\x1b[0m"
+
+
+def sample_price_data(rows, end="2023-12-29", seed=0):
+    r = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {"Close": 100 + np.cumsum(r.normal(0, 2, rows))},
+        index=pd.bdate_range(end=end, periods=rows),
+    )
+
+
+def test_backtest_accumulator_matches_backtest(sample_screened_dict):
+    accumulator = BacktestAccumulator(capacity=2)
+    legacy = None
+    for i, rows in enumerate([1, 3, 8, 31, 40]):
+        data = sample_price_data(rows, seed=i)
+        sellSignal = i % 2 == 0
+        legacy = backtest(
+            f"S{i}",
+            data,
+            sample_screened_dict,
+            sample_screened_dict,
+            30,
+            0,
+            legacy,
+            sellSignal,
+        )
+        assert accumulator.add(
+            f"S{i}",
+            data,
+            sample_screened_dict,
+            sample_screened_dict,
+            30,
+            0,
+            sellSignal,
+        )
+    result = accumulator.toDataFrame()
+    assert len(accumulator) == 5
+    assert list(result.columns) == list(legacy.columns)
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), legacy.reset_index(drop=True)
+    )
+
+
+def test_backtest_accumulator_forward_returns(sample_screened_dict):
+    accumulator = BacktestAccumulator()
+    assert not accumulator.add("", None)
+    assert not accumulator.add("SBIN", sample_price_data(5), screenedDict=None)
+    data = pd.DataFrame(
+        {"Close": [100.0, 110.0, 99.0]},
+        index=pd.bdate_range(end="2023-12-29", periods=3),
+    )
+    accumulator.add("SBIN", data, None, sample_screened_dict, 30, 0, True)
+    returns = accumulator.forwardReturns()
+    assert list(returns["Stock"]) == ["SBIN"]
+    assert returns["SellSignal"].iloc[0]
+    assert returns["1-Pd"].iloc[0] == pytest.approx(10)
+    assert returns["2-Pd"].iloc[0] == pytest.approx(-1)
+    assert np.isnan(returns["3-Pd"].iloc[0])
+    styled = accumulator.toDataFrame()
+    assert styled["1-Pd"].iloc[0].startswith(colorText.FAIL)
+    assert styled["3-Pd"].iloc[0] == ""
+
+
+def test_backtest_summary_from_forward_returns(sample_screened_dict):
+    accumulator = BacktestAccumulator()
+    for i in range(12):
+        accumulator.add(
+            f"S{i % 3}",
+            sample_price_data(3 + i * 3, seed=i),
+            None,
+            sample_screened_dict,
+            30,
+            0,
+            i % 4 == 0,
+        )
+    summary = backtestSummary(accumulator.forwardReturns())
+    assert summary.equals(backtestSummary(accumulator.toDataFrame()))
+    assert list(summary["Stock"]) == ["S0", "S1", "S2", "SUMMARY"]
+    assert list(summary.columns)[-1] == "Overall"
+
+
+def test_backtest_statistics():
+    returns = pd.DataFrame(
+        {
+            "Stock": ["SBIN", "SBIN", "SBIN", "TCS"],
+            "Date": ["2023-12-01"] * 4,
+            "SellSignal": [False, False, True, False],
+            "1-Pd": [2.0, -1.0, -3.0, 4.0],
+            "2-Pd": [1.0, np.nan, 5.0, np.nan],
+        }
+    )
+    statistics = backtestStatistics(returns)
+    assert list(statistics.index) == ["SBIN", "TCS", "SUMMARY"]
+    assert statistics.loc["SBIN", ("1-Pd", "HitRate")] == pytest.approx(200 / 3)
+    assert statistics.loc["SBIN", ("1-Pd", "Count")] == 3
+    assert statistics.loc["SBIN", ("1-Pd", "Mean")] == pytest.approx(-2 / 3)
+    assert statistics.loc["SBIN", ("1-Pd", "Median")] == pytest.approx(-1)
+    assert statistics.loc["TCS", ("2-Pd", "Count")] == 0
+    assert statistics.loc["SBIN", ("Overall", "Count")] == 5
+    assert statistics.loc["SBIN", ("Overall", "HitRate")] == pytest.approx(60)
+    assert statistics.loc["SUMMARY", ("Overall", "Count")] == 6
+    assert statistics.loc["SUMMARY", ("Overall", "Median")] == pytest.approx(1.5)
+    summary = backtestSummary(returns)
+    assert summary.loc[1, "2-Pd"] == "-"
+    assert summary.loc[2, "Overall"].endswith("of (6)")
+
+
+def test_backtest_summary_counts_nan_returns_as_red(sample_screened_dict):
+    accumulator = BacktestAccumulator()
+    data = pd.DataFrame(
+        {"Close": [np.nan, 100.0, 110.0]},
+        index=pd.bdate_range(end="2023-12-29", periods=3),
+    )
+    accumulator.add("BUY", data, None, sample_screened_dict, 30, 0, False)
+    accumulator.add("SELL", data, None, sample_screened_dict, 30, 0, True)
+    returns = accumulator.forwardReturns()
+    assert list(returns["Periods"]) == [2, 2]
+    statistics = backtestStatistics(returns)
+    assert statistics.loc["BUY", ("1-Pd", "Count")] == 1
+    assert statistics.loc["BUY", ("1-Pd", "HitRate")] == 0
+    assert statistics.loc["SELL", ("2-Pd", "HitRate")] == 100
+    assert statistics.loc["SELL", ("3-Pd", "Count")] == 0
+    assert np.isnan(statistics.loc["SUMMARY", ("Overall", "Mean")])
+    summary = backtestSummary(returns)
+    assert summary.equals(backtestSummary(accumulator.toDataFrame()))
+    assert summary.loc[2, "Overall"].endswith("of (4)")
@@ -22,7 +22,6 @@
     SOFTWARE.
 """
 
-import platform
 from unittest.mock import patch
 
 import pytest
@@ -110,22 +109,6 @@ def test_handleScannerExecuteOption4_positive():
     assert daysForLowestVolume == 30
 
 
-def test_populateQueues_positive():
-    items = [(1, 2, 3), (4, 5, 6), (7, 8, 9)]
-    tasks_queue = multiprocessing.JoinableQueue()
-    if "Darwin" in platform.system():
-        # On Mac, using qsize raises error
-        # assert not tasks_queue.empty()
-        pass
-    else:
-        populateQueues(items, tasks_queue, exit=True)
-        # Raises NotImplementedError on Mac OSX because of broken sem_getvalue()
-        assert tasks_queue.qsize() == len(items) + multiprocessing.cpu_count()
-        populateQueues(items, tasks_queue)
-        # Raises NotImplementedError on Mac OSX because of broken sem_getvalue()
-        assert tasks_queue.qsize() == 2 * len(items) + multiprocessing.cpu_count()
-
-
 # Negative test cases
 
 
@@ -223,6 +206,13 @@ def test_handleScannerExecuteOption4_negative():
             )
 
 
+def test_prefilterStockCodes_no_candidates_negative():
+    with patch("pkscreener.globals.PanelScreener") as mock_panel:
+        mock_panel.supportedOptions = [5]
+        mock_panel.return_value.prefilter.return_value = []
+        assert prefilterStockCodes(["SBIN", "TCS"], {"SBIN": {}}, 5) == []
+
+
 def test_getTopLevelMenuChoices_edge():
     startupoptions = ""
     testBuild = False
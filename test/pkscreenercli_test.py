@@ -22,6 +22,9 @@
     SOFTWARE.
 """
 import logging
+import subprocess
+import sys
+import time
 from unittest.mock import patch
 
 import pytest
@@ -174,3 +177,77 @@ def test_pkscreenercli_prodbuild_mode():
         signal.signal(signal.SIGTERM, shutdown)
     except Exception:
         pass
+
+
+# Budget in seconds for the command line to print its help
+startupBudget = 5
+
+
+def test_pkscreenercli_help_within_startup_budget():
+    start = time.time()
+    completed = subprocess.run(
+        [sys.executable, "-m", "pkscreener.pkscreenercli", "-h"],
+        capture_output=True,
+        timeout=60,
+    )
+    assert completed.returncode == 0
+    assert time.time() - start < startupBudget
+
+
+# Records which module first imports each of the heavy dependencies while
+# pkscreener.globals gets imported, and prints those imported by pkscreener.
+# What third-party packages load for themselves is not up to pkscreener.
+importersScript = """
+import importlib.abc
+import sys
+
+heavy = {heavy}
+importers = {{}}
+
+
+class Watch(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        top = next((m for m in heavy if name == m or name.startswith(m + ".")), None)
+        if top is not None and top not in sys.modules and top not in importers:
+            frame = sys._getframe(1)
+            while frame is not None and frame.f_globals.get(
+                "__name__", ""
+            ).startswith("importlib"):
+                frame = frame.f_back
+            importers[top] = "" if frame is None else frame.f_globals.get("__name__", "")
+        return None
+
+
+sys.meta_path.insert(0, Watch())
+import pkscreener.globals
+
+# find_spec probes (like pkscreener.Imports) don't load the module
+print(
+    sorted(
+        m
+        for m, importer in importers.items()
+        if m in sys.modules and importer.startswith("pkscreener")
+    )
+)
+"""
+
+
+def test_globals_import_leaves_heavy_dependencies_unloaded():
+    heavy = [
+        "keras",
+        "tensorflow",
+        "advanced_ta",
+        "sklearn",
+        "PIL",
+        "alive_progress",
+        # Loads the telegram client and PIL along with it
+        "PKDevTools.classes.Telegram",
+    ]
+    completed = subprocess.run(
+        [sys.executable, "-c", importersScript.format(heavy=set(heavy))],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert completed.returncode == 0
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
@@ -22,8 +22,9 @@
     SOFTWARE.
 
 """
+import time
 import warnings
-from unittest.mock import ANY, MagicMock
+from unittest.mock import ANY, MagicMock, patch
 
 import numpy as np
 
@@ -35,6 +36,7 @@ from PKDevTools.classes.log import default_logger as dl
 
 import pkscreener.classes.ConfigManager as ConfigManager
 import pkscreener.classes.Utility as Utility
+from pkscreener.classes.Pktalib import pktalib
 from pkscreener.classes.Screener import tools
 
 
@@ -1945,3 +1947,124 @@ def test_validateVCP_negative(
 #     assert tools_instance.validateVolumeSpreadAnalysis(mock_data, mock_screen_dict, mock_save_dict) == False
 #     assert mock_screen_dict.get("Pattern") == None
 #     assert mock_save_dict.get("Pattern") == None
+
+
+def test_trendSlopes_matches_polyfit_through_tops():
+    rng = np.random.default_rng(0)
+    closes = np.round(100 + np.cumsum(rng.normal(0, 3, (50, 22)), axis=1), 1)
+    slopes = tools.trendSlopes(closes)
+    for row, close in enumerate(closes):
+        tops = pktalib.argrelextrema(close, np.greater_equal, order=1)[0]
+        expected = np.polyfit(tops, close[tops], 1)[0]
+        assert np.isclose(slopes[row], expected)
+
+
+def test_trendSlopes_flat_and_missing_tops():
+    slopes = tools.trendSlopes([[10, 12.3, 10, 12.3, 10], [5, 4, 3, 2, 1]])
+    assert slopes[0] == 0
+    assert np.isnan(slopes[1])
+
+
+def test_findTrends_for_backtested_days(tools_instance):
+    rng = np.random.default_rng(1)
+    close = np.round(100 + np.cumsum(rng.normal(0, 5, 60)), 1)
+    windows = np.lib.stride_tricks.sliding_window_view(close, 10)
+    trends = tools_instance.findTrends(windows, 10)
+    for day, window in enumerate(windows):
+        data = pd.DataFrame({"Close": window[::-1]})
+        assert tools_instance.findTrend(data, {}, {}, 10) == trends[day]
+    assert len(set(trends)) > 1
+
+
+def test_validateVCP_leaves_data_untouched(tools_instance):
+    data = pd.DataFrame(
+        {
+            "High": [100, 104, 101, 99, 98, 104.5, 99, 97, 96],
+            "Low": [98, 101, 99, 97, 96, 102, 97, 95, 94],
+            "Close": [99, 103, 100, 98, 97, 104, 98, 96, 95],
+        },
+        index=pd.date_range("2023-01-10", periods=9, freq="-1D"),
+    )
+    original = data.copy()
+    screenDict, saveDict = {}, {}
+    assert tools_instance.validateVCP(data, screenDict, saveDict) is True
+    assert saveDict["Pattern"] == "VCP (BO: 104.5)"
+    pd.testing.assert_frame_equal(data, original)
+
+
+def test_vcpBreakouts_for_every_day(tools_instance):
+    rng = np.random.default_rng(2)
+    close = np.round(100 + np.cumsum(rng.normal(0, 2, 150)), 1)
+    high = close + np.round(np.abs(rng.normal(0, 1, 150)), 1)
+    low = close - np.round(np.abs(rng.normal(0, 1, 150)), 1)
+    breakouts = tools.vcpBreakouts(high, low, close)
+    for day in range(150):
+        data = pd.DataFrame(
+            {"High": high[: day + 1], "Low": low[: day + 1], "Close": close[: day + 1]}
+        )[::-1]
+        saveDict = {}
+        isVCP = tools_instance.validateVCP(data, {}, saveDict)
+        assert isVCP is not bool(np.isnan(breakouts[day]))
+        if isVCP:
+            assert saveDict["Pattern"] == f"VCP (BO: {breakouts[day]})"
+    assert (~np.isnan(breakouts)).sum() > 0
+
+
+def test_rangeMinimum():
+    values = np.array([5, 3, 8, 1, 9, 2, 7], dtype=float)
+    starts = np.array([0, 1, 2, 4, 6, 0])
+    ends = np.array([0, 2, 5, 6, 6, 6])
+    assert list(tools.rangeMinimum(values, starts, ends)) == [5, 3, 1, 2, 7, 1]
+
+
+def risingStock(candles, seed):
+    rng = np.random.default_rng(seed)
+    close = np.abs(50 + np.cumsum(rng.normal(0.3, 1, candles))) + 5
+    low = close - np.abs(rng.normal(0, 1, candles))
+    return low, close
+
+
+def test_findTrendlines_same_as_trendlineSupportDays(tools_instance):
+    low, close = risingStock(150, 0)
+    days = np.arange(40, 150)
+    supportDays = tools.trendlineSupportDays(low, close, days)
+    for day, isSupport in zip(days, supportDays):
+        data = pd.DataFrame({"Low": low[: day + 1], "Close": close[: day + 1]})[::-1]
+        saveDict = {}
+        assert tools_instance.findTrendlines(data, {}, saveDict) == isSupport
+        assert saveDict.get("Pattern") == ("Trendline-Support" if isSupport else None)
+    assert 0 < supportDays.sum() < len(days)
+
+
+def test_trendlineSupports_terminates_for_lows_on_a_line():
+    x = np.arange(100, dtype=float)
+    lows = np.vstack([0.1 * x + 10, np.full(100, 7.3)])
+    slope, intercept = tools.trendlineSupports(lows, lows + 1)
+    assert np.isnan(slope).all() and np.isnan(intercept).all()
+
+
+def test_trendlineSupports_stops_when_no_low_can_be_dropped():
+    # A line above all the lows would never drop any of them
+    def lineAbove(x, y, kept):
+        return np.zeros(len(y)), np.full(len(y), 1e9)
+
+    lows, closes = risingStock(100, 1)
+    with patch.object(tools, "leastSquares", side_effect=lineAbove) as mock_fit:
+        slope, _ = tools.trendlineSupports(lows, closes)
+    assert mock_fit.call_count == 2
+    assert slope[0] == 0
+
+
+def test_trendlineSupports_benchmark():
+    # 500 stocks of 280 candles (the default period) in one call
+    stocks = [risingStock(280, seed) for seed in range(500)]
+    lows = np.array([low for low, _ in stocks])
+    closes = np.array([close for _, close in stocks])
+    lows[::7, :100] = np.nan
+    started = time.perf_counter()
+    slope, intercept = tools.trendlineSupports(lows, closes)
+    assert time.perf_counter() - started < 10
+    assert np.isfinite(slope).all()
+    for row in [0, 1, 7]:
+        expected = tools.trendlineSupports(lows[row], closes[row])
+        assert (slope[row], intercept[row]) == (expected[0][0], expected[1][0])